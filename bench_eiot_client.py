@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测量数据查询链路压测（离线，使用 mock_eiot_server.py）
+
+对比整段单次请求（原 interface_read_data 的方式）与按天切分并发请求（fetch_history）的耗时，
+以及流式解码（read_response）的整体耗时，并分别统计 JSON 解码、decode_measurements、时段电价划分的耗时和吞吐。
+
+运行：python bench_eiot_client.py --days 14 --interval 1 --latency 200 --repeat 3
+"""
+
+import argparse
+import datetime
+import json
+import statistics
+import time
+
+import numpy as np
+
+from eiot_api import ConnectionPool, fetch_history, history_url, request_signed, TIME_FORMAT
+from measurements import decode_measurements, merge_decoded, read_response
+from mock_eiot_server import start_in_thread
+from tariff import classify_periods, period_prices
+
+METER = {'aggregatorNo': 'pN6MWCf5bnKsBNQU', 'edgeId': 'nation_hubei_grid', 'gridAcct': '10112101970'}
+
+
+def _timed(func, repeat):
+    """重复执行 func，返回 (最后一次结果, 每次耗时列表)"""
+    costs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        costs.append(time.perf_counter() - start)
+    return result, costs
+
+
+def _summary(name, costs, points):
+    costs_ms = np.array(costs) * 1000
+    return {
+        '阶段': name,
+        'p50(ms)': round(float(np.percentile(costs_ms, 50)), 1),
+        'p95(ms)': round(float(np.percentile(costs_ms, 95)), 1),
+        '平均(ms)': round(statistics.mean(costs_ms), 1),
+        '吞吐(点/秒)': int(points / statistics.mean(costs)) if points else 0,
+    }
+
+
+def run(days=14, interval='1', latency=0.0, error_rate=0.0, workers=4, chunk_days=1, repeat=3):
+    server = start_in_thread(latency_ms=latency, error_rate=error_rate)
+    host = server.signed_host
+    end = datetime.datetime.combine(datetime.date.today() - datetime.timedelta(days=1), datetime.time(23, 59))
+    start = end.replace(hour=0, minute=0) - datetime.timedelta(days=days - 1)
+    start_time, end_time = start.strftime(TIME_FORMAT), end.strftime(TIME_FORMAT)
+    rows = []
+
+    def single_request():
+        pool = ConnectionPool(host=host, size=1, https=False)
+        body = request_signed(pool, history_url(METER, start_time, end_time, interval, host), retries=0)
+        pool.close()
+        return json.loads(body.decode('utf-8'))
+
+    def chunked(**kwargs):
+        pool = ConnectionPool(host=host, size=workers, https=False)
+        try:
+            return fetch_history(METER, start_time, end_time, interval, chunk_days=chunk_days,
+                                 max_workers=workers, pool=pool, **kwargs)
+        finally:
+            pool.close()
+
+    if error_rate == 0:
+        data, costs = _timed(single_request, repeat)
+        points = len(data['data'])
+        rows.append(_summary('整段单次请求', costs, points))
+    data, costs = _timed(chunked, repeat)
+    points = len(data['data'])
+    rows.append(_summary(f'按{chunk_days}天切分并发请求(并发{workers})', costs, points))
+    _, costs = _timed(lambda: decode_measurements(chunked(consume=read_response, merge=merge_decoded)), repeat)
+    rows.append(_summary('切分并发请求+流式解码+decode_measurements', costs, points))
+
+    raw = json.dumps(data).encode('utf-8')
+    _, costs = _timed(lambda: json.loads(raw.decode('utf-8')), repeat)
+    rows.append(_summary('JSON 解码', costs, points))
+    frame, costs = _timed(lambda: decode_measurements(data), repeat)
+    rows.append(_summary('decode_measurements', costs, points))
+    _, costs = _timed(lambda: period_prices(classify_periods(frame.index), 0.7, 0.6, 0.51, 0.5), repeat)
+    rows.append(_summary('时段电价划分', costs, points))
+
+    server.shutdown()
+    return rows, points, server.request_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量数据查询链路压测（使用本地模拟服务）')
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--interval', default='1')
+    parser.add_argument('--latency', type=float, default=0, help='模拟服务平均延迟（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--chunk-days', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    rows, points, requests = run(args.days, args.interval, args.latency, args.error_rate,
+                                 args.workers, args.chunk_days, args.repeat)
+    print(f'{args.days} 天 × {args.interval} 分钟间隔，共 {points} 点，模拟服务收到 {requests} 次请求')
+    for row in rows:
+        print('  '.join(f'{k}: {v}' for k, v in row.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+长时间序列图表降采样
+
+按图表宽度给定点数预算，对每个桶保留最小值和最大值所在的点（min/max bucketing），
+峰谷不会被抹平；结果按 数据+点数预算 缓存，重复渲染无需重新计算。
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# 默认图表宽度（像素）及每像素点数，每个桶保留最小、最大两个点
+CHART_WIDTH_PX = 1200
+POINTS_PER_PX = 2
+
+
+def point_budget(width_px=CHART_WIDTH_PX, points_per_px=POINTS_PER_PX):
+    """根据图表宽度计算点数预算"""
+    return int(width_px * points_per_px)
+
+
+def minmax_positions(values, n_buckets):
+    """
+    计算单列 min/max 降采样后保留的位置
+    输入参数：
+    values 一维数值数组
+    n_buckets 桶数量
+    输出参数：升序排列的保留位置数组（含首尾两点）
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    size = int(np.ceil(n / n_buckets))
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = values
+    buckets = padded.reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    pos_max = np.where(np.isnan(buckets), -np.inf, buckets).argmax(axis=1) + offsets
+    pos_min = np.where(np.isnan(buckets), np.inf, buckets).argmin(axis=1) + offsets
+    positions = np.concatenate([pos_min, pos_max, [0, n - 1]])
+    return np.unique(positions[positions < n])
+
+
+def downsample_frame(data, max_points=None):
+    """
+    对 Series/DataFrame 做 min/max 降采样，所有列共用同一组保留位置，便于多曲线同图
+    输入参数：
+    data 按绘图顺序排列的 Series 或 DataFrame
+    max_points 点数预算，默认 point_budget()
+    输出参数：降采样后的 Series 或 DataFrame（行数不超过预算时原样返回）
+    """
+    max_points = max_points or point_budget()
+    if len(data) <= max_points:
+        return data
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    numeric = frame.select_dtypes(include='number')
+    if numeric.empty:
+        return data
+    # 每列都保留峰谷，需按列数分摊点数预算
+    n_buckets = max(1, max_points // (2 * numeric.shape[1]))
+    positions = np.unique(np.concatenate(
+        [minmax_positions(numeric[c].to_numpy(dtype=float, na_value=np.nan), n_buckets)
+         for c in numeric.columns]))
+    return data.iloc[positions]
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def downsample(data, max_points=None):
+    """带缓存的 downsample_frame，同一序列、同一范围及点数预算只计算一次"""
+    return downsample_frame(data, max_points)
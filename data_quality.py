@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+表计数据质量检查
+
+对 load_and_process_data 输出的数据（日期为索引，含 用户编号 列）一次性检查所有户号的
+缺失、重复时间戳、计数器回退和平线（数值长时间不变），并可对短缺口做线性插值。
+逐行计算全部基于排序后的 numpy 数组差分，不按户号拆分数据；插值不跨户号取值。
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# 列名包含以下关键字时视为累计计数器（示数类），检查回退
+COUNTER_KEYWORDS = ('电量', '示数', 'Energy')
+
+
+def _diff(values, first=0):
+    """与前一行的差值，首行填 first（避免 np.diff(prepend=...) 的整列拷贝）"""
+    out = np.empty(len(values), dtype=np.result_type(values, first))
+    out[:1] = first
+    np.subtract(values[1:], values[:-1], out=out[1:])
+    return out
+
+
+def _sorted_arrays(df, user_col):
+    """按 户号、时间 排序，返回排序位置、户号编码、时间(ns)、同户号标记"""
+    user_codes, users = pd.factorize(df[user_col], sort=True)
+    ts = df.index.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    same_user = np.zeros(len(ts), dtype=bool)
+    same_user[1:] = user_codes[1:] == user_codes[:-1]
+    # 导出数据通常已按 户号、时间 排好序，此时跳过排序
+    if (np.diff(user_codes) >= 0).all() and (np.diff(ts)[same_user[1:]] >= 0).all():
+        return users, np.arange(len(ts)), user_codes, ts, same_user
+    order = np.lexsort((ts, user_codes))
+    codes = user_codes[order]
+    ts = ts[order]
+    same_user[1:] = codes[1:] == codes[:-1]
+    return users, order, codes, ts, same_user
+
+
+def _interval_per_user(codes, ts, same_user, n_users):
+    """每个户号的采样间隔（相邻正时间差的中位数，ns）"""
+    diff = _diff(ts)
+    diff = np.where(same_user, diff, 0)
+    bounds = np.append(np.flatnonzero(~same_user), len(ts))
+    interval = np.zeros(n_users, dtype=np.int64)
+    # 户号数量远小于行数，按户号分段取中位数
+    for code, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+        d = diff[lo:hi]
+        d = d[d > 0]
+        if len(d):
+            interval[code] = int(np.median(d))
+    return interval
+
+
+def counter_columns(df):
+    """按列名识别累计计数器列"""
+    return [c for c in df.select_dtypes(include='number').columns
+            if any(k in str(c) for k in COUNTER_KEYWORDS)]
+
+
+def quality_report(df, user_col='用户编号', value_cols=None, counter_cols=None, flat_points=8):
+    """
+    生成每个户号的数据质量报告
+    输入参数：
+    df 日期为索引的数据
+    user_col 户号列
+    value_cols 检查平线的数值列，默认全部数值列
+    counter_cols 检查回退的计数器列，默认按 COUNTER_KEYWORDS 识别
+    flat_points 连续相同值达到该点数视为平线
+    输出参数：
+    DataFrame，每行一个户号
+    """
+    if df is None or df.empty:
+        return pd.DataFrame()
+    numeric = df.select_dtypes(include='number').columns.drop(user_col, errors='ignore')
+    value_cols = list(numeric) if value_cols is None else list(value_cols)
+    counter_cols = counter_columns(df) if counter_cols is None else list(counter_cols)
+
+    users, order, codes, ts, same_user = _sorted_arrays(df, user_col)
+    n_users = len(users)
+    interval = _interval_per_user(codes, ts, same_user, n_users)
+    step = interval[codes]
+    diff = _diff(ts)
+
+    duplicated = same_user & (diff == 0)
+    is_gap = same_user & (step > 0) & (diff > 1.5 * step)
+    missing = np.where(is_gap, np.rint(diff / np.maximum(step, 1)) - 1, 0)
+
+    # 排序后每个户号占连续一段
+    starts = np.flatnonzero(~same_user)
+    ends = np.append(starts[1:] - 1, len(ts) - 1)
+
+    def per_user(values, how='sum'):
+        if how == 'max':
+            return np.maximum.reduceat(values, starts)
+        return np.bincount(codes, weights=values, minlength=n_users)
+
+    report = pd.DataFrame({
+        user_col: np.asarray(users),
+        '记录数': np.bincount(codes, minlength=n_users),
+        '起始时间': pd.to_datetime(ts[starts]),
+        '结束时间': pd.to_datetime(ts[ends]),
+        '采样间隔': pd.to_timedelta(interval),
+        '重复时间戳': per_user(duplicated).astype(int),
+        '缺失段数': per_user(is_gap).astype(int),
+        '缺失点数': per_user(missing).astype(int),
+        '最长缺失(点)': per_user(missing, 'max').astype(int),
+    })
+    expected = report['记录数'] - report['重复时间戳'] + report['缺失点数']
+    report['完整率(%)'] = np.round((report['记录数'] - report['重复时间戳']) / expected.clip(lower=1) * 100, 2)
+
+    for col in value_cols:
+        v = df[col].to_numpy(dtype=float, na_value=np.nan)[order]
+        same_value = same_user & (_diff(v, np.nan) == 0)
+        # 连续相同值构成一段，统计长度达到 flat_points 的段数
+        run_id = np.cumsum(~same_value)
+        run_len = np.bincount(run_id)[run_id]
+        is_flat_start = ~same_value & (run_len >= flat_points)
+        report[f'{col}平线段数'] = per_user(is_flat_start).astype(int)
+        report[f'{col}空值数'] = per_user(np.isnan(v)).astype(int)
+    for col in counter_cols:
+        v = df[col].to_numpy(dtype=float, na_value=np.nan)[order]
+        reset = same_user & (_diff(v, np.nan) < 0)
+        report[f'{col}回退次数'] = per_user(reset).astype(int)
+    return report
+
+
+def fill_short_gaps(df, user_col='用户编号', max_gap=4):
+    """
+    对不超过 max_gap 个点的缺口按户号线性插值补点
+    输入参数：
+    df 日期为索引的数据
+    user_col 户号列
+    max_gap 允许插值的最大缺失点数
+    输出参数：
+    (补点后的数据, 补点数量)，数据按 户号、时间 排序
+    """
+    if df is None or df.empty:
+        return df, 0
+    users, order, codes, ts, same_user = _sorted_arrays(df, user_col)
+    interval = _interval_per_user(codes, ts, same_user, len(users))
+    step = interval[codes]
+    diff = _diff(ts)
+    n_missing = np.where(same_user & (step > 0), np.rint(diff / np.maximum(step, 1)).astype(np.int64) - 1, 0)
+    n_insert = np.where((n_missing > 0) & (n_missing <= max_gap), n_missing, 0)
+    total = int(n_insert.sum())
+    sorted_df = df.iloc[order]
+    if total == 0:
+        return sorted_df, 0
+
+    # 缺口后一行的位置为 i，补点沿用前一行 i-1 的非数值列，时间为 ts[i-1] + k*step
+    rows = np.repeat(np.arange(len(ts)), n_insert)
+    k = np.arange(total) - np.repeat(np.cumsum(n_insert) - n_insert, n_insert) + 1
+    new_ts = ts[rows - 1] + k * step[rows]
+    inserted = sorted_df.iloc[rows - 1].copy()
+    inserted.index = pd.DatetimeIndex(new_ts.astype('datetime64[ns]'), name=df.index.name)
+    numeric = df.select_dtypes(include='number').columns.drop(user_col, errors='ignore')
+    inserted[numeric] = np.nan
+
+    # 在每个缺口后一行之前插入补点，保持 户号、时间 有序
+    position = np.concatenate([np.arange(len(ts)) * 1.0, rows - 1 + k / (n_insert[rows] + 1.0)])
+    merged_order = np.argsort(position, kind='stable')
+    merged = pd.concat([sorted_df, inserted]).iloc[merged_order]
+    # 只回填补点行，原有空值保持不变
+    is_inserted = merged_order >= len(ts)
+    filled = merged[numeric].interpolate(limit=max_gap, limit_area='inside').to_numpy(dtype=float, copy=True)
+    values = merged[numeric].to_numpy(dtype=float, na_value=np.nan, copy=True)
+    # 整表插值与按户号插值的差别只在两侧最近的有效值属于不同户号（户号首尾为空值）时，此时不补
+    merged_codes = np.concatenate([codes, codes[rows - 1]])[merged_order]
+    n = len(values)
+    position = np.arange(n)[:, None]
+    valid = ~np.isnan(values)
+    prev = np.maximum.accumulate(np.where(valid, position, 0), axis=0)
+    following = np.minimum.accumulate(np.where(valid, position, n - 1)[::-1], axis=0)[::-1]
+    filled[merged_codes[prev] != merged_codes[following]] = np.nan
+    values[is_inserted] = filled[is_inserted]
+    merged[numeric] = values
+    return merged, total
+
+
+# st.cache_data 每次返回副本：补点后的数据会被页面继续处理，不能在各会话间共享同一对象
+@st.cache_data(show_spinner=False, max_entries=8)
+def _cached_report(cache_key, _df, user_col):
+    return quality_report(_df, user_col=user_col)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _cached_fill(cache_key, max_gap, _df, user_col):
+    return fill_short_gaps(_df, user_col=user_col, max_gap=max_gap)
+
+
+def quality_panel(df, user_col='用户编号', key='quality', cache_key=None):
+    """
+    页面数据质量面板：展示质量报告，可选插值补齐短缺口
+    cache_key 数据的缓存键（如文件哈希），给定时报告和补点结果按该键缓存
+    输出参数：处理后的数据
+    """
+    with st.expander("数据质量检查", expanded=False):
+        if cache_key is None:
+            report = quality_report(df, user_col=user_col)
+        else:
+            report = _cached_report(cache_key, df, user_col)
+        st.dataframe(report, hide_index=True)
+        if not report.empty and (report['缺失点数'] > 0).any():
+            st.warning(f"共有 {int((report['缺失点数'] > 0).sum())} 个户号存在数据缺失，相关指标可能偏差。")
+    fill = st.sidebar.checkbox("插值补齐短缺口", value=False, key=f'{key}_fill',
+                               help='对不超过设定点数的缺口按户号线性插值')
+    if fill:
+        max_gap = st.sidebar.number_input("最大插值点数", value=4, min_value=1, step=1, key=f'{key}_max_gap')
+        if cache_key is None:
+            df, n_filled = fill_short_gaps(df, user_col=user_col, max_gap=max_gap)
+        else:
+            df, n_filled = _cached_fill(cache_key, max_gap, df, user_col)
+        st.sidebar.write(f"已插值补点 {n_filled} 个")
+    return df
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+eiot6 虚拟电厂开放接口：签名及测量数据历史查询
+
+长时间段按天（或周）切分为多个子区间，每个子区间单独签名，通过保持长连接的连接池并发请求，
+失败时指数退避重试，最后按时间顺序合并结果。
+"""
+
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import queue
+import random
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode, urlunparse, urlparse, parse_qs
+
+from query_metrics import METRICS, CountingResponse
+
+ACCESS_KEY = "chint-hubei"
+ACCESS_SECRET = "UIJLL(q0BZq0y5tKq"
+HOST = "api.eiot6.com"
+HISTORY_PATH = "/vpp-aggr/open-api/v1/control_unit/measurements/history"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 表计登记文件（JSON：{表计名称: {aggregatorNo, edgeId, gridAcct}}），可用环境变量 EIOT_METERS 指定
+METERS_PATH = os.environ.get('EIOT_METERS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'meters.json'))
+METER_KEYS = ('aggregatorNo', 'edgeId', 'gridAcct')
+# 登记文件不存在时使用的默认表计
+DEFAULT_METERS = {
+    "黄冈产业园增量配电网测量数据": {'aggregatorNo': '91421100MA49DL1B77', 'edgeId': 'nation_hubei_grid',
+                                  'gridAcct': '4206916039019'},
+    "保碧储能站测量数据": {'aggregatorNo': 'pN6MWCf5bnKsBNQU', 'edgeId': 'nation_hubei_grid',
+                         'gridAcct': '10112101970'},
+}
+
+# 并发、超时及重试设置
+MAX_WORKERS = 4
+# 多表计查询时同时查询的表计数（每个表计内部再按子区间并发）
+METER_WORKERS = 8
+TIMEOUT = 60
+RETRIES = 3
+BACKOFF = 1.0
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def load_meters(path=METERS_PATH):
+    """
+    读取表计登记文件
+    输出参数：{表计名称: {'aggregatorNo', 'edgeId', 'gridAcct'}}，文件不存在时返回默认表计
+    """
+    if not os.path.exists(path):
+        return dict(DEFAULT_METERS)
+    with open(path, encoding='utf-8') as f:
+        registry = json.load(f)
+    meters = {}
+    for name, meter in registry.items():
+        missing = [k for k in METER_KEYS if not meter.get(k)]
+        if missing:
+            raise ValueError(f"表计 {name} 缺少参数: {', '.join(missing)}")
+        meters[name] = {k: str(meter[k]) for k in METER_KEYS}
+    return meters
+
+
+# 表计名称 -> 查询参数
+METERS = load_meters()
+
+
+def generate_token(access_key, access_secret, http_method, url):
+    # Get current millisecond timestamp
+    access_timestamp_ms = int(time.time() * 1000)
+    # Construct the sign key with sorted dictionary and millisecond timestamp
+    params = {
+        "accessKey": access_key,
+        "accessTs": access_timestamp_ms,
+        "httpMethod": http_method,
+        "url": escape_url_params(url)
+    }
+    sign_key = kv_tokenize(params)
+    # Generate HMAC
+    hmac_sha256 = hmac.new(sign_key.encode(), access_secret.encode(), hashlib.sha256)
+    hmac_digest = hmac_sha256.hexdigest()
+    # Results
+    token = hmac_digest
+    ts_ms = access_timestamp_ms
+    return token, ts_ms
+
+
+def kv_tokenize(dict):
+    res = ""
+    for key, value in sorted(dict.items()):
+        if isinstance(value, list):
+            for v in value:
+                res += key + "=" + str(v) + "&"
+        else:
+            res += key + "=" + str(value) + "&"
+    return res[:-1]
+
+
+def escape_url_params(url):
+    # 解析URL
+    parsed_url = urlparse(url)
+    # 重新组合URL
+    new_url = urlunparse((
+        parsed_url.scheme,
+        parsed_url.netloc,
+        parsed_url.path,
+        parsed_url.params,
+        escape_qs(parsed_url),
+        parsed_url.fragment
+    ))
+    return new_url
+
+
+def escape_qs(parsed_url):
+    # 获取查询参数
+    params = parse_qs(parsed_url.query)
+    # 转义每个参数的值
+    escaped_params = {
+        key: [urlencode({key: value})[len(key) + 1:] for value in values]
+        for key, values in params.items()
+    }
+    return kv_tokenize(escaped_params)
+
+
+class ConnectionPool:
+    """
+    保持长连接的 HTTPS 连接池，线程安全。
+    连接取出后独占使用，请求完成（响应已读完）后归还以复用 TLS 连接。
+    https=False 时使用明文 HTTP（用于本地模拟服务 mock_eiot_server.py）。
+    """
+
+    def __init__(self, host=HOST, size=MAX_WORKERS, timeout=TIMEOUT, https=True):
+        self.host = host
+        self.timeout = timeout
+        self.https = https
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _new_connection(self):
+        if not self.https:
+            return http.client.HTTPConnection(self.host, timeout=self.timeout)
+        return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def release(self, conn, broken=False):
+        if broken:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def split_range(start_time, end_time, chunk_days=1):
+    """
+    将 [start_time, end_time] 按自然日切分为闭区间列表，chunk_days=7 时按周切分
+    输入输出时间均为 'YYYY-MM-DD HH:MM:SS' 字符串
+    """
+    start = datetime.datetime.strptime(str(start_time), TIME_FORMAT)
+    end = datetime.datetime.strptime(str(end_time), TIME_FORMAT)
+    chunks = []
+    while start <= end:
+        boundary = datetime.datetime.combine(start.date(), datetime.time()) + datetime.timedelta(days=chunk_days)
+        chunk_end = min(end, boundary - datetime.timedelta(seconds=1))
+        chunks.append((start.strftime(TIME_FORMAT), chunk_end.strftime(TIME_FORMAT)))
+        start = boundary
+    return chunks
+
+
+def history_url(meter, start_time, end_time, interval, host=HOST):
+    """构造测量数据历史查询URL，meter 为 aggregatorNo、edgeId、gridAcct 组成的字典"""
+    query = (f"aggregatorNo={meter['aggregatorNo']}&edgeId={meter['edgeId']}&gridAcct={meter['gridAcct']}"
+             f"&startDate={start_time}&endDate={end_time}&interval={interval}")
+    return f"https://{host}{HISTORY_PATH}?{query}"
+
+
+def meter_label(url):
+    """从查询URL中取出表计参数，返回登记的表计名称（未登记时为 gridAcct）"""
+    query = {k: v[0] for k, v in parse_qs(urlparse(url).query).items()}
+    for name, meter in METERS.items():
+        if meter['gridAcct'] == query.get('gridAcct') and meter['aggregatorNo'] == query.get('aggregatorNo'):
+            return name
+    return query.get('gridAcct', '')
+
+
+def request_signed(pool, url, access_key=ACCESS_KEY, access_secret=ACCESS_SECRET,
+                   retries=RETRIES, backoff=BACKOFF, consume=None, metrics=METRICS):
+    """
+    对 url 签名并发起 GET 请求，返回响应内容（bytes），指定 consume 时返回 consume(res)。
+    consume 需读完响应（如流式解码 measurements.read_response），连接才能复用。
+    网络异常及 429/5xx 状态按指数退避（带随机抖动）重试，每次重试重新签名。
+    各阶段耗时（签名、建立连接、服务端响应、下载及解码）及请求/重试/失败次数、字节数按表计记入 metrics。
+    """
+    http_method = "GET"
+    p = urlparse(url)
+    path = f'{p.path}?{escape_qs(p)}'
+    meter = meter_label(url)
+    for attempt in range(retries + 1):
+        with metrics.stage('签名', meter):
+            token, ts = generate_token(access_key, access_secret, http_method, url)
+        headers = {
+            'X-ACCESS-KEY': access_key,
+            'X-ACCESS-TOKEN': token,
+            'X-ACCESS-TS': ts
+        }
+        metrics.count(meter, 请求次数=1, 重试次数=int(attempt > 0))
+        conn = pool.acquire()
+        try:
+            if conn.sock is None:
+                with metrics.stage('建立连接', meter):
+                    conn.connect()
+            with metrics.stage('服务端响应', meter):
+                conn.request(http_method, path, '', headers)
+                res = conn.getresponse()
+            counted = CountingResponse(res)
+            try:
+                with metrics.stage('下载及解码', meter):
+                    if res.status in RETRY_STATUS or consume is None:
+                        body = counted.read()
+                    else:
+                        body = consume(counted)
+            finally:
+                # 读取或解码中途出错时，已传输的字节同样计入
+                metrics.count(meter, 字节数=counted.nbytes)
+        except (OSError, http.client.HTTPException) as e:
+            pool.release(conn, broken=True)
+            error = e
+        except Exception:
+            pool.release(conn, broken=True)
+            metrics.count(meter, 失败次数=1)
+            raise
+        else:
+            pool.release(conn, broken=res.will_close)
+            if res.status not in RETRY_STATUS:
+                return body
+            error = Exception(f"接口请求失败: {res.status}")
+        if attempt < retries:
+            time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+    metrics.count(meter, 失败次数=1)
+    raise error
+
+
+def merge_chunks(chunks):
+    """按子区间顺序合并解析后的响应，去除边界上重复的时间点"""
+    merged = {'success': all(c.get('success') for c in chunks), 'data': []}
+    seen = set()
+    for chunk in chunks:
+        for item in chunk.get('data') or []:
+            if item['ts'] not in seen:
+                seen.add(item['ts'])
+                merged['data'].append(item)
+    merged['data'].sort(key=lambda item: item['ts'])
+    return merged
+
+
+def read_json(res):
+    """读取完整响应并按 JSON 解析"""
+    return json.loads(res.read().decode("utf-8"))
+
+
+def fetch_history(meter, start_time, end_time, interval, chunk_days=1,
+                  max_workers=MAX_WORKERS, pool=None, consume=read_json, merge=merge_chunks):
+    """
+    分段并发查询测量数据历史
+    输入参数：
+    meter 表计参数字典（aggregatorNo、edgeId、gridAcct）
+    start_time、end_time 'YYYY-MM-DD HH:MM:SS'
+    interval 时间间隔（分钟）
+    chunk_days 每个子区间的天数，1 按天、7 按周
+    max_workers 最大并发请求数
+    pool 可复用的 ConnectionPool，缺省时新建并在结束后关闭
+    consume 每个子区间响应的读取解码函数，merge 合并各子区间结果的函数；
+    流式解码为列式结果时传入 measurements.read_response / measurements.merge_decoded
+    输出参数：
+    缺省为与接口一致的字典 {'success': bool, 'data': [...]}，data 按时间排序；否则为 merge 的结果
+    """
+    own_pool = pool is None
+    pool = pool or ConnectionPool(size=max_workers)
+    urls = [history_url(meter, s, e, interval, pool.host) for s, e in split_range(start_time, end_time, chunk_days)]
+    if not urls:
+        return {**merge([]), 'success': False}
+    try:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+            chunks = list(executor.map(lambda url: request_signed(pool, url, consume=consume), urls))
+    finally:
+        if own_pool:
+            pool.close()
+    return merge(chunks)
+
+
+def fetch_meters(meters, start_time, end_time, interval, fetch=fetch_history,
+                 max_workers=METER_WORKERS, pool=None, **kwargs):
+    """
+    多表计并发查询
+    输入参数：
+    meters {表计名称: 表计参数字典}
+    fetch 单表计查询函数，签名同 fetch_history（可传入带缓存的查询）
+    max_workers 同时查询的表计数
+    pool 各表计共用的 ConnectionPool，缺省时新建并在结束后关闭
+    输出参数：
+    {表计名称: {'success': bool, 'data': [...]}}，顺序同 meters；查询异常的表计 success 为 False 并带 'error'
+    """
+    own_pool = pool is None
+    pool = pool or ConnectionPool(size=max_workers * MAX_WORKERS)
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(meters)))) as executor:
+            futures = {executor.submit(fetch, meter, start_time, end_time, interval, pool=pool, **kwargs): name
+                       for name, meter in meters.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = {'success': False, 'data': [], 'error': str(e)}
+    finally:
+        if own_pool:
+            pool.close()
+    return {name: results[name] for name in meters}
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+累计电量计数器 -> 分时段电量、充放电成本收益
+
+TotalChargeEnergy / TotalDischargeEnergy 等为累计示数，不能按时段直接取 max - min（会把多天合并，
+且遇到计数器清零或跨零点时段时出错）。这里先对示数逐点差分：小幅回退视为抖动记 0，大幅回退视为
+计数器重置、该点增量取重置后的示数（计数器从 0 重新累计）；再把修正后的累计量按时间线性插值到规则时间网格上，缺失段内的电量按时间
+均匀分摊到各时段。每个时间间隔的电量计入其起始时刻所在的 日期 × 分时时段，全程向量化，一次完成。
+"""
+
+import numpy as np
+import pandas as pd
+
+from tariff import NS_PER_DAY, PERIOD_NAMES, classify_periods, period_prices
+
+# 示数回退不超过该值（kWh）视为抖动，超过视为计数器重置
+RESET_TOLERANCE = 1.0
+# 超过 MAX_GAP_STEPS 个采样间隔的缺失段计入缺失统计（电量仍按时间分摊）
+MAX_GAP_STEPS = 2
+CHARGE_COUNTER = 'TotalChargeEnergy'
+DISCHARGE_COUNTER = 'TotalDischargeEnergy'
+
+
+def counter_increments(ts, values, step=None, reset_tolerance=RESET_TOLERANCE):
+    """
+    累计示数 -> 规则时间网格上每个间隔的电量
+    输入参数：
+    ts 时间（DatetimeIndex / datetime Series / datetime64 数组）
+    values 累计示数
+    step 网格间隔（Timedelta），缺省取相邻有效点时间差的中位数
+    reset_tolerance 回退容差（kWh）
+    输出参数：(interval_start, energy, stats)
+    interval_start 每个间隔的起始时刻（datetime64[ns] 数组）
+    energy 每个间隔的电量
+    stats {'重置次数', '缺失段数', '缺失点数'}
+    """
+    ns = pd.DatetimeIndex(ts).values.astype('datetime64[ns]').view(np.int64)
+    v = np.asarray(values, dtype=float)
+    valid = ~np.isnan(v)
+    ns, v = ns[valid], v[valid]
+    stats = {'重置次数': 0, '缺失段数': 0, '缺失点数': 0}
+    if len(ns) < 2:
+        return np.empty(0, dtype='datetime64[ns]'), np.empty(0), stats
+    if np.any(np.diff(ns) < 0):
+        order = np.argsort(ns, kind='stable')
+        ns, v = ns[order], v[order]
+    keep = np.r_[True, np.diff(ns) > 0]
+    ns, v = ns[keep], v[keep]
+    if len(ns) < 2:
+        return np.empty(0, dtype='datetime64[ns]'), np.empty(0), stats
+
+    # 差分并修正回退，再累加得到单调的累计量
+    d = np.diff(v)
+    resets = d < -reset_tolerance
+    stats['重置次数'] = int(resets.sum())
+    d[d < 0] = 0
+    d[resets] = np.maximum(v[1:][resets], 0)
+    corrected = np.r_[0.0, np.cumsum(d)]
+
+    gaps = np.diff(ns)
+    step_ns = int(pd.Timedelta(step).value) if step is not None else int(np.median(gaps))
+    long_gaps = gaps > MAX_GAP_STEPS * step_ns
+    stats['缺失段数'] = int(long_gaps.sum())
+    stats['缺失点数'] = int((gaps[long_gaps] // step_ns - 1).sum())
+
+    # 插值到规则网格，缺失段电量按时间均匀分摊
+    first = ns[0] - ns[0] % step_ns
+    grid = np.arange(first, ns[-1] + step_ns, step_ns, dtype=np.int64)
+    cumulative = np.interp(grid, ns, corrected)
+    return grid[:-1].view('datetime64[ns]'), np.diff(cumulative), stats
+
+
+def energy_by_period(ts, values, **kwargs):
+    """
+    累计示数 -> 日期 × 时段 的电量
+    输出参数：(DataFrame 列 日期/时段编码/电量, stats)
+    """
+    start, energy, stats = counter_increments(ts, values, **kwargs)
+    if len(start) == 0:
+        return pd.DataFrame({'日期': pd.DatetimeIndex([]), '时段编码': np.empty(0, np.int8),
+                             '电量': np.empty(0)}), stats
+    codes = classify_periods(start)
+    day = start.view(np.int64) // NS_PER_DAY
+    first_day = day.min()
+    # 日序号 × 时段编码 组合键，bincount 一次聚合
+    n_codes = len(PERIOD_NAMES)
+    key = (day - first_day) * n_codes + codes
+    totals = np.bincount(key, weights=energy, minlength=(day.max() - first_day + 1) * n_codes)
+    present = np.bincount(key, minlength=len(totals)) > 0
+    idx = np.flatnonzero(present)
+    day_idx, code = np.divmod(idx, n_codes)
+    table = pd.DataFrame({
+        '日期': ((day_idx + first_day) * NS_PER_DAY).view('datetime64[ns]'),
+        '时段编码': code.astype(np.int8),
+        '电量': totals[idx],
+    })
+    return table, stats
+
+
+def storage_arbitrage(frames, tip_electricity_price, peak_electricity_price, valley_electricity_price,
+                      average_electricity_price, charge_col=CHARGE_COUNTER, discharge_col=DISCHARGE_COUNTER):
+    """
+    储能充放电套利计算
+    输入参数：
+    frames {表计名称: decode_measurements 格式的数据}，需含充、放电累计示数列
+    四个电价参数与 period_prices 相同
+    输出参数：(detail, stats)
+    detail 按 表计 × 日期 × 时段 的 充电电量/放电电量/充电成本/放电收益
+    stats {表计名称: {'充电': counter_increments 统计, '放电': ...}}
+    """
+    parts = []
+    stats = {}
+    for name, frame in frames.items():
+        stats[name] = {}
+        tables = []
+        for label, col in (('充电', charge_col), ('放电', discharge_col)):
+            if col not in frame.columns:
+                continue
+            table, stats[name][label] = energy_by_period(frame.index, frame[col])
+            tables.append(table.set_index(['日期', '时段编码'])['电量'].rename(f'{label}电量'))
+        if tables:
+            part = pd.concat(tables, axis=1).fillna(0.0).reset_index()
+            part.insert(0, '表计', name)
+            parts.append(part)
+    columns = ['表计', '日期', '时段', '充电电量', '放电电量', '电价', '充电成本', '放电收益']
+    if not parts:
+        return pd.DataFrame(columns=columns), stats
+    detail = pd.concat(parts, ignore_index=True)
+    for col in ('充电电量', '放电电量'):
+        if col not in detail.columns:
+            detail[col] = 0.0
+    codes = detail['时段编码'].to_numpy()
+    detail['时段'] = PERIOD_NAMES[codes]
+    detail['电价'] = period_prices(codes, tip_electricity_price, peak_electricity_price,
+                                 valley_electricity_price, average_electricity_price)
+    detail['充电成本'] = detail['充电电量'] * detail['电价']
+    detail['放电收益'] = detail['放电电量'] * detail['电价']
+    detail = detail.sort_values(['表计', '日期', '时段编码'], kind='stable')
+    return detail[columns].reset_index(drop=True), stats
+
+
+def arbitrage_summary(detail, by=('表计', '日期')):
+    """
+    汇总套利明细：充放电电量、成本收益、净收益及充放电效率（放电电量/充电电量）
+    by 汇总维度，如 ('表计',)、('表计', '日期')、('表计', '时段')
+    """
+    summary = detail.groupby(list(by), sort=True)[['充电电量', '放电电量', '充电成本', '放电收益']].sum()
+    summary['净收益'] = summary['放电收益'] - summary['充电成本']
+    charge = summary['充电电量'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        summary['充放电效率(%)'] = np.where(charge > 0, summary['放电电量'].to_numpy() / charge * 100, np.nan)
+    return summary
+
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+负荷数据按户号索引及日/月/年汇总
+
+上传文件后一次性将数据按 户号、时间 排序，记录每个户号所在的行区间，并预先计算所有数值列的
+日、月、年平均值。之后切换户号、日期或分析列只需二分查找切片和查表，不再逐行过滤、重复 resample。
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# 汇总粒度 -> pandas Period 频率
+ROLLUP_FREQ = {'daily': 'D', 'monthly': 'M', 'yearly': 'Y'}
+
+
+def file_digest(*file_uploaders):
+    """上传文件内容的 md5，作为缓存键"""
+    md5 = hashlib.md5()
+    for f in file_uploaders:
+        if f is not None:
+            md5.update(f.getvalue())
+    return md5.hexdigest()
+
+
+def build_load_cube(df, user_col='用户编号'):
+    """
+    构建按户号索引的数据及汇总
+    输入参数：
+    df 日期为索引、含 user_col 列的数据
+    user_col 户号列
+    输出参数：dict
+    data 按 户号、时间 排序后的数据
+    users 户号 -> (起始行, 结束行)
+    numeric 数值列
+    daily/monthly/yearly 以 (户号, 周期起始时间) 为索引的各数值列平均值
+    """
+    codes, users = pd.factorize(df[user_col], sort=True)
+    ts = df.index.to_numpy(dtype='datetime64[ns]')
+    order = np.lexsort((ts, codes))
+    data = df.iloc[order]
+    codes = codes[order]
+    bounds = np.searchsorted(codes, np.arange(len(users) + 1))
+    spans = {user: (int(bounds[i]), int(bounds[i + 1])) for i, user in enumerate(users)}
+
+    numeric = data.select_dtypes(include='number').columns.drop(user_col, errors='ignore')
+    cube = {'data': data, 'users': spans, 'numeric': list(numeric), 'user_col': user_col}
+    for level, freq in ROLLUP_FREQ.items():
+        period = data.index.to_period(freq).to_timestamp()
+        rollup = data[numeric].groupby([data[user_col].to_numpy(), period]).mean()
+        rollup.index.names = [user_col, data.index.name]
+        cube[level] = rollup
+    return cube
+
+
+def user_frame(cube, user):
+    """取单个户号的全部数据（连续行切片）"""
+    lo, hi = cube['users'][user]
+    return cube['data'].iloc[lo:hi]
+
+
+def time_slice(frame, start, end):
+    """对时间有序的数据按 [start, end) 二分查找切片"""
+    index = frame.index
+    lo = index.searchsorted(pd.Timestamp(start), side='left')
+    hi = index.searchsorted(pd.Timestamp(end), side='left')
+    return frame.iloc[lo:hi]
+
+
+def day_series(cube, user, day, column):
+    """单个户号某一天的原始数据"""
+    start = pd.Timestamp(day)
+    return time_slice(user_frame(cube, user), start, start + pd.Timedelta(days=1))[column]
+
+
+def rollup_series(cube, level, user, column, start=None, end=None):
+    """
+    从日/月/年汇总中取单个户号某列在 [start, end) 区间的平均值序列
+    level 取 'daily'、'monthly'、'yearly'
+    """
+    series = cube[level].xs(user, level=0)[column]
+    if start is not None or end is not None:
+        series = time_slice(series,
+                            start if start is not None else series.index.min(),
+                            end if end is not None else series.index.max() + pd.Timedelta(days=1))
+    return series
+
+
+def comparison_pivot(cube, users, column, years, level='daily', month=None, day=None):
+    """
+    多户号、多年份对比透视表（户号 × 年份 × 时段）
+    输入参数：
+    users 对比的户号列表
+    column 分析列
+    years 对比的年份列表
+    level 'intraday' 同月同日跨年对比（时段为一天内的时刻，取原始数据）
+          'daily'    同月跨年对比（时段为当月第几天，取日汇总）
+          'monthly'  全年跨年对比（时段为月份，取月汇总）
+    month、day 'intraday' 需要 month、day，'daily' 需要 month
+    输出参数：
+    DataFrame，行为时段，列为 “户号-年份”
+    """
+    if level == 'intraday':
+        pieces = []
+        for user in users:
+            frame = user_frame(cube, user)
+            for year in years:
+                try:
+                    start = pd.Timestamp(year, month, day)
+                except ValueError:  # 如闰年2月29日在其他年份不存在
+                    continue
+                s = time_slice(frame, start, start + pd.Timedelta(days=1))[column]
+                pieces.append(pd.DataFrame({'户号': user, '年份': year,
+                                            '时段': s.index.strftime('%H:%M'), '值': s.to_numpy()}))
+        if not pieces:
+            return pd.DataFrame()
+        long = pd.concat(pieces, ignore_index=True)
+    else:
+        series = cube[level][column]
+        user_index = series.index.get_level_values(0)
+        period = series.index.get_level_values(1)
+        mask = user_index.isin(users) & period.year.isin(years)
+        if level == 'daily':
+            mask &= period.month == month
+        slot = period.day if level == 'daily' else period.month
+        long = pd.DataFrame({'户号': user_index[mask], '年份': period.year[mask],
+                             '时段': slot[mask], '值': series.to_numpy()[mask]})
+    pivot = long.pivot_table(index='时段', columns=['户号', '年份'], values='值', aggfunc='mean')
+    pivot.columns = [f'{u}-{y}' for u, y in pivot.columns]
+    return pivot
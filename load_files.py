@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+多文件负荷数据读取与合并
+
+表计导出按月或按馈线分成多个CSV，此处用线程池并发解析（pandas C 解析器会释放 GIL），
+统一列名与列类型后合并，并按 户号+日期 去除不同文件间重叠时段的重复记录（以后上传的文件为准）；
+同一文件内的重复时间戳不在此处去除，单文件和多文件一致留给数据质量检查报告。
+"""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+MAX_WORKERS = 8
+
+
+def read_one_csv(file_bytes, encoding="gbk", date_col='日期'):
+    """解析单个CSV文件并转换日期列"""
+    df = pd.read_csv(io.BytesIO(file_bytes), encoding=encoding, low_memory=False)
+    df.columns = [str(c).strip() for c in df.columns]
+    df[date_col] = pd.to_datetime(df[date_col])
+    return df
+
+
+def reconcile_frames(frames):
+    """
+    统一多个文件的列类型：某列在部分文件中为数值、部分为文本时，按数值转换
+    输出参数：合并后的DataFrame（列为所有文件列的并集）
+    """
+    numeric_cols = set()
+    for df in frames:
+        numeric_cols.update(df.select_dtypes(include='number').columns)
+    merged = pd.concat(frames, ignore_index=True)
+    for col in numeric_cols:
+        if not pd.api.types.is_numeric_dtype(merged[col]):
+            merged[col] = pd.to_numeric(merged[col], errors='coerce')
+    return merged
+
+
+def read_csv_files(file_bytes_list, encoding="gbk", user_col='用户编号', date_col='日期',
+                   max_workers=MAX_WORKERS):
+    """
+    并发读取多个CSV并合并为一个以日期为索引的数据
+    输入参数：
+    file_bytes_list 各文件内容（bytes），顺序即优先级，文件间重复的记录保留靠后的文件
+    encoding 文件编码
+    user_col 户号列
+    date_col 日期列
+    输出参数：
+    (合并后的数据, 去除的文件间重复记录数)
+    """
+    # 单个文件没有文件间重复，文件内的重复时间戳留给数据质量检查报告
+    if len(file_bytes_list) == 1:
+        return read_one_csv(file_bytes_list[0], encoding, date_col).set_index(date_col), 0
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_bytes_list))) as pool:
+        frames = list(pool.map(lambda b: read_one_csv(b, encoding, date_col), file_bytes_list))
+    df = reconcile_frames(frames)
+    keys = [c for c in (user_col, date_col) if c in df.columns]
+    # 同一 户号+日期 出现在多个文件时只保留最后一个文件中的记录（该文件内的重复原样保留）
+    file_no = pd.Series(np.repeat(np.arange(len(frames)), [len(f) for f in frames]), index=df.index)
+    duplicated = file_no < file_no.groupby([df[c] for c in keys]).transform('max')
+    n_duplicated = int(duplicated.sum())
+    if n_duplicated:
+        df = df[~duplicated]
+    df = df.set_index(date_col)
+    return df, n_duplicated
@@ -2,44 +2,58 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from datetime import timedelta
 import streamlit as st
-import time
+from typical_days import typical_days
+from chart_downsample import downsample
+from data_quality import quality_panel
+from load_files import read_csv_files
+from load_cube import file_digest, build_load_cube, user_frame, day_series, rollup_series, comparison_pivot
 # 设置matplotlib字体支持中文
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 # 页面配置
 st.set_page_config(page_title="负荷分析应用", layout="wide")
 
-def load_and_process_data(file_uploader):
-    """加载并预处理数据"""
-    if file_uploader is not None:
+@st.cache_data(show_spinner='数据处理中...', max_entries=4)
+def read_csv_cached(file_hash, _file_uploaders):
+    """按文件哈希缓存的CSV读取，多个文件并发解析后合并，同一批文件只解析一次；
+    st.cache_data 每次返回副本，调用方原地修改不会影响其他会话"""
+    return read_csv_files([f.getvalue() for f in _file_uploaders])
+@st.cache_resource(show_spinner='构建户号索引及汇总...', max_entries=4)
+def load_cube_cached(cache_key, _df):
+    """按缓存键（文件哈希及插值设置）缓存的户号索引及日/月/年汇总；
+    返回的 dict 在各会话、各次重跑间共享（不复制），只能读取，需要修改时先取切片或 copy"""
+    return build_load_cube(_df)
+def load_and_process_data(file_uploaders, file_hash=None):
+    """加载并预处理数据（支持多个文件），file_hash 为上传文件的哈希（缺省时现算）"""
+    if file_uploaders:
         try:
-            df = pd.read_csv(file_uploader, encoding="gbk", low_memory=False)
-            with st.spinner('数据处理中...'):    
-                time.sleep(2)
-            df['日期'] = pd.to_datetime(df['日期'])
-            df.set_index('日期', inplace=True)
+            df, n_duplicated = read_csv_cached(file_hash or file_digest(*file_uploaders), file_uploaders)
+            if n_duplicated:
+                st.sidebar.info(f"已合并 {len(file_uploaders)} 个文件，去除重叠记录 {n_duplicated} 条。")
             return df
         except Exception as e:
             st.sidebar.error(f"读取或处理文件时出错: {e}")
     return None
-def display_sidebar(df):
+def display_sidebar(cube):
     """侧边栏内容：选择户号和日期
-    输入参数：df load_and_process_data 上传的csv文件读取结果。
+    输入参数：cube build_load_cube 构建的户号索引及汇总。
     输出参数：
     selectbox 下拉列表选择的户号
     selected_date 选择时间数据
     selected_column 选择的分析列
     """
-    unique_users = df['用户编号'].unique() if df is not None else []
+    df = cube['data']
+    unique_users = list(cube['users'])
     selectbox = st.sidebar.selectbox('选择分析的户号:', unique_users,help='选择数据文件中的户号进行分析')
-    min_date = df.index.min().date() if df is not None else None
-    max_date = df.index.max().date() if df is not None else None
+    daily_index = cube['daily'].index.get_level_values(1)
+    min_date = daily_index.min().date()
+    max_date = daily_index.max().date()
     selected_date = st.sidebar.date_input("选择日期：", value=min_date, min_value=min_date, max_value=max_date)
     columns = df.columns
     selected_column = st.sidebar.selectbox('选择一列数据进行分析', columns ,help = "只有数据类型的列可进行选择分析")
     return selectbox, selected_date,selected_column
 
-def plot_fuc(df,selected_column,selected_date):
+def plot_fuc(cube,selectbox,selected_column,selected_date):
     """    
     主页面展示内容
     1、绘制当日数据曲线
@@ -48,27 +62,29 @@ def plot_fuc(df,selected_column,selected_date):
     4、tab展示部分数据
     如出现问题，则输出：择列数据无法分析
     输入参数：
-    df
+    cube build_load_cube 构建的户号索引及汇总
+    selectbox 选择的户号
     selected_date 选择时间数据
     selected_column 选择的分析列
     输出参数：None
     """
     try:
-        df_filtered_date = df[df.index.date == selected_date]
-        df_plot = df_filtered_date[selected_column]
+        df_plot = day_series(cube, selectbox, selected_date, selected_column)
         # 当日数据曲线
         st.subheader(f"{selected_date}当日{selected_column} 数据曲线")
         #f"**负荷最大值:** {data['负荷'].max()}
-        st.line_chart(data = df_plot)
+        st.line_chart(data = downsample(df_plot))
         # 选择当月数据柱状图
-        df_filtered_month = df[(df.index.year == selected_date.year)&((df.index.month == selected_date.month))][selected_column]
-        df_filtered_month = df_filtered_month.resample('D').mean()
+        month_start = pd.Timestamp(selected_date.year, selected_date.month, 1)
+        df_filtered_month = rollup_series(cube, 'daily', selectbox, selected_column,
+                                          month_start, month_start + pd.offsets.MonthBegin(1))
         st.subheader(f"{selected_date.year}年{selected_date.month}月{selected_column} 柱状图")
         st.bar_chart(data = df_filtered_month)
         # 选择当年数据柱状图
         st.subheader(f"{selected_date.year}年 {selected_column} （平均）柱状图")
-        df_filtered_year_data = df[(df.index.year == selected_date.year)][selected_column]
-        df_filtered_year = df_filtered_year_data.resample('M').mean()
+        year_start = pd.Timestamp(selected_date.year, 1, 1)
+        df_filtered_year = rollup_series(cube, 'monthly', selectbox, selected_column,
+                                         year_start, year_start + pd.offsets.YearBegin(1))
         st.bar_chart(data = df_filtered_year)
         # tab部分
         st.subheader('选择数据详情')
@@ -88,21 +104,78 @@ def plot_fuc(df,selected_column,selected_date):
     except:
         st.write("<p style='color:red; font-weight:bold;'>选择列数据无法分析。</p>", unsafe_allow_html=True)
     return None    
+def plot_typical_days(df,selected_column):
+    """
+    典型日概览：将选择列按日聚类为典型日，展示典型日曲线及出现天数
+    输入参数：
+    df 选择户号的数据
+    selected_column 选择的分析列
+    输出参数：None
+    """
+    k = st.sidebar.number_input("典型日数量", value=6, min_value=1, max_value=30, step=1)
+    try:
+        profiles, weights, labels = typical_days(df[selected_column], k=k)
+        st.subheader(f"{selected_column} 典型日曲线")
+        st.line_chart(data = profiles.set_axis(profiles.index.astype(str)))
+        st.dataframe(weights.to_frame().T)
+        with st.expander("日期所属典型日"):
+            st.dataframe(labels)
+    except:
+        st.write("<p style='color:red; font-weight:bold;'>选择列数据无法进行典型日聚类。</p>", unsafe_allow_html=True)
+    return None
+def plot_compare(cube,selectbox,selected_column,selected_date):
+    """
+    对比视图：同日/同月/全年跨年对比，可叠加多个户号
+    输入参数：
+    cube build_load_cube 构建的户号索引及汇总
+    selectbox 选择的户号（默认对比户号）
+    selected_column 选择的分析列
+    selected_date 选择时间数据（提供对比的月、日）
+    输出参数：None
+    """
+    st.subheader("跨年及多户号对比")
+    years_all = sorted(cube['yearly'].index.get_level_values(1).year.unique())
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        mode = st.radio("对比方式", ["同日跨年", "同月跨年", "全年跨年"], horizontal=True)
+    with col2:
+        users = st.multiselect("对比户号", list(cube['users']), default=[selectbox])
+    with col3:
+        years = st.multiselect("对比年份", years_all, default=years_all)
+    if not users or not years:
+        st.info("请选择对比户号和年份！")
+        return None
+    level = {"同日跨年": 'intraday', "同月跨年": 'daily', "全年跨年": 'monthly'}[mode]
+    try:
+        pivot = comparison_pivot(cube, users, selected_column, years, level=level,
+                                 month=selected_date.month, day=selected_date.day)
+        st.line_chart(data = downsample(pivot))
+        with st.expander("对比数据"):
+            st.dataframe(pivot)
+    except:
+        st.write("<p style='color:red; font-weight:bold;'>选择列数据无法进行对比分析。</p>", unsafe_allow_html=True)
+    return None
 def main():
     print('****************************')
     print('开始执行：')
     print('****************************')
-    data_file = st.sidebar.file_uploader('读取CSV文件', type=['csv'],help='支持CSV文件，进行负荷文档数据分析')
-    df = load_and_process_data(data_file)
+    data_files = st.sidebar.file_uploader('读取CSV文件', type=['csv'], accept_multiple_files=True,
+                                          help='支持CSV文件，可同时上传多个（如按月、按馈线导出）的文件合并分析')
+    file_hash = file_digest(*data_files) if data_files else None
+    df = load_and_process_data(data_files, file_hash)
     
     if df is not None:
         st.sidebar.write("<p style='color:green; font-weight:bold;'>文件上传成功。</p>", unsafe_allow_html=True)
+        df = quality_panel(df, cache_key=file_hash)
+        cube = load_cube_cached((file_hash, st.session_state.get('quality_fill'),
+                                 st.session_state.get('quality_max_gap')), df)
         st.subheader("数据预览")
         st.dataframe(df.head())
-        selectbox, selected_date,selected_column = display_sidebar(df)
-        if selectbox and selected_date:
-            df_filtered = df[df['用户编号'] == selectbox]
-            plot_fuc(df_filtered,selected_column,selected_date)
+        selectbox, selected_date,selected_column = display_sidebar(cube)
+        if selectbox is not None and selected_date:
+            plot_fuc(cube,selectbox,selected_column,selected_date)
+            plot_compare(cube,selectbox,selected_column,selected_date)
+            plot_typical_days(user_frame(cube, selectbox),selected_column)
     
     else:
         st.sidebar.write("<p style='color:red; font-weight:bold;'>请上传CSV文件。</p>", unsafe_allow_html=True)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测量数据本地缓存（SQLite）
+
+以 表计(gridAcct、aggregatorNo)、时间间隔、自然日 为键缓存接口返回的数据。结束超过 SETTLE_DAYS 天的日期数据
+视为不再变化，查询时只向接口请求缓存中缺失的日期以及最近几天（仍可能补传数据），其余直接从本地读取。
+没有数据的日期也会缓存，但超过 EMPTY_TTL 后重新请求，以便取到事后补传的数据。
+缓存超过容量上限时按最近访问时间淘汰。每天的数据以列式（ts 数组 + 各参数数组）压缩存储，
+早期按数据项列表存储的缓存读取时自动转换。
+"""
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from eiot_api import TIME_FORMAT, fetch_history
+from measurements import as_columnar, merge_decoded, read_response, slice_decoded, split_days
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.eiot_cache', 'measurements.sqlite')
+MAX_BYTES = 512 * 1024 * 1024
+# 日期结束后再过 SETTLE_DAYS 天才写入缓存（凌晨查询时前一天的数据可能尚未上传完整）
+SETTLE_DAYS = 1
+# 无数据日期的缓存有效期（秒）
+EMPTY_TTL = 24 * 3600
+
+
+def _dumps(data):
+    data = as_columnar(data)
+    columnar = {'ts': data['ts'].tolist(), 'columns': {k: v.tolist() for k, v in data['columns'].items()}}
+    return zlib.compress(json.dumps(columnar, separators=(',', ':')).encode('utf-8'))
+
+
+def _loads(payload):
+    data = json.loads(zlib.decompress(payload))
+    # 早期缓存为数据项列表
+    return {'data': data} if isinstance(data, list) else data
+
+
+class MeasurementCache:
+    """按天缓存测量数据，线程安全"""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS measurements (
+                grid_acct TEXT, aggregator_no TEXT, interval TEXT, day TEXT,
+                payload BLOB, nbytes INTEGER, fetched_at REAL, last_access REAL,
+                PRIMARY KEY (grid_acct, aggregator_no, interval, day))""")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(meter, interval):
+        return str(meter['gridAcct']), str(meter['aggregatorNo']), str(interval)
+
+    def get_days(self, meter, interval, days):
+        """
+        读取缓存的日期数据
+        输出参数：dict 日期 -> 列式字典（只包含命中的日期）
+        """
+        key = self._key(meter, interval)
+        day_strs = [str(d) for d in days]
+        found = {}
+        with self._lock:
+            for i in range(0, len(day_strs), 500):
+                batch = day_strs[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT day, payload, fetched_at FROM measurements WHERE grid_acct=? AND aggregator_no=? AND interval=? "
+                    f"AND day IN ({','.join('?' * len(batch))})", (*key, *batch)).fetchall()
+                for day, payload, fetched_at in rows:
+                    data = as_columnar(_loads(payload))
+                    # 无数据的日期过期后视为未命中，重新请求
+                    if len(data['ts']) == 0 and time.time() - fetched_at > EMPTY_TTL:
+                        continue
+                    found[datetime.date.fromisoformat(day)] = data
+            if found:
+                self._conn.executemany(
+                    "UPDATE measurements SET last_access=? WHERE grid_acct=? AND aggregator_no=? AND interval=? AND day=?",
+                    [(time.time(), *key, str(d)) for d in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(day_strs) - len(found)
+        return found
+
+    def put_days(self, meter, interval, day_items):
+        """写入 dict 日期 -> 列式字典，写入后按容量上限淘汰"""
+        key = self._key(meter, interval)
+        now = time.time()
+        rows = []
+        for day, data in day_items.items():
+            payload = _dumps(data)
+            rows.append((*key, str(day), payload, len(payload), now, now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO measurements VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM measurements").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 按最近访问时间从旧到新删除，直到低于上限
+        excess = total - self.max_bytes
+        rows = self._conn.execute(
+            "SELECT rowid, nbytes FROM measurements ORDER BY last_access").fetchall()
+        victims = []
+        for rowid, nbytes in rows:
+            if excess <= 0:
+                break
+            victims.append((rowid,))
+            excess -= nbytes
+        self._conn.executemany("DELETE FROM measurements WHERE rowid=?", victims)
+        self._conn.commit()
+
+    def stats(self):
+        """缓存统计：命中/未命中天数、缓存天数、占用字节、上限"""
+        with self._lock:
+            entries, nbytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM measurements").fetchone()
+        total = self.hits + self.misses
+        return {'命中天数': self.hits, '未命中天数': self.misses,
+                '命中率(%)': round(self.hits / total * 100, 1) if total else 0.0,
+                '缓存天数': entries, '占用(MB)': round(nbytes / 1024 / 1024, 2),
+                '上限(MB)': round(self.max_bytes / 1024 / 1024, 2)}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM measurements")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self.hits = self.misses = 0
+
+
+def _day_range(first, last):
+    return [first + datetime.timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def _day_runs(days):
+    """将有序日期列表合并为连续区间 [(开始日, 结束日), ...]"""
+    runs = []
+    for day in days:
+        if runs and day == runs[-1][1] + datetime.timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+
+def cached_fetch_history(meter, start_time, end_time, interval, cache, today=None, **kwargs):
+    """
+    带本地缓存的测量数据查询，参数同 fetch_history，返回列式字典 {'success', 'ts', 'columns'}。
+    缓存按整天读写：缺失的日期整天向接口请求（流式解码），早于 today - SETTLE_DAYS 的日期写入缓存，
+    最近几天及以后的日期每次都请求接口。
+    """
+    start = datetime.datetime.strptime(str(start_time), TIME_FORMAT)
+    end = datetime.datetime.strptime(str(end_time), TIME_FORMAT)
+    today = today or datetime.date.today()
+    days = _day_range(start.date(), end.date())
+    settled = today - datetime.timedelta(days=SETTLE_DAYS)
+    found = cache.get_days(meter, interval, [d for d in days if d < settled])
+    missing = [d for d in days if d not in found]
+
+    success = True
+    for first, last in _day_runs(missing):
+        result = fetch_history(meter, f"{first} 00:00:00", f"{last} 23:59:59", interval,
+                               consume=read_response, merge=merge_decoded, **kwargs)
+        success = success and bool(result.get('success'))
+        empty = {'ts': result['ts'][:0], 'columns': {k: v[:0] for k, v in result['columns'].items()}}
+        fetched = {d: empty for d in _day_range(first, last)}
+        fetched.update(split_days(result))
+        found.update(fetched)
+        if result.get('success'):
+            cache.put_days(meter, interval, {d: data for d, data in fetched.items() if d < settled})
+
+    merged = merge_decoded([found[d] for d in days if d in found])
+    merged['success'] = success
+    return slice_decoded(merged, int(start.timestamp() * 1000), int(end.timestamp() * 1000))
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测量数据后台增量同步
+
+独立进程中运行 asyncio 循环，定期将所有已配置表计的新测量数据追加到本地列式存储（按 表计/时间间隔/月
+分文件的 Parquet）。每个 表计+时间间隔 记录水位线（已同步的最新时间），每次只请求水位线之后的数据，
+并回看 SYNC_OVERLAP 以补上接口延迟到达的点。页面直接读取本地数据，不受接口响应速度影响。
+
+运行：python measurement_sync.py --interval 15 --interval 60 --period 300
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import threading
+
+import pandas as pd
+
+from eiot_api import METERS, TIME_FORMAT, fetch_history
+from measurements import decode_measurements, merge_decoded, read_response
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.eiot_store')
+SYNC_INTERVALS = ('15',)
+SYNC_PERIOD = 300
+BACKFILL_DAYS = 30
+SYNC_OVERLAP = datetime.timedelta(hours=1)
+
+
+def _atomic_write(path, write):
+    """先写临时文件再替换，读取方不会读到写了一半的文件（目录只在写入时创建）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp'
+    write(tmp)
+    os.replace(tmp, path)
+
+
+class MeasurementStore:
+    """本地列式存储：每个 表计/时间间隔/月 一个 Parquet 文件，另有水位线文件"""
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._watermark_path = os.path.join(root, 'watermarks.json')
+
+    @staticmethod
+    def _key(meter, interval):
+        return f"{meter['gridAcct']}_{meter['aggregatorNo']}_{interval}"
+
+    def _month_path(self, meter, interval, month):
+        return os.path.join(self.root, self._key(meter, interval), f'{month}.parquet')
+
+    def append(self, meter, interval, frame):
+        """追加 decode_measurements 格式的数据，同一时间点以新数据为准"""
+        if frame.empty:
+            return
+        with self._lock:
+            for month, part in frame.groupby(frame.index.to_period('M')):
+                path = self._month_path(meter, interval, month)
+                if os.path.exists(path):
+                    part = pd.concat([pd.read_parquet(path), part])
+                    part = part[~part.index.duplicated(keep='last')].sort_index()
+                _atomic_write(path, lambda tmp: part.to_parquet(tmp, engine='pyarrow'))
+
+    def read(self, meter, interval, start_time, end_time):
+        """读取 [start_time, end_time] 的本地数据，格式同 decode_measurements"""
+        start = pd.Timestamp(start_time)
+        end = pd.Timestamp(end_time)
+        frames = []
+        for month in pd.period_range(start, end, freq='M'):
+            path = self._month_path(meter, interval, month)
+            if os.path.exists(path):
+                frames.append(pd.read_parquet(path))
+        if not frames:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name='ts'))
+        frame = pd.concat(frames).sort_index()
+        return frame.loc[start:end]
+
+    def watermarks(self):
+        if not os.path.exists(self._watermark_path):
+            return {}
+        with open(self._watermark_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def get_watermark(self, meter, interval):
+        value = self.watermarks().get(self._key(meter, interval))
+        return datetime.datetime.strptime(value, TIME_FORMAT) if value else None
+
+    def set_watermark(self, meter, interval, moment):
+        with self._lock:
+            marks = self.watermarks()
+            marks[self._key(meter, interval)] = pd.Timestamp(moment).strftime(TIME_FORMAT)
+
+            def write(tmp):
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(marks, f, ensure_ascii=False, indent=2)
+            _atomic_write(self._watermark_path, write)
+
+
+def sync_once(store, meters=None, intervals=SYNC_INTERVALS, backfill_days=BACKFILL_DAYS, now=None):
+    """
+    对所有 表计 × 时间间隔 同步一次水位线之后的数据
+    输出参数：每个 表计+时间间隔 的同步结果列表
+    """
+    meters = METERS if meters is None else meters
+    now = now or datetime.datetime.now().replace(microsecond=0)
+    results = []
+    for name, meter in meters.items():
+        for interval in intervals:
+            watermark = store.get_watermark(meter, interval)
+            if watermark is None:
+                start = datetime.datetime.combine(now.date() - datetime.timedelta(days=backfill_days), datetime.time())
+            else:
+                start = watermark - SYNC_OVERLAP
+            try:
+                data = fetch_history(meter, start.strftime(TIME_FORMAT), now.strftime(TIME_FORMAT), interval,
+                                     consume=read_response, merge=merge_decoded)
+            except Exception as e:
+                results.append({'表计': name, '时间间隔': interval, '状态': f'失败: {e}'})
+                continue
+            if not data.get('success'):
+                results.append({'表计': name, '时间间隔': interval, '状态': '接口返回失败'})
+                continue
+            frame = decode_measurements(data)
+            store.append(meter, interval, frame)
+            if not frame.empty:
+                store.set_watermark(meter, interval, frame.index.max())
+            results.append({'表计': name, '时间间隔': interval, '状态': '成功', '获取点数': len(frame)})
+    return results
+
+
+async def sync_forever(store, period=SYNC_PERIOD, **kwargs):
+    """每 period 秒同步一次；同步在线程中执行，不阻塞事件循环"""
+    while True:
+        started = datetime.datetime.now()
+        results = await asyncio.to_thread(sync_once, store, **kwargs)
+        for r in results:
+            print(started.strftime(TIME_FORMAT), r)
+        await asyncio.sleep(period)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量数据后台增量同步')
+    parser.add_argument('--interval', action='append', help='时间间隔（分钟），可重复指定，默认15')
+    parser.add_argument('--period', type=int, default=SYNC_PERIOD, help='同步周期（秒）')
+    parser.add_argument('--backfill-days', type=int, default=BACKFILL_DAYS, help='首次同步回补天数')
+    parser.add_argument('--store', default=STORE_DIR, help='本地存储目录')
+    parser.add_argument('--once', action='store_true', help='只同步一次后退出')
+    args = parser.parse_args()
+    store = MeasurementStore(args.store)
+    kwargs = {'intervals': tuple(args.interval or SYNC_INTERVALS), 'backfill_days': args.backfill_days}
+    if args.once:
+        for r in sync_once(store, **kwargs):
+            print(r)
+    else:
+        asyncio.run(sync_forever(store, period=args.period, **kwargs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测量数据解码
+
+将接口返回的 {'success': ..., 'data': [{'ts': 毫秒时间戳, 'data': {参数: 值}}, ...]} 一次性转换为
+以时间为索引、每个参数一列的数值型 DataFrame，时间戳整列向量化转换。各参数的分析视图都从该数据切片。
+
+长时间段查询使用流式解码（read_response）：边接收响应边解析 data 数组，逐项直接写入预分配的 NumPy
+列缓冲区，不保留整个响应内容、解析后的 Python 列表等中间副本。解码结果为列式字典
+{'success': ..., 'ts': 毫秒时间戳数组, 'columns': {参数: float 数组}}，decode_measurements 同样接受。
+"""
+
+import codecs
+import datetime
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+# 与 datetime.fromtimestamp 一致，按本机时区转换时间戳
+LOCAL_TZ = datetime.datetime.now().astimezone().tzinfo
+
+
+def epoch_ms_to_local(ts):
+    """毫秒时间戳数组 -> 本地时间（无时区）的 DatetimeIndex"""
+    index = pd.to_datetime(np.asarray(ts, dtype=np.int64), unit='ms', utc=True)
+    return index.tz_convert(LOCAL_TZ).tz_localize(None)
+
+
+# 流式读取响应的块大小
+READ_CHUNK = 64 * 1024
+# 初始缓冲区点数（无法从 Content-Length 估算时）
+INITIAL_CAPACITY = 4096
+_WS = re.compile(r'[ \t\n\r]*')
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class MeasurementBuffers:
+    """预分配的列缓冲区：ts 为 int64 毫秒时间戳，每个参数一列 float64，缺失为 NaN，容量不足时翻倍"""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.n = 0
+        self.capacity = max(int(capacity), 1)
+        self.ts = np.empty(self.capacity, dtype=np.int64)
+        self.columns = {}
+
+    def reserve(self, capacity):
+        if capacity > self.capacity:
+            self.capacity = int(capacity)
+            self.ts.resize(self.capacity, refcheck=False)
+            for col in self.columns.values():
+                col.resize(self.capacity, refcheck=False)
+                col[self.n:] = np.nan
+
+    def append(self, item):
+        if self.n == self.capacity:
+            self.reserve(self.capacity * 2)
+        n = self.n
+        self.ts[n] = item['ts']
+        for name, value in (item.get('data') or {}).items():
+            col = self.columns.get(name)
+            if col is None:
+                col = self.columns[name] = np.full(self.capacity, np.nan)
+            col[n] = _to_float(value)
+        self.n += 1
+
+    def result(self):
+        """截断到实际点数（原地缩小，不复制），返回 (ts, columns)"""
+        self.ts.resize(self.n, refcheck=False)
+        for col in self.columns.values():
+            col.resize(self.n, refcheck=False)
+        self.capacity = self.n
+        return self.ts, self.columns
+
+
+class StreamDecoder:
+    """
+    接口响应的增量解码器：feed() 逐块送入响应字节，close() 返回列式结果。
+    顶层除 data 以外的字段（success、code、msg 等）原样保留；data 数组逐项解析后写入 MeasurementBuffers，
+    只在内存中保留尚未解析完的一小段文本。
+    """
+
+    def __init__(self, content_length=None):
+        self.content_length = content_length
+        self.buffers = MeasurementBuffers()
+        self.fields = {}
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._text = ''
+        self._pos = 0
+        self._state = 'start'
+        self._key = None
+
+    def feed(self, chunk):
+        self._text = self._text[self._pos:] + self._utf8.decode(chunk)
+        self._pos = 0
+        self._parse(final=False)
+
+    def close(self):
+        self._text = self._text[self._pos:] + self._utf8.decode(b'', final=True)
+        self._pos = 0
+        self._parse(final=True)
+        if self._state != 'done':
+            raise ValueError('接口响应不完整')
+        ts, columns = self.buffers.result()
+        return {**self.fields, 'ts': ts, 'columns': columns}
+
+    def _value(self, final):
+        """解析当前位置的一个 JSON 值；数据不完整时返回 None 等待后续数据"""
+        try:
+            value, end = self._decoder.raw_decode(self._text, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None
+        # 恰好在缓冲区末尾结束的数字可能被截断，等待后续数据
+        if end == len(self._text) and not final:
+            return None
+        self._pos = end
+        return (value,)
+
+    def _reserve_from_length(self, item_start):
+        """首个数据项解析后按 Content-Length / 单项字节数 估算总点数并一次性预分配"""
+        item_chars = self._pos - item_start
+        if self.content_length and item_chars > 0:
+            self.buffers.reserve(int(self.content_length / item_chars * 1.05) + 16)
+
+    def _parse(self, final):
+        text = self._text
+        while True:
+            self._pos = _WS.match(text, self._pos).end()
+            if self._pos >= len(text):
+                return
+            c = text[self._pos]
+            if self._state == 'start':
+                if c != '{':
+                    raise ValueError('接口响应不是 JSON 对象')
+                self._pos += 1
+                self._state = 'key'
+            elif self._state == 'key':
+                if c == '}':
+                    self._pos += 1
+                    self._state = 'done'
+                elif c == ',':
+                    self._pos += 1
+                else:
+                    parsed = self._value(final)
+                    if parsed is None:
+                        return
+                    self._key = parsed[0]
+                    self._state = 'colon'
+            elif self._state == 'colon':
+                if c != ':':
+                    raise ValueError('接口响应格式错误')
+                self._pos += 1
+                self._state = 'value'
+            elif self._state == 'value':
+                if self._key == 'data' and c == '[':
+                    self._pos += 1
+                    self._state = 'items'
+                else:
+                    parsed = self._value(final)
+                    if parsed is None:
+                        return
+                    self.fields[self._key] = parsed[0]
+                    self._state = 'key'
+            elif self._state == 'items':
+                if c == ']':
+                    self._pos += 1
+                    self._state = 'key'
+                elif c == ',':
+                    self._pos += 1
+                else:
+                    item_start = self._pos
+                    parsed = self._value(final)
+                    if parsed is None:
+                        return
+                    if self.buffers.n == 0:
+                        self._reserve_from_length(item_start)
+                    self.buffers.append(parsed[0])
+            else:
+                raise ValueError('接口响应结束后有多余内容')
+
+
+def read_response(res, chunk_size=READ_CHUNK):
+    """
+    流式读取并解码 http.client 响应（作为 fetch_history 的 consume 参数）
+    输出参数：列式字典 {'success', ..., 'ts', 'columns'}
+    """
+    length = res.getheader('Content-Length')
+    decoder = StreamDecoder(int(length) if length and length.isdigit() else None)
+    while True:
+        chunk = res.read(chunk_size)
+        if not chunk:
+            break
+        decoder.feed(chunk)
+    return decoder.close()
+
+
+def as_columnar(data):
+    """接口返回字典（data 为数据项列表）或列式字典 -> 列式字典"""
+    if 'columns' in data:
+        return {**data, 'ts': np.asarray(data['ts'], dtype=np.int64),
+                'columns': {k: np.asarray(v, dtype=float) for k, v in data['columns'].items()}}
+    items = data.get('data') or []
+    buffers = MeasurementBuffers(len(items))
+    for item in items:
+        buffers.append(item)
+    ts, columns = buffers.result()
+    fields = {k: v for k, v in data.items() if k != 'data'}
+    return {**fields, 'ts': ts, 'columns': columns}
+
+
+def merge_decoded(parts):
+    """按时间顺序合并多个列式结果（各子区间、各天），同一时间点保留先出现的"""
+    names = list(dict.fromkeys(name for p in parts for name in p['columns']))
+    ts = np.concatenate([p['ts'] for p in parts]) if parts else np.empty(0, dtype=np.int64)
+    columns = {name: np.concatenate([p['columns'].get(name, np.full(len(p['ts']), np.nan)) for p in parts])
+               for name in names}
+    if len(ts) and np.any(np.diff(ts) <= 0):
+        order = np.argsort(ts, kind='stable')
+        ts = ts[order]
+        keep = np.r_[True, np.diff(ts) != 0]
+        order = order[keep]
+        ts = ts[keep]
+        columns = {name: col[order] for name, col in columns.items()}
+    return {'success': all(p.get('success') for p in parts), 'ts': ts, 'columns': columns}
+
+
+def split_days(data):
+    """列式结果按本地自然日切分：{日期: 列式字典}"""
+    data = as_columnar(data)
+    ts = data['ts']
+    if len(ts) == 0:
+        return {}
+    days = epoch_ms_to_local(ts).values.astype('datetime64[D]')
+    if np.any(days[1:] < days[:-1]):
+        merged = merge_decoded([data])
+        return split_days({**merged, 'success': data.get('success')})
+    unique, starts = np.unique(days, return_index=True)
+    bounds = np.r_[starts, len(ts)]
+    return {day.item(): {'ts': ts[a:b], 'columns': {k: v[a:b] for k, v in data['columns'].items()}}
+            for day, a, b in zip(unique, bounds[:-1], bounds[1:])}
+
+
+def slice_decoded(data, start_ms, end_ms):
+    """截取 [start_ms, end_ms] 的列式结果（ts 已升序）"""
+    lo = np.searchsorted(data['ts'], start_ms, side='left')
+    hi = np.searchsorted(data['ts'], end_ms, side='right')
+    return {**data, 'ts': data['ts'][lo:hi], 'columns': {k: v[lo:hi] for k, v in data['columns'].items()}}
+
+
+def decode_measurements(data):
+    """
+    接口返回结果 -> 全部参数的时间索引数据
+    输入参数：data 解析后的接口返回字典，或 read_response / merge_decoded 的列式字典
+    输出参数：DataFrame，索引为 ts（本地时间，升序），列为各测量参数（float）
+    """
+    if 'columns' in data:
+        frame = pd.DataFrame(data['columns'], copy=False)
+        frame.index = epoch_ms_to_local(data['ts']).rename('ts')
+        if not frame.index.is_monotonic_increasing:
+            frame = frame.sort_index(kind='stable')
+        return frame
+    items = data.get('data') or []
+    ts = np.fromiter((item['ts'] for item in items), dtype=np.int64, count=len(items))
+    frame = pd.DataFrame.from_records([item['data'] for item in items])
+    frame = frame.apply(pd.to_numeric, errors='coerce')
+    frame.index = epoch_ms_to_local(ts).rename('ts')
+    if not frame.index.is_monotonic_increasing:
+        frame = frame.sort_index(kind='stable')
+    return frame
+
+
+def align_meters(frames, column, interval):
+    """
+    多表计同一参数对齐到公共时间索引
+    输入参数：
+    frames {表计名称: decode_measurements 格式的数据}
+    column 参数名
+    interval 时间间隔（分钟）
+    输出参数：DataFrame，索引为 interval 对齐的连续时间，每个表计一列，缺失为 NaN
+    """
+    step = pd.Timedelta(minutes=int(interval))
+    series = {}
+    for name, frame in frames.items():
+        if column not in frame.columns or frame.empty:
+            continue
+        # set_axis 返回新的 Series，不改动 frame 缓存的列
+        s = frame[column].set_axis(frame.index.floor(step))
+        if s.index.has_duplicates:
+            s = s.groupby(level=0).mean()
+        series[name] = s
+    if not series:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='ts'))
+    wide = pd.concat(series, axis=1, sort=True)
+    full = pd.date_range(wide.index.min(), wide.index.max(), freq=step, name='ts')
+    return wide.reindex(full)
+
+
+def aggregate_meters(wide, how='sum'):
+    """对齐后的多表计数据按时间汇总（sum 合计 / mean 平均），全部缺失的时间点为 NaN"""
+    if how == 'mean':
+        return wide.mean(axis=1)
+    return wide.sum(axis=1, min_count=1)
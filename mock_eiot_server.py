@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+eiot6 测量数据历史接口本地模拟服务
+
+实现 /vpp-aggr/open-api/v1/control_unit/measurements/history 的请求/响应格式，按 generate_token 的签名方式
+校验 X-ACCESS-* 请求头，按任意时间间隔和日期范围生成确定性的模拟测量数据，并可注入延迟和错误，
+用于离线测试和压测 interface_read_data / fetch_history / data_process / plot_data 的数据链路。
+
+运行：python mock_eiot_server.py --port 8765 --latency 50 --error-rate 0.05
+"""
+
+import argparse
+import datetime
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from eiot_api import ACCESS_KEY, ACCESS_SECRET, HISTORY_PATH, TIME_FORMAT, kv_tokenize
+
+# 允许的客户端时间戳偏差（毫秒）
+MAX_CLOCK_SKEW_MS = 5 * 60 * 1000
+# 模拟储能：谷时段充电、尖峰时段放电（小时区间）
+CHARGE_HOURS = ((0, 6), (12, 14))
+DISCHARGE_HOURS = ((18, 22),)
+
+
+def expected_token(access_key, access_secret, access_ts, http_method, url):
+    """按 generate_token 的规则计算签名（url 为客户端签名时的转义后URL）"""
+    sign_key = kv_tokenize({
+        "accessKey": access_key,
+        "accessTs": access_ts,
+        "httpMethod": http_method,
+        "url": url
+    })
+    return hmac.new(sign_key.encode(), access_secret.encode(), hashlib.sha256).hexdigest()
+
+
+def _active_minutes(minute_of_day, windows):
+    """当日 0 点到 minute_of_day 之间落在 windows 内的分钟数（向量化）"""
+    total = np.zeros_like(minute_of_day)
+    for lo, hi in windows:
+        total += np.clip(minute_of_day - lo * 60, 0, (hi - lo) * 60)
+    return total
+
+
+def synthetic_measurements(start_time, end_time, interval):
+    """
+    生成 [start_time, end_time] 内按 interval 分钟对齐的模拟测量数据
+    输出参数：接口格式的 data 列表 [{'ts': 毫秒时间戳, 'data': {...}}, ...]
+    """
+    start = datetime.datetime.strptime(start_time, TIME_FORMAT)
+    end = datetime.datetime.strptime(end_time, TIME_FORMAT)
+    step = int(interval) * 60
+    first = int(np.ceil(start.timestamp() / step)) * step
+    seconds = np.arange(first, end.timestamp() + 1, step, dtype=np.int64)
+    if len(seconds) == 0:
+        return []
+    # 以首个点的本地时间为基准推算本地分钟数，避免逐点转换
+    local = datetime.datetime.fromtimestamp(int(seconds[0]))
+    base_minute = local.hour * 60 + local.minute
+    minutes = (seconds - seconds[0]) // 60 + base_minute
+    day, minute_of_day = np.divmod(minutes, 1440)
+    day = day + local.toordinal()
+
+    charge_per_day = sum(hi - lo for lo, hi in CHARGE_HOURS) * 60
+    discharge_per_day = sum(hi - lo for lo, hi in DISCHARGE_HOURS) * 60
+    total_charge = 0.5 * (day * charge_per_day + _active_minutes(minute_of_day, CHARGE_HOURS))
+    total_discharge = 0.45 * (day * discharge_per_day + _active_minutes(minute_of_day, DISCHARGE_HOURS))
+    noise = np.sin(seconds / 977.0) * 20
+    p = 500 + 300 * np.sin((minute_of_day - 360) / 1440 * 2 * np.pi) + noise
+    soc = 50 + 40 * np.sin((minute_of_day - 600) / 1440 * 2 * np.pi)
+
+    columns = {
+        'P': np.round(p, 3), 'Q': np.round(p * 0.2, 3), 'SOC': np.round(soc, 2),
+        'TotalChargeEnergy': np.round(total_charge, 2), 'TotalDischargeEnergy': np.round(total_discharge, 2),
+    }
+    names = list(columns)
+    values = np.column_stack([columns[n] for n in names]).tolist()
+    return [{'ts': int(s) * 1000, 'data': dict(zip(names, row))} for s, row in zip(seconds, values)]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockEiot/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+        if server.latency_ms:
+            time.sleep(random.expovariate(1.0 / server.latency_ms) / 1000)
+        parsed = urlparse(self.path)
+        if parsed.path != HISTORY_PATH:
+            return self._send_json(404, {'success': False, 'msg': 'not found'})
+        if random.random() < server.error_rate:
+            return self._send_json(random.choice((429, 500, 503)), {'success': False, 'msg': 'injected error'})
+
+        # 校验签名：客户端签名所用的转义后查询串即请求中的查询串
+        access_key = self.headers.get('X-ACCESS-KEY', '')
+        token = self.headers.get('X-ACCESS-TOKEN', '')
+        access_ts = self.headers.get('X-ACCESS-TS', '')
+        if access_key != server.access_key or not access_ts.isdigit():
+            return self._send_json(401, {'success': False, 'msg': 'invalid access key'})
+        if abs(int(access_ts) - int(time.time() * 1000)) > MAX_CLOCK_SKEW_MS:
+            return self._send_json(401, {'success': False, 'msg': 'timestamp expired'})
+        signed_url = f'https://{server.signed_host}{parsed.path}?{parsed.query}'
+        expected = expected_token(access_key, server.access_secret, access_ts, 'GET', signed_url)
+        if not hmac.compare_digest(expected, token):
+            return self._send_json(401, {'success': False, 'msg': 'invalid token'})
+
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        try:
+            data = synthetic_measurements(params['startDate'], params['endDate'], params.get('interval', '15'))
+        except (KeyError, ValueError) as e:
+            return self._send_json(400, {'success': False, 'msg': f'bad request: {e}'})
+        self._send_json(200, {'success': True, 'code': 200, 'data': data})
+
+
+def make_server(host='127.0.0.1', port=0, latency_ms=0, error_rate=0.0, signed_host=None,
+                access_key=ACCESS_KEY, access_secret=ACCESS_SECRET, verbose=False):
+    """
+    创建模拟服务（未启动）
+    signed_host 客户端签名URL中的主机名，缺省为 'host:实际端口'
+    """
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.latency_ms = latency_ms
+    server.error_rate = error_rate
+    server.signed_host = signed_host or f'{host}:{server.server_address[1]}'
+    server.access_key = access_key
+    server.access_secret = access_secret
+    server.verbose = verbose
+    server.request_count = 0
+    server.lock = threading.Lock()
+    return server
+
+
+def start_in_thread(**kwargs):
+    """在后台线程中启动模拟服务，返回 server（server.signed_host 即客户端应使用的 host）"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='eiot6 测量数据历史接口本地模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0, help='平均注入延迟（毫秒，指数分布）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='注入 429/5xx 错误的比例')
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.latency, args.error_rate, verbose=True)
+    print(f'模拟服务已启动: http://{server.signed_host}{HISTORY_PATH}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,10 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from datetime import timedelta,time
 import streamlit as st
+from typical_days import typical_days, to_weighted_frame
+from chart_downsample import downsample
+from data_quality import quality_panel
+from load_cube import file_digest
 
 # 设置matplotlib字体支持中文
 plt.rcParams['font.sans-serif'] = ['SimHei']
@@ -40,6 +44,8 @@ def display_sidebar(df):
     low_end_time = st.sidebar.time_input("设置谷时段结束时间",step=3600,value=time(14, 0))
     up_start_time = st.sidebar.time_input("设置尖时段开始时间",step=3600,value=time(18, 0),help='默认18点开始')
     up_end_time = st.sidebar.time_input("设置尖时段结束时间",step=3600,value=time(20, 0))
+    use_typical = st.sidebar.checkbox("按典型日测算", value=False, help='将所选户号的负荷聚类为典型日，按出现天数加权进行装机量测算；不勾选时按上传文件的全部数据测算')
+    typical_k = st.sidebar.number_input("典型日数量", value=6, min_value=1, max_value=30, step=1)
         # 检查时间设置是否正确
     if low_start_time.hour == up_start_time.hour or low_end_time.hour == up_end_time.hour:
         st.sidebar.warning(":red[***谷时段与尖时段的开始、结束时间一致，请检查！***]")
@@ -52,7 +58,7 @@ def display_sidebar(df):
     else:
         st.sidebar.warning(":red[***存在开始时间大于结束时间的情况，请检查！***]")
 
-    return selectbox, selected_date,main_capacity,ues_per,CT,PT,select_power_start,select_power_step
+    return selectbox, selected_date,main_capacity,ues_per,CT,PT,select_power_start,select_power_step,use_typical,typical_k
 
 def calculate_metrics(df):
     """计算负荷特性指标"""
@@ -95,7 +101,7 @@ def plot_results(df_filtered,selected_date, p_day_av, r_day, P_day_std, Sd, df_m
     power_day = df_filtered[df_filtered.index.date==selected_datetime.date()]
     #print('power_day:',power_day)
     #power_day.set_index('time', inplace=True)
-    st.line_chart(power_day)
+    st.line_chart(downsample(power_day))
     
     ## 选择日期输入当月负荷柱状图
     #print('输出月份：',month)
@@ -147,7 +153,7 @@ def plot_results(df_filtered,selected_date, p_day_av, r_day, P_day_std, Sd, df_m
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("日平均负荷")
-        st.line_chart(p_day_av)
+        st.line_chart(downsample(p_day_av))
     with col2:
         st.subheader("月平均负荷")
         st.bar_chart(df_month)
@@ -155,7 +161,7 @@ def plot_results(df_filtered,selected_date, p_day_av, r_day, P_day_std, Sd, df_m
     col3, col4 = st.columns(2)
     with col3:
         st.subheader("日负荷率")
-        st.line_chart(r_day)
+        st.line_chart(downsample(r_day))
     with col4:
         st.subheader("日负荷波动率")
         st.bar_chart(Sd)
@@ -186,7 +192,11 @@ def power_lower(df, selectbox, selected_date,main_capacity,ues_per,CT,PT,select_
     rate =[]
     power = []
     for i in range(select_power_start,select_power_start+select_power_step*50,select_power_step):
-        re= filtered_df[filtered_df['瞬时有功']<i].shape[0]/filtered_df.shape[0]
+        if 'weight' in filtered_df.columns:
+            # 典型日数据：按典型日出现天数加权
+            re= filtered_df.loc[filtered_df['瞬时有功']<i,'weight'].sum()/filtered_df['weight'].sum()
+        else:
+            re= filtered_df[filtered_df['瞬时有功']<i].shape[0]/filtered_df.shape[0]
         re = round(re,4)
         power.append(i)
         rate.append(re)
@@ -262,7 +272,11 @@ def power_up(df, selectbox, selected_date,main_capacity,ues_per,CT,PT,select_pow
     rate =[]
     power = []
     for i in range(select_power_start,select_power_start+select_power_step*50,select_power_step):
-        re= filtered_df[filtered_df['瞬时有功']<i].shape[0]/filtered_df.shape[0]
+        if 'weight' in filtered_df.columns:
+            # 典型日数据：按典型日出现天数加权
+            re= filtered_df.loc[filtered_df['瞬时有功']<i,'weight'].sum()/filtered_df['weight'].sum()
+        else:
+            re= filtered_df[filtered_df['瞬时有功']<i].shape[0]/filtered_df.shape[0]
         re = round(re,4)
         power.append(i)
         rate.append(re)
@@ -320,6 +334,7 @@ def main():
     
     if df is not None:
         st.sidebar.write("<p style='color:green; font-weight:bold;'>文件上传成功。</p>", unsafe_allow_html=True)
+        df = quality_panel(df, cache_key=file_digest(data_file))
         st.subheader("数据预览")
         options = st.multiselect('选择列:'
                                   , list(df.columns)
@@ -332,11 +347,20 @@ def main():
             st.warning(':red[**请至少选择一列**]')
         # st.dataframe(df.head())
         
-        selectbox, selected_date,main_capacity,ues_per,CT,PT,select_power_start,select_power_step = display_sidebar(df)
+        selectbox, selected_date,main_capacity,ues_per,CT,PT,select_power_start,select_power_step,use_typical,typical_k = display_sidebar(df)
         if selectbox and selected_date:
             df_filtered = df[df['用户编号'] == selectbox]
             p_day_av, r_day, _, P_day_std, Sd, df_month = calculate_metrics(df_filtered)
             plot_results(df_filtered,selected_date, p_day_av, r_day, P_day_std, Sd, df_month)
+        if use_typical:
+            profiles, weights, _ = typical_days(df[df['用户编号'] == selectbox]['瞬时有功'], k=typical_k)
+            st.write('______________________________________')
+            st.subheader('典型日负荷曲线')
+            st.line_chart(profiles.set_axis(profiles.index.astype(str)))
+            st.dataframe(weights.to_frame().T)
+            df = to_weighted_frame(profiles, weights)
+            st.info(f'以下装机量按户号 {selectbox} 的 {len(weights)} 个典型日（按出现天数加权）测算，'
+                    f'不勾选“按典型日测算”时按上传文件的全部数据测算。')
         #中午谷电时间段数据判断装机量分析函数
         power_lower(df, selectbox, selected_date,main_capacity,ues_per,CT,PT,select_power_start,select_power_step)
         #尖峰时间段数据判断装机量分析函数
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测量数据查询链路计时及用量统计
+
+记录各阶段耗时（签名、建连、服务端响应、下载及解码、DataFrame 处理、绘图等）、每个表计的请求次数、
+重试/失败次数和传输字节数。各阶段保留最近 WINDOW 次耗时，计算滚动 p50/p95/p99；请求次数按自然日
+累计，用于核对接口配额。进程内共享（Streamlit 各会话共用 METRICS），可导出到本地指标文件。
+"""
+
+import collections
+import datetime
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+METRICS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.eiot_metrics', 'metrics.jsonl')
+WINDOW = 1000
+PERCENTILES = (50, 95, 99)
+
+
+class MetricsRecorder:
+    """线程安全的计时及计数记录器"""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self._timings = collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+            self._totals = collections.defaultdict(lambda: [0, 0.0])
+            self._meters = collections.defaultdict(collections.Counter)
+            self._daily = collections.defaultdict(collections.Counter)
+
+    def observe(self, stage, seconds, meter=None):
+        """记录一次阶段耗时（秒）；meter 非空时同时计入该表计的阶段耗时"""
+        with self._lock:
+            for key in ((stage, None), (stage, meter)) if meter else ((stage, None),):
+                self._timings[key].append(seconds)
+                total = self._totals[key]
+                total[0] += 1
+                total[1] += seconds
+
+    def count(self, meter, **counts):
+        """累加表计计数，如 count(meter, 请求次数=1, 字节数=n)；请求次数同时按自然日累计"""
+        with self._lock:
+            self._meters[meter].update(counts)
+            if '请求次数' in counts:
+                self._daily[str(datetime.date.today())][meter] += counts['请求次数']
+
+    @contextmanager
+    def stage(self, stage, meter=None):
+        """with METRICS.stage('绘图'): ... 记录代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, meter)
+
+    def stage_table(self, by_meter=False):
+        """
+        阶段耗时统计
+        输出参数：记录列表 [{'阶段', ('表计'), '次数', '平均(ms)', 'p50(ms)', 'p95(ms)', 'p99(ms)', '累计(s)'}]
+        """
+        with self._lock:
+            items = [(key, np.array(values), list(self._totals[key])) for key, values in self._timings.items()
+                     if (key[1] is not None) == by_meter]
+        rows = []
+        for (stage, meter), values, (n, total) in sorted(items, key=lambda x: (x[0][0], str(x[0][1]))):
+            row = {'阶段': stage}
+            if by_meter:
+                row['表计'] = meter
+            ms = values * 1000
+            row.update({'次数': n, '平均(ms)': round(total / n * 1000, 1)})
+            row.update({f'p{p}(ms)': round(float(v), 1) for p, v in zip(PERCENTILES, np.percentile(ms, PERCENTILES))})
+            row['累计(s)'] = round(total, 3)
+            rows.append(row)
+        return rows
+
+    def meter_table(self):
+        """每个表计的请求次数、重试次数、失败次数、传输字节数及今日请求次数"""
+        today = str(datetime.date.today())
+        with self._lock:
+            meters = {m: dict(c) for m, c in self._meters.items()}
+            daily = dict(self._daily.get(today, {}))
+        rows = []
+        for meter, counts in sorted(meters.items()):
+            rows.append({'表计': meter, '请求次数': counts.get('请求次数', 0), '今日请求次数': daily.get(meter, 0),
+                         '重试次数': counts.get('重试次数', 0), '失败次数': counts.get('失败次数', 0),
+                         '传输(MB)': round(counts.get('字节数', 0) / 1024 / 1024, 3)})
+        return rows
+
+    def snapshot(self):
+        with self._lock:
+            daily = {day: dict(c) for day, c in self._daily.items()}
+        return {'时间': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                '统计起始': datetime.datetime.fromtimestamp(self.started).strftime('%Y-%m-%d %H:%M:%S'),
+                '阶段': self.stage_table(), '表计阶段': self.stage_table(by_meter=True),
+                '表计': self.meter_table(), '每日请求次数': daily}
+
+    def export(self, path=METRICS_PATH):
+        """将当前统计快照追加写入本地指标文件（每行一个 JSON），返回文件路径"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.snapshot(), ensure_ascii=False) + '\n')
+        return path
+
+
+class CountingResponse:
+    """包装 http.client 响应，统计读取的字节数（流式解码时 Content-Length 可能缺失）"""
+
+    def __init__(self, res):
+        self._res = res
+        self.nbytes = 0
+
+    def read(self, *args):
+        data = self._res.read(*args)
+        self.nbytes += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._res, name)
+
+
+# 进程内共享的记录器
+METRICS = MetricsRecorder()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分时电价时段划分及电价查表
+
+按 月份 × 15分钟时段 预先生成时段编码表，整列时间戳通过整数索引查表完成时段划分和电价匹配，
+不再逐行调用 Python 函数。电价日历按生效日期分版本，不同日期的数据使用对应版本的时段表。
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# 时段编码 -> 时段名称
+PERIOD_NAMES = np.array(["低谷时段", "平时段", "高峰时段", "尖峰时段", "未知时段"])
+VALLEY, FLAT, PEAK, TIP, UNKNOWN = range(len(PERIOD_NAMES))
+SLOTS_PER_HOUR = 4
+NS_PER_DAY = 86400 * 10 ** 9
+
+
+def classify_energy_period(date_time, hour, month):
+    """
+    根据给定的日期和时间，将其分类为高峰、非高峰或低谷时段。
+
+    :param date_time: 代表特定日期和时间的datetime对象。
+    :param hour: 表示一天中的小时数（0-23）的整数。
+    :param month: 表示一年中月份（1-12）的整数。
+    :return: 表示时段类型的字符串（"高峰"、"非高峰"或"低谷"）。
+    """
+    if 0 <= hour < 6 or 12 <= hour < 14:
+        return "低谷时段"
+    elif 6 <= hour < 12 or 14 <= hour < 16:
+        return "平时段"
+
+    # Special conditions for July and August
+    if month in [7, 8]:
+        if 16 <= hour < 20 or 22 <= hour <= 23:
+            return "高峰时段"
+        elif 20 <= hour < 22:
+            return "尖峰时段"
+    else:  # For other months
+        if 16 <= hour < 18 or 20 <= hour <= 23:
+            return "高峰时段"
+        elif 18 <= hour < 20:
+            return "尖峰时段"
+
+    # In case an unexpected hour is provided, default to a period (this line should理论上不会执行如果输入有效)
+    return "未知时段"
+
+
+def apply_price_rule(period,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price):
+    price_rules = {"低谷时段": valley_electricity_price
+                   ,"平时段": average_electricity_price
+                   , "高峰时段": peak_electricity_price
+                   , "尖峰时段": tip_electricity_price}
+    return price_rules.get(period, None)
+
+
+def build_period_table(classify=classify_energy_period):
+    """
+    由逐点分类函数生成 月份 × 15分钟时段 的时段编码表
+    输出参数：shape (12, 96) 的 int8 数组，[月份-1, 小时*4+分钟//15]
+    """
+    code = {name: i for i, name in enumerate(PERIOD_NAMES)}
+    table = np.full((12, 24 * SLOTS_PER_HOUR), UNKNOWN, dtype=np.int8)
+    for month in range(1, 13):
+        for slot in range(24 * SLOTS_PER_HOUR):
+            hour, minute = divmod(slot * 60 // SLOTS_PER_HOUR, 60)
+            moment = datetime.datetime(2000, month, 1, hour, minute)
+            table[month - 1, slot] = code[classify(moment, hour, month)]
+    return table
+
+
+# 电价日历：(生效日期, 时段编码表)，按生效日期升序。
+# 早于首个生效日期的时间按首个版本分类；表计数据是否完整另由查询页面判断，与此无关。
+TARIFF_CALENDARS = [
+    (datetime.date(2024, 7, 17), build_period_table()),
+]
+
+
+def classify_periods(ts, calendars=TARIFF_CALENDARS):
+    """
+    整列时间戳 -> 时段编码
+    输入参数：
+    ts DatetimeIndex、datetime Series 或 datetime64 数组
+    calendars 电价日历，早于首个生效日期的时间使用首个版本
+    输出参数：int8 时段编码数组
+    """
+    ns = pd.DatetimeIndex(ts).values.astype('datetime64[ns]').view(np.int64)
+    if len(ns) == 0:
+        return np.empty(0, dtype=np.int8)
+    # 用整数运算拆出 日序号 和 当日分钟数；月份、电价版本只对涉及的日期（远少于点数）计算后按日序号查表
+    day, ns_in_day = np.divmod(ns, NS_PER_DAY)
+    first_day = day.min()
+    days = np.arange(first_day, day.max() + 1).astype('datetime64[D]')
+    effective = np.array([np.datetime64(d, 'D') for d, _ in calendars])
+    version_of_day = np.clip(np.searchsorted(effective, days, side='right') - 1, 0, len(calendars) - 1)
+    month_of_day = days.astype('datetime64[M]').astype(np.int64) % 12
+    tables = np.stack([t for _, t in calendars])
+    offset = day - first_day
+    slot = ns_in_day // (NS_PER_DAY // (24 * SLOTS_PER_HOUR))
+    return tables[version_of_day[offset], month_of_day[offset], slot]
+
+
+def period_names(codes):
+    """时段编码 -> 时段名称数组"""
+    return PERIOD_NAMES[codes]
+
+
+def period_prices(codes, tip_electricity_price, peak_electricity_price, valley_electricity_price,
+                  average_electricity_price):
+    """时段编码 -> 电价数组，未知时段为 NaN"""
+    prices = np.full(len(PERIOD_NAMES), np.nan)
+    prices[[VALLEY, FLAT, PEAK, TIP]] = [valley_electricity_price, average_electricity_price,
+                                         peak_electricity_price, tip_electricity_price]
+    return prices[codes]
@@ -0,0 +1,27 @@
+"""fill_short_gaps 多户号一起补点的结果应与逐户号分别补点一致，插值不跨户号取值"""
+import numpy as np
+import pandas as pd
+
+from data_quality import fill_short_gaps
+
+
+def _user(code, values, drop):
+    index = pd.date_range('2024-01-01', periods=len(values), freq='15min', name='日期')
+    frame = pd.DataFrame({'用户编号': code, '有功功率': values}, index=index)
+    return frame.drop(index[drop])
+
+
+def test_fill_within_each_user():
+    # U1 缺口之后只剩空值，U2 开头有值：整表插值会用 U2 的值补 U1 的缺口
+    df = pd.concat([
+        _user('U1', [1.0, 2.0, 3.0, np.nan, np.nan, np.nan], [4]),
+        _user('U2', [10.0, 20.0, 30.0, 40.0, 50.0, 60.0], [2, 3]),
+    ])
+    filled, count = fill_short_gaps(df, max_gap=4)
+    parts = [fill_short_gaps(df[df['用户编号'] == code], max_gap=4) for code in ('U1', 'U2')]
+    assert count == sum(n for _, n in parts) == 3
+    expected = pd.concat([frame for frame, _ in parts])
+    pd.testing.assert_frame_equal(filled, expected)
+    u1 = filled[filled['用户编号'] == 'U1']['有功功率']
+    assert np.isnan(u1.iloc[4])
+    np.testing.assert_allclose(filled[filled['用户编号'] == 'U2']['有功功率'], [10, 20, 30, 40, 50, 60])
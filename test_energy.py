@@ -0,0 +1,20 @@
+"""counter_increments 对计数器重置与抖动的处理"""
+import numpy as np
+import pandas as pd
+
+from energy import counter_increments
+
+TS = pd.date_range('2024-07-01', periods=6, freq='15min')
+
+
+def test_reset_counts_new_reading():
+    # 104.5 -> 2 为重置：该间隔电量为重置后的示数 2
+    _, energy, stats = counter_increments(TS, [100, 105, 104.5, 2, 6, 10])
+    np.testing.assert_allclose(energy, [5, 0, 2, 4, 4])
+    assert stats['重置次数'] == 1
+
+
+def test_small_drop_is_jitter():
+    _, energy, stats = counter_increments(TS, [100, 105, 104.5, 106, 106, 110])
+    np.testing.assert_allclose(energy, [5, 0, 1.5, 0, 4])
+    assert stats['重置次数'] == 0
@@ -0,0 +1,56 @@
+"""cached_fetch_history 只缓存已稳定的日期，无数据日期过期后重新请求"""
+import datetime
+
+import numpy as np
+
+import measurement_cache
+from measurement_cache import EMPTY_TTL, MeasurementCache, cached_fetch_history
+
+METER = {'gridAcct': '1', 'aggregatorNo': '2'}
+TODAY = datetime.date(2024, 1, 10)
+START, END = '2024-01-01 00:00:00', '2024-01-10 23:59:59'
+
+
+def _fake_api(monkeypatch, days_with_data):
+    """模拟接口：days_with_data 中的日期每天 01:00 一个点，记录请求的区间"""
+    calls = []
+
+    def fetch_history(meter, start_time, end_time, interval, consume=None, merge=None, **kwargs):
+        calls.append((start_time[:10], end_time[:10]))
+        first = datetime.date.fromisoformat(start_time[:10])
+        last = datetime.date.fromisoformat(end_time[:10])
+        ts = [int(datetime.datetime.combine(d, datetime.time(1)).timestamp() * 1000)
+              for d in sorted(days_with_data) if first <= d <= last]
+        return {'success': True, 'ts': np.array(ts, dtype=np.int64), 'columns': {'P': np.ones(len(ts))}}
+
+    monkeypatch.setattr(measurement_cache, 'fetch_history', fetch_history)
+    return calls
+
+
+def test_recent_days_are_not_cached(monkeypatch):
+    days = {datetime.date(2024, 1, d) for d in range(1, 11)}
+    calls = _fake_api(monkeypatch, days)
+    cache = MeasurementCache(':memory:')
+    assert len(cached_fetch_history(METER, START, END, '15', cache, today=TODAY)['ts']) == 10
+    assert calls == [('2024-01-01', '2024-01-10')]
+    # 早于 today - SETTLE_DAYS 的日期从缓存读取，最近的日期重新请求
+    calls.clear()
+    assert len(cached_fetch_history(METER, START, END, '15', cache, today=TODAY)['ts']) == 10
+    assert calls == [('2024-01-09', '2024-01-10')]
+
+
+def test_empty_days_expire(monkeypatch):
+    days = {datetime.date(2024, 1, d) for d in range(1, 8)}
+    calls = _fake_api(monkeypatch, days)
+    cache = MeasurementCache(':memory:')
+    assert len(cached_fetch_history(METER, START, END, '15', cache, today=TODAY)['ts']) == 7
+    # 1 月 8 日事后补传：有效期内仍使用缓存的空结果
+    days.add(datetime.date(2024, 1, 8))
+    calls.clear()
+    assert len(cached_fetch_history(METER, START, END, '15', cache, today=TODAY)['ts']) == 7
+    assert calls == [('2024-01-09', '2024-01-10')]
+    # 过期后重新请求，取到补传的数据
+    cache._conn.execute("UPDATE measurements SET fetched_at = fetched_at - ?", (EMPTY_TTL + 1,))
+    calls.clear()
+    assert len(cached_fetch_history(METER, START, END, '15', cache, today=TODAY)['ts']) == 8
+    assert calls == [('2024-01-08', '2024-01-10')]
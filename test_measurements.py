@@ -0,0 +1,43 @@
+"""StreamDecoder 在任意字节位置分块送入时，结果应与 json.loads 整体解析后转换一致"""
+import json
+
+import numpy as np
+
+from measurements import StreamDecoder, as_columnar
+
+PAYLOAD = {
+    'success': True, 'code': 200, 'msg': '查询成功',
+    'data': [
+        {'ts': 1721145600000, 'data': {'P': 12.5, 'TotalChargeEnergy': '1.5e3', '状态': None}},
+        {'ts': 1721146500000, 'data': {'P': -3, 'TotalChargeEnergy': 1502.25}},
+        {'ts': 1721147400000, 'data': {}},
+        {'ts': 1721148300000, 'data': {'P': 0.125, '状态': '正常'}},
+    ],
+}
+
+
+def _assert_same(result, expected):
+    assert {k: v for k, v in result.items() if k not in ('ts', 'columns')} == \
+           {k: v for k, v in expected.items() if k not in ('ts', 'columns')}
+    np.testing.assert_array_equal(result['ts'], expected['ts'])
+    assert result['columns'].keys() == expected['columns'].keys()
+    for name, col in expected['columns'].items():
+        np.testing.assert_array_equal(result['columns'][name], col, err_msg=name)
+
+
+def test_split_at_every_offset():
+    body = json.dumps(PAYLOAD, ensure_ascii=False, indent=1).encode('utf-8')
+    expected = as_columnar(json.loads(body))
+    for cut in range(len(body) + 1):
+        decoder = StreamDecoder(len(body))
+        decoder.feed(body[:cut])
+        decoder.feed(body[cut:])
+        _assert_same(decoder.close(), expected)
+
+
+def test_byte_by_byte():
+    body = json.dumps(PAYLOAD, ensure_ascii=False).encode('utf-8')
+    decoder = StreamDecoder()
+    for i in range(len(body)):
+        decoder.feed(body[i:i + 1])
+    _assert_same(decoder.close(), as_columnar(json.loads(body)))
@@ -0,0 +1,37 @@
+"""classify_periods 查表结果应与逐点的 classify_energy_period 一致，跨月份、跨电价版本边界时取对应的表"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from tariff import (PERIOD_NAMES, TIP, PEAK, build_period_table, classify_energy_period, classify_periods,
+                    period_prices)
+
+
+def _expected(ts):
+    return np.array([classify_energy_period(t, t.hour, t.month) for t in ts])
+
+
+def test_month_boundaries():
+    # 6/30 -> 7/1、8/31 -> 9/1 前后尖峰时段不同（7、8 月为 20-22 点，其余月份为 18-20 点）
+    for start in ('2024-06-30', '2024-08-31', '2023-12-31'):
+        ts = pd.date_range(start, periods=2 * 96, freq='15min')
+        np.testing.assert_array_equal(PERIOD_NAMES[classify_periods(ts)], _expected(ts), err_msg=start)
+    assert classify_periods(pd.DatetimeIndex(['2024-06-30 19:00', '2024-07-01 19:00'])).tolist() == [TIP, PEAK]
+
+
+def test_calendar_versions():
+    # 第二个版本从 7 月 10 日起全天为尖峰，之前的日期（含首个生效日期之前）沿用首个版本
+    new = np.full_like(build_period_table(), TIP)
+    calendars = [(datetime.date(2024, 7, 1), build_period_table()), (datetime.date(2024, 7, 10), new)]
+    ts = pd.date_range('2024-06-25', '2024-07-15', freq='15min', inclusive='left')
+    codes = classify_periods(ts, calendars)
+    before = ts < '2024-07-10'
+    np.testing.assert_array_equal(PERIOD_NAMES[codes[before]], _expected(ts[before]))
+    assert (codes[~before] == TIP).all()
+
+
+def test_prices():
+    codes = classify_periods(pd.DatetimeIndex(['2024-07-01 03:00', '2024-07-01 08:00', '2024-07-01 17:00',
+                                               '2024-07-01 21:00']))
+    np.testing.assert_array_equal(period_prices(codes, 1.2, 0.9, 0.3, 0.6), [0.3, 0.6, 0.9, 1.2])
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+典型日聚类
+
+将单户负荷时间序列整理为 “日期 × 时段” 矩阵，使用向量化 k-means 聚类为少量典型日，
+并给出每个典型日出现的天数（权重），供储能规模测算等下游计算使用。
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def build_day_matrix(series, freq='15min'):
+    """
+    将时间序列整理为 “日期 × 时段” 矩阵
+    输入参数：
+    series 以DatetimeIndex为索引的数值序列（如 瞬时有功）
+    freq 时段间隔，默认15分钟
+    输出参数：
+    matrix DataFrame，行为日期，列为一天内的时刻（datetime.time），缺失点按行插值，
+           整天缺失的日期被剔除
+    """
+    series = pd.to_numeric(series, errors='coerce').sort_index()
+    series = series.resample(freq).mean()
+    step = pd.Timedelta(freq)
+    days = series.index.normalize()
+    slots = ((series.index - days) // step).astype(int)
+    n_slots = int(pd.Timedelta(days=1) // step)
+    unique_days, day_pos = np.unique(days.values, return_inverse=True)
+    values = np.full((len(unique_days), n_slots), np.nan)
+    values[day_pos, slots] = series.values
+    slot_labels = [(pd.Timestamp(0) + step * i).time() for i in range(n_slots)]
+    matrix = pd.DataFrame(values, index=pd.DatetimeIndex(unique_days), columns=slot_labels)
+    matrix = matrix.interpolate(axis=1, limit_direction='both')
+    return matrix.dropna(how='any')
+
+
+def _kmeans(X, k, max_iter=100, seed=0):
+    """向量化 k-means（k-means++ 初始化），返回 labels, centers"""
+    rng = np.random.default_rng(seed)
+    n = X.shape[0]
+    sq_norm = (X * X).sum(axis=1)
+    centers = np.empty((k, X.shape[1]))
+    centers[0] = X[rng.integers(n)]
+    closest = ((X - centers[0]) ** 2).sum(axis=1)
+    for c in range(1, k):
+        prob = closest / closest.sum() if closest.sum() > 0 else None
+        centers[c] = X[rng.choice(n, p=prob)]
+        closest = np.minimum(closest, ((X - centers[c]) ** 2).sum(axis=1))
+
+    labels = np.full(n, -1)
+    for _ in range(max_iter):
+        # ||x-c||^2 = ||x||^2 - 2x·c + ||c||^2，一次矩阵乘法得到全部距离
+        dist = sq_norm[:, None] - 2 * X @ centers.T + (centers * centers).sum(axis=1)[None, :]
+        new_labels = dist.argmin(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        one_hot = np.eye(k)[labels]
+        counts = one_hot.sum(axis=0)
+        sums = one_hot.T @ X
+        empty = counts == 0
+        centers[~empty] = sums[~empty] / counts[~empty, None]
+        # 空簇用离当前中心最远的日期重新初始化
+        if empty.any():
+            far = dist[np.arange(n), labels].argsort()[::-1][:empty.sum()]
+            centers[empty] = X[far]
+    return labels, centers
+
+
+def cluster_typical_days(matrix, k=6, method='medoid', max_iter=100, seed=0):
+    """
+    对 “日期 × 时段” 矩阵聚类得到典型日
+    输入参数：
+    matrix build_day_matrix 的输出
+    k 典型日数量
+    method 'medoid' 取离簇中心最近的真实日期（保留峰值形态），'centroid' 取簇均值
+    输出参数：
+    profiles DataFrame，行为时刻，列为典型日名称（典型日1、典型日2…）
+    weights Series，每个典型日代表的天数
+    labels Series，每个日期所属的典型日名称
+    """
+    X = matrix.to_numpy(dtype=float)
+    k = max(1, min(int(k), X.shape[0]))
+    labels, centers = _kmeans(X, k, max_iter=max_iter, seed=seed)
+    if method == 'medoid':
+        dist = ((X[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        dist = np.where(labels[:, None] == np.arange(k)[None, :], dist, np.inf)
+        centers = X[dist.argmin(axis=0)]
+
+    counts = np.bincount(labels, minlength=k)
+    # 按出现天数从多到少排序并命名
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] > 0]
+    names = [f'典型日{i + 1}' for i in range(len(order))]
+    rename = dict(zip(order, names))
+    profiles = pd.DataFrame(centers[order].T, index=matrix.columns, columns=names)
+    weights = pd.Series(counts[order], index=names, name='天数')
+    labels = pd.Series([rename[l] for l in labels], index=matrix.index, name='典型日')
+    return profiles, weights, labels
+
+
+def typical_days(series, k=6, freq='15min', method='medoid', seed=0):
+    """
+    单户负荷序列 -> 典型日，参数及返回值见 build_day_matrix、cluster_typical_days
+    """
+    matrix = build_day_matrix(series, freq=freq)
+    if matrix.empty:
+        return pd.DataFrame(), pd.Series(dtype=float, name='天数'), pd.Series(dtype=object, name='典型日')
+    return cluster_typical_days(matrix, k=k, method=method, seed=seed)
+
+
+def to_weighted_frame(profiles, weights, column='瞬时有功'):
+    """
+    将典型日展开为带权重的长表，便于下游沿用按时刻筛选的计算逻辑
+    输入参数：
+    profiles、weights cluster_typical_days 的输出
+    column 输出数值列名
+    输出参数：
+    DataFrame，索引为虚拟日期（每个典型日占一天）的时间戳，列为 column 和 weight
+    """
+    if profiles.empty:
+        return pd.DataFrame(columns=[column, 'weight'])
+    base = pd.Timestamp('2000-01-01')
+    offsets = pd.to_timedelta([t.strftime('%H:%M:%S') for t in profiles.index])
+    frames = []
+    for i, name in enumerate(profiles.columns):
+        index = base + pd.Timedelta(days=i) + offsets
+        frames.append(pd.DataFrame({column: profiles[name].values,
+                                    'weight': float(weights[name])}, index=index))
+    return pd.concat(frames)
@@ -6,76 +6,29 @@ Created on Sun Jul 28 11:04:24 2024
 @author: zhengboyuan
 """
 
-import http.client
-import hashlib
-import hmac
 import time
-from urllib.parse import urlencode, urlunparse, urlparse, parse_qs, quote
 import pandas as pd
-import json
 import datetime
 import streamlit as st
 import seaborn as sns  # 可选，用于更好的默认样式
-import traceback
-from datetime import date
-def generate_token(access_key, access_secret, http_method, url):
-    # Get current millisecond timestamp
-    access_timestamp_ms = int(time.time() * 1000)
-    # access_timestamp_ms = 1721013637624
-    # Construct the sign key with sorted dictionary and millisecond timestamp
-    params = {
-        "accessKey": access_key,
-        "accessTs": access_timestamp_ms,
-        "httpMethod": http_method,
-        "url": escape_url_params(url)
-    }
-    sign_key = kv_tokenize(params)
-    # print('sign_key:', sign_key)
-    # Generate HMAC
-    hmac_sha256 = hmac.new(sign_key.encode(), access_secret.encode(), hashlib.sha256)
-    # print('hmac_sha256:', hmac_sha256)
-    hmac_digest = hmac_sha256.hexdigest()
-    # print('hmac_digest:', hmac_digest)
-    # Results
-    token = hmac_digest
-    ts_ms = access_timestamp_ms
-    return token, ts_ms
-
-# 转换时间戳为标准时间格式
-def timestamp_to_datetime(timestamp):
-    return datetime.datetime.fromtimestamp(timestamp / 1000)
-def kv_tokenize(dict):
-    res = ""
-    for key, value in sorted(dict.items()):
-        if isinstance(value, list):
-            for v in value:
-                res += key + "=" + str(v) + "&"
-        else:
-            res += key + "=" + str(value) + "&"
-    return res[:-1]
-def escape_url_params(url):
-    # 解析URL
-    parsed_url = urlparse(url)
-    # 重新组合URL
-    new_url = urlunparse((
-        parsed_url.scheme,
-        parsed_url.netloc,
-        parsed_url.path,
-        parsed_url.params,
-        escape_qs(parsed_url),
-        parsed_url.fragment
-    ))
-    return new_url
-def escape_qs(parsed_url):
-    # 获取查询参数
-    params = parse_qs(parsed_url.query)
-    # 转义每个参数的值
-    escaped_params = {
-        key: [urlencode({key: value})[len(key) + 1:] for value in values]
-        for key, values in params.items()
-    }
-    return kv_tokenize(escaped_params)
-
+from chart_downsample import downsample
+from eiot_api import fetch_meters, METERS
+from measurement_cache import MeasurementCache, cached_fetch_history
+from measurements import decode_measurements, align_meters, aggregate_meters
+from measurement_sync import MeasurementStore
+from tariff import classify_periods, period_names, period_prices
+from energy import energy_by_period, storage_arbitrage, arbitrage_summary
+from query_metrics import METRICS
+# 接口数据完整的起始日期：此前部分参数缺失（表计数据问题，与电价日历的生效日期无关）
+DATA_COMPLETE_DATE = datetime.date(2024, 7, 17)
+@st.cache_resource
+def get_measurement_cache():
+    """本地测量数据缓存，进程内共享"""
+    return MeasurementCache()
+@st.cache_resource
+def get_measurement_store():
+    """后台同步进程（measurement_sync.py）写入的本地列式存储"""
+    return MeasurementStore()
 def st_sidebar():
     LOGO_URL_LARGE = 'https://pic.imgdb.cn/item/667f9aa9d9c307b7e90ae152.jpg'
     st.sidebar.markdown(
@@ -92,10 +45,12 @@ def st_sidebar():
     )
 
     ## 侧边栏函数，返回option,select_date,start_time,end_time,select_start_time,select_end_time
-    option = st.sidebar.selectbox("选择表计", 
-                                  ("黄冈产业园增量配电网测量数据", "保碧储能站测量数据"),
-                                  index=1,
-                                  key='selectbox_option')
+    # 表计来自登记文件 meters.json，可多选并发查询
+    meter_names = list(METERS)
+    option = st.sidebar.multiselect("选择表计",
+                                    meter_names,
+                                    default=["保碧储能站测量数据"] if "保碧储能站测量数据" in METERS else meter_names[:1],
+                                    key='multiselect_option')
 
     today = datetime.datetime.now()
     yesterday = today - datetime.timedelta(days=1)
@@ -161,6 +116,16 @@ def st_sidebar():
     query_button_clicked = st.sidebar.button("查询", key='button_query'
                                              # ,on_click= main()
                                              )
+    st.sidebar.radio("数据来源", ("接口查询", "本地同步数据"), key='radio_data_source',
+                     help='本地同步数据由后台同步进程 measurement_sync.py 定期写入，读取不经过接口')
+    with st.sidebar.expander("同步水位线"):
+        st.json(get_measurement_store().watermarks())
+    with st.sidebar.expander("本地缓存"):
+        cache = get_measurement_cache()
+        if st.button("清空缓存", key='button_clear_cache'):
+            cache.clear()
+        st.json(cache.stats())
+    # 性能诊断面板在查询结束后绘制（见页面入口），统计包含本次查询
 
     length = len(select_date)
     return (option, select_date, start_time, end_time, select_start_time,
@@ -169,47 +134,34 @@ def st_sidebar():
             ,query_button_clicked
             , length)
 
+def st_diagnostics():
+    ## 查询链路各阶段耗时的滚动分位数、各表计请求次数及传输量，可导出到本地指标文件
+    # 先处理按钮，下方表格显示导出/重置后的统计
+    col1, col2 = st.columns(2)
+    if col1.button("导出指标", key='button_export_metrics'):
+        st.success(f"已导出到 {METRICS.export()}")
+    if col2.button("重置统计", key='button_reset_metrics'):
+        METRICS.reset()
+    st.caption("各阶段最近耗时的 p50/p95/p99（毫秒）")
+    st.dataframe(pd.DataFrame(METRICS.stage_table()), hide_index=True)
+    st.caption("各表计请求次数及传输量")
+    st.dataframe(pd.DataFrame(METRICS.meter_table()), hide_index=True)
 def interface_read_data(option,select_date,start_time,end_time,select_start_time,select_end_time,time_interva_option,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price,length):
-    access_key = "chint-hubei"
-    access_secret = "UIJLL(q0BZq0y5tKq"
-    http_method = "GET"
-    host = "api.eiot6.com"
     # option,select_date,start_time,end_time,select_start_time,select_end_time,time_interva_option,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price,query_button_clicked,length =st_sidebar()
     if length<2:
         st.warning("开始时间和结束时间未完整选择，无法发起接口请求。")
         return None  # 或者根据需要返回其他提示信息或数据
-    if option== '黄冈产业园增量配电网测量数据':
-        uri_template  = "/vpp-aggr/open-api/v1/control_unit/measurements/history?aggregatorNo=91421100MA49DL1B77&edgeId=nation_hubei_grid&gridAcct=4206916039019&startDate={start_time}&endDate={end_time}&interval={time_interva_option}"
-    else:
-        uri_template  = "/vpp-aggr/open-api/v1/control_unit/measurements/history?aggregatorNo=pN6MWCf5bnKsBNQU&edgeId=nation_hubei_grid&gridAcct=10112101970&startDate={start_time}&endDate={end_time}&interval={time_interva_option}"
-    uri_with_time = uri_template.format(start_time=start_time, end_time=end_time,time_interva_option=time_interva_option)
-    url = f'https://{host}{uri_with_time}'
-    # Generate token and timestamp
-    token, ts = generate_token(access_key, access_secret, http_method, url)
-    conn = http.client.HTTPSConnection(host)
-    payload = ''
-    headers = {
-        'X-ACCESS-KEY': access_key,
-        'X-ACCESS-TOKEN': token,
-        'X-ACCESS-TS': ts
-    }
-    p = urlparse(url)
-    qs = escape_qs(p)
-    conn.request(http_method, f'{p.path}?{qs}', payload, headers)
-    res = conn.getresponse()
-    data = res.read()
+    cache = get_measurement_cache()
+    # 所选表计并发查询；每个表计已结束的日期优先读本地缓存，缺失日期及当天按天切分、逐段签名并发请求
+    data = fetch_meters({name: METERS[name] for name in option}, start_time, end_time, time_interva_option,
+                        fetch=lambda meter, *args, **kwargs: cached_fetch_history(meter, *args, cache=cache, **kwargs))
     return data,option,select_date,start_time,end_time,select_start_time,select_end_time,time_interva_option,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price
 
-def data_process(data,k):
-    ## data dataframe；k 列名
-    # 提取 'P' 值和 'ts' 值
-    p_values = [item['data'][k] for item in data['data']]
-    ts_values = [item['ts'] for item in data['data']]
-    # 转换提取的 ts 值
-    ts_datetime_values = [timestamp_to_datetime(ts) for ts in ts_values]
-    # 将 'P' 值和 'ts' 值转换为 DataFrame
-    df_p = pd.DataFrame({ 'ts': ts_datetime_values
-                         ,k: p_values})
+def data_process(frame,k):
+    ## frame decode_measurements 解码后的全部参数数据；k 列名
+    # 从解码后的数据中切出 'ts' 和参数列
+    df_p = pd.DataFrame({ 'ts': frame.index
+                         ,k: frame[k].to_numpy()})
     
     df_p['day'] = df_p['ts'].dt.day
     df_p['time'] = df_p['ts'].dt.time
@@ -220,33 +172,34 @@ def data_process(data,k):
     
     return df_p
 
-def datafram_group(df_p,name,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price):
-    df_p['period'] = df_p['ts'].apply(lambda x: classify_energy_period(x, x.hour, x.month))
-    # 按日期和时段类型分组，计算每组的最大值和最小值
-    grouped = df_p.groupby(['period',])[name].agg(['min', 'max'])
-    df_p['price'] = df_p['period'].apply(
-                                        lambda period: apply_price_rule(
-                                            period=period,
-                                            tip_electricity_price=tip_electricity_price,
-                                            peak_electricity_price=peak_electricity_price,
-                                            valley_electricity_price=valley_electricity_price,
-                                            average_electricity_price=average_electricity_price
-                                        )
-                                    )
-    grouped_with_price = df_p.groupby(['period', 'price']).agg(
-        {name: ['min', 'max'],  # 假定name是你关心进行min和max计算的列名
-          'price': ['first']}  # 显式指定price列，并使用first保持原值
-    )
+def plot_arbitrage(detail,stats,option):
+    """
+    储能充放电套利：按 日期 × 时段 展示充放电电量、成本收益及充放电效率。
     
-    # 重置列名以去除外层多层索引结构
-    grouped_with_price.columns = grouped_with_price.columns.get_level_values(1)
-    grouped_diff = grouped_with_price['max'] - grouped_with_price['min']
-    grouped_result = grouped_diff * grouped_with_price['first']
-    sum_1 = round(grouped_result.sum(),3)
-    return sum_1
+    :param detail: storage_arbitrage 计算的 日期 × 时段 明细。
+    :param stats: storage_arbitrage 返回的计数器统计。
+    :param option: 表计名称。
+    :return: 按日汇总的 DataFrame。
+    """
+    if detail.empty:
+        return None
+    daily = arbitrage_summary(detail).droplevel('表计')
+    total = arbitrage_summary(detail, by=('表计',)).iloc[0]
+    st.subheader('储能充放电套利分析')
+    col1, col2, col3 = st.columns(3)
+    col1.metric("净收益（元）", round(total['净收益'], 2))
+    col2.metric("充放电效率（%）", round(total['充放电效率(%)'], 2))
+    col3.metric("计数器重置次数", sum(s['重置次数'] for s in stats[option].values()))
+    daily.index = daily.index.strftime('%Y-%m-%d')
+    st.dataframe(daily.round(2))
+    with st.expander('日期 × 时段明细'):
+        detail = detail.drop(columns='表计')
+        detail['日期'] = detail['日期'].dt.strftime('%Y-%m-%d')
+        st.dataframe(detail.round(3), hide_index=True)
+    return daily
 def plot_data(df_p,select_start_time,select_end_time,parameters
               ,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price
-              ,re_TotalChargeEnergy,re_TotalDischargeEnergy):
+              ,total=None):
     """
     根据给定的dataframe 开始时间、结束时间、表计参数绘制折线图。
     
@@ -254,6 +207,7 @@ def plot_data(df_p,select_start_time,select_end_time,parameters
     :param select_start_time: 选择的开始时间。
     :param select_end_time: 选择的结束时间。
     :param parameters: 选择的表计参数。
+    :param total: 储能站充放电电量及成本收益合计（arbitrage_summary 按表计汇总的一行），无则只计算电量。
     :return: df_pivot dataframe。
     """
     df_pivot = df_p.pivot(columns = 'day',values = parameters)
@@ -264,19 +218,23 @@ def plot_data(df_p,select_start_time,select_end_time,parameters
     col2.metric(f"{parameters}最小值", df_pivot.min().min())
     if parameters == 'TotalChargeEnergy':
         col3, col4= st.columns(2)
-        charging_electricity_amount= df_pivot.max().max()-df_pivot.min().min()
-        charging_cost = round(charging_electricity_amount*valley_electricity_price,0)
+        if total is not None:
+            charging_electricity_amount = round(float(total['充电电量']),2)
+        else:
+            charging_electricity_amount = round(float(energy_by_period(df_p['ts'], df_p[parameters])[0]['电量'].sum()),2)
         col3.metric(f"充电电量（kWh）", charging_electricity_amount)
-        col4.metric(f"充电成本（元）",re_TotalChargeEnergy )
+        col4.metric(f"充电成本（元）", round(float(total['充电成本']),3) if total is not None else None)
     elif parameters == 'TotalDischargeEnergy':
         col3, col4= st.columns(2)
-        Discharging_electricity_amount= df_pivot.max().max()-df_pivot.min().min()
-        Discharging_cost = round(Discharging_electricity_amount*tip_electricity_price,0)
+        if total is not None:
+            Discharging_electricity_amount = round(float(total['放电电量']),2)
+        else:
+            Discharging_electricity_amount = round(float(energy_by_period(df_p['ts'], df_p[parameters])[0]['电量'].sum()),2)
         col3.metric(f"放电电量（kWh）", Discharging_electricity_amount)
-        col4.metric(f"放电收益（元）",re_TotalDischargeEnergy )
+        col4.metric(f"放电收益（元）", round(float(total['放电收益']),3) if total is not None else None)
     # 绘制折线图
     df_pivot.index = df_pivot.index.astype(str)
-    st.line_chart(data=df_pivot
+    st.line_chart(data=downsample(df_pivot)
                   ,x_label= '时间'
                   ,y_label = parameters
                   )
@@ -285,41 +243,41 @@ def plot_data(df_p,select_start_time,select_end_time,parameters
     df_pivot = df_pivot.T
     st.dataframe(df_pivot.style.highlight_max(axis=0))
     return df_pivot
-def classify_energy_period(date_time, hour, month):
+def plot_meters(frames,select_start_time,select_end_time,time_interva_option
+                ,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price):
     """
-    根据给定的日期和时间，将其分类为高峰、非高峰或低谷时段。
+    多表计对比：所选参数按公共时间索引对齐，展示汇总曲线和分表计曲线。
     
-    :param date_time: 代表特定日期和时间的datetime对象。
-    :param hour: 表示一天中的小时数（0-23）的整数。
-    :param month: 表示一年中月份（1-12）的整数。
-    :return: 表示时段类型的字符串（"高峰"、"非高峰"或"低谷"）。
+    :param frames: {表计名称: decode_measurements 解码后的数据}。
+    :param time_interva_option: 时间间隔（分钟），作为对齐步长。
+    :return: None。
     """
-    if 0 <= hour < 6 or 12 <= hour < 14:
-        return "低谷时段"
-    elif 6 <= hour < 12 or 14 <= hour < 16:
-        return "平时段"
-    
-    # Special conditions for July and August
-    if month in [7, 8]:
-        if 16 <= hour < 20 or 22 <= hour <= 23:
-            return "高峰时段"
-        elif 20 <= hour < 22:
-            return "尖峰时段"
-    else:  # For other months
-        if 16 <= hour < 18 or 20 <= hour <= 23:
-            return "高峰时段"
-        elif 18 <= hour < 20:
-            return "尖峰时段"
-    
-    # In case an unexpected hour is provided, default to a period (this line should理论上不会执行如果输入有效)
-    return "未知时段"
-def apply_price_rule(period,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price):
-    price_rules = {"低谷时段": valley_electricity_price
-                   ,"平时段": average_electricity_price
-                   , "高峰时段": peak_electricity_price
-                   , "尖峰时段": tip_electricity_price}
-    return price_rules.get(period, None)
-
+    parameter_names = sorted(set().union(*(frame.columns for frame in frames.values())))
+    multiselect = st.multiselect("选择参数", parameter_names, key='multiselect_meter_parameters')
+    how = st.radio("汇总方式", ("合计", "平均"), horizontal=True, key='radio_meter_aggregate')
+    if not multiselect:
+        st.info("请选择参数分析！")
+    for name in multiselect:
+        wide = align_meters(frames, name, time_interva_option)
+        if wide.empty:
+            continue
+        total = aggregate_meters(wide, 'sum' if how == '合计' else 'mean')
+        st.subheader(f'{select_start_time}-{select_end_time} {name}多表计分析')
+        col1, col2, col3 = st.columns(3)
+        col1.metric("表计数", wide.shape[1])
+        col2.metric(f"{how}最大值", round(total.max(), 2))
+        col3.metric(f"{how}最小值", round(total.min(), 2))
+        st.line_chart(data=downsample(total.rename(how).to_frame()), x_label='时间', y_label=name)
+        st.line_chart(data=downsample(wide), x_label='时间', y_label=name)
+        st.dataframe(wide.describe().T.round(2))
+    # 含充放电累计示数的表计做套利对比
+    storage = {n: f for n, f in frames.items() if {'TotalChargeEnergy', 'TotalDischargeEnergy'} <= set(f.columns)}
+    if storage:
+        detail, _ = storage_arbitrage(storage, tip_electricity_price, peak_electricity_price,
+                                      valley_electricity_price, average_electricity_price)
+        if not detail.empty:
+            st.subheader('储能充放电套利对比')
+            st.dataframe(arbitrage_summary(detail, by=('表计',)).round(2))
 def main(option,select_date,start_time,end_time,select_start_time,select_end_time,time_interva_option
          ,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price
          ,query_button_clicked,length):
@@ -331,63 +289,88 @@ def main(option,select_date,start_time,end_time,select_start_time,select_end_tim
     # 如选择两个时间段执行；
     if length>1:
         # data,option,select_date,start_time,end_time,select_start_time,select_end_time,time_interva_option,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price =interface_read_data(option,select_date,start_time,end_time,select_start_time,select_end_time,time_interva_option,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price,length)
-        data =interface_read_data(option,select_date,start_time,end_time,select_start_time,select_end_time,time_interva_option,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price,length)[0]
-        data = json.loads(data.decode("utf-8"))
+        if not option:
+            st.info("请选择表计！")
+            return
+        if st.session_state.get('radio_data_source') == '本地同步数据':
+            # 直接读取后台同步的本地数据
+            store = get_measurement_store()
+            with METRICS.stage('读取本地数据'):
+                frames = {name: store.read(METERS[name], time_interva_option, start_time, end_time) for name in option}
+        else:
+            with METRICS.stage('接口查询'):
+                data =interface_read_data(option,select_date,start_time,end_time,select_start_time,select_end_time,time_interva_option,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price,length)[0]
+            # 一次性解码为全部参数的时间索引数据，各参数视图从中切片
+            with METRICS.stage('构建DataFrame'):
+                frames = {name: decode_measurements(d) for name, d in data.items() if d['success']}
+            for name, d in data.items():
+                if not d['success']:
+                    st.warning(f"{name} 数据接口请求失败：{d.get('error', '接口返回失败')}")
+        frames = {name: frame for name, frame in frames.items() if not frame.empty}
+        success = bool(frames)
         #判断数据请求是否成功
-        if data['success']:
+        if success and len(option) > 1:
+            st.toast('数据读取成功!', icon='🎉')
+            with METRICS.stage('绘图'):
+                plot_meters(frames, select_start_time, select_end_time, time_interva_option
+                            ,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price)
+        elif success:
             # st.info('数据接口请求成功!')
-            st.toast('数据接口请求成功!', icon='🎉')
-            parameter_names = list(data['data'][-1]['data'].keys())
+            st.toast('数据读取成功!', icon='🎉')
+            option, frame = next(iter(frames.items()))
+            parameter_names = list(frame.columns)
             # 创建多选菜单
             multiselect = st.multiselect( "选择参数", parameter_names)
             # 如果用户做出了选择
             if multiselect  :
+                # 定义起始日期（接口数据完整的起始日期）
+                start_date_to_check = DATA_COMPLETE_DATE
+                # 检查起始日期是否在7月14日之后
+                is_after_july_17 = select_date[1] <= start_date_to_check
+                # 储能站充放电电量及成本收益按累计示数只计算一次，各参数图和套利分析共用
+                arbitrage = total = None
+                if option =='保碧储能站测量数据' and not is_after_july_17:
+                    try:
+                        with METRICS.stage('数据处理', option):
+                            arbitrage = storage_arbitrage({option: frame}, tip_electricity_price, peak_electricity_price,
+                                                          valley_electricity_price, average_electricity_price)
+                            if not arbitrage[0].empty:
+                                total = arbitrage_summary(arbitrage[0], by=('表计',)).iloc[0]
+                    except Exception:
+                        arbitrage = None
                 for name in multiselect:
-                    df_p = data_process(data, name)
-                    df_p['period'] = df_p['ts'].apply(lambda x: classify_energy_period(x, x.hour, x.month))
-                    # 按日期和时段类型分组，计算每组的最大值和最小值
-                    grouped = df_p.groupby(['day', 'period',])[name].agg(['min', 'max'])
-                    df_p['price'] = df_p['period'].apply(
-                                                        lambda period: apply_price_rule(
-                                                            period=period,
-                                                            tip_electricity_price=tip_electricity_price,
-                                                            peak_electricity_price=peak_electricity_price,
-                                                            valley_electricity_price=valley_electricity_price,
-                                                            average_electricity_price=average_electricity_price
-                                                        )
-                                                    )
-                    # df_p
-                    grouped = df_p.groupby(['day', 'period','price'])[name].agg(['min', 'max'])
-                    # df_p, grouped= datafram_group(df_p,name,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price)
+                    with METRICS.stage('数据处理', option):
+                        df_p = data_process(frame, name)
+                        # 整列查表划分时段及匹配电价
+                        codes = classify_periods(df_p['ts'])
+                        df_p['period'] = period_names(codes)
+                        df_p['price'] = period_prices(codes, tip_electricity_price, peak_electricity_price,
+                                                      valley_electricity_price, average_electricity_price)
+                        grouped = df_p.groupby(['day', 'period','price'])[name].agg(['min', 'max'])
                     try:
-                        # 定义起始日期
-                        start_date_to_check = date(2024, 7, 17)
-                        # 检查起始日期是否在7月14日之后
-                        is_after_july_17 = select_date[1] <= start_date_to_check
                         # 输出结果
                         if is_after_july_17:
                             st.info("选择的数据包含7月17日之前的日期，接口数据不完整。")
                         else:
-                            if option =='保碧储能站测量数据':
-                                df_TotalChargeEnergy = data_process(data, 'TotalChargeEnergy')
-                                re_TotalChargeEnergy =datafram_group(df_TotalChargeEnergy,'TotalChargeEnergy',tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price)
-                                df_TotalDischargeEnergy = data_process(data, 'TotalDischargeEnergy')
-                                re_TotalDischargeEnergy =datafram_group(df_TotalDischargeEnergy,'TotalDischargeEnergy',tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price)
-                                plot_data(df_p, select_start_time, select_end_time, name
-                                          ,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price
-                                          ,re_TotalChargeEnergy,re_TotalDischargeEnergy)
-                            else:
+                            with METRICS.stage('绘图', option):
                                 plot_data(df_p, select_start_time, select_end_time, name
                                           ,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price
-                                          ,re_TotalChargeEnergy=None,re_TotalDischargeEnergy=None)
+                                          ,total)
                     except:
                         st.error("数据绘图展示失败，7月14日前参数有缺失可以选择之后的数据。", icon="🚨")
+                # 选择了充电或放电示数时，套利分析只展示一次
+                if arbitrage is not None and {'TotalChargeEnergy', 'TotalDischargeEnergy'} & set(multiselect):
+                    with METRICS.stage('绘图', option):
+                        plot_arbitrage(*arbitrage, option)
             if not multiselect:
                 st.info("请选择参数分析！")
+        elif st.session_state.get('radio_data_source') == '本地同步数据':
+            st.warning('本地同步数据中没有该时间间隔的数据，请确认后台同步进程 measurement_sync.py 已同步所选表计和时间段')
         else:
             st.warning('数据接口请求失败!!!')
         end = time.time() 
         elapsed = round(end - start,2)
+        METRICS.observe('总耗时', end - start)
         print(f"Elapsed Time: {elapsed} seconds")
         print("******* 结束！*********")
 if __name__ == '__main__':
@@ -395,4 +378,7 @@ if __name__ == '__main__':
     st.set_page_config(page_title="虚拟电厂数据查询", page_icon="🏠")
     option,select_date,start_time,end_time,select_start_time,select_end_time,time_interva_option,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price,query_button_clicked,length = st_sidebar()
     print("query_button_clicked:",query_button_clicked)
-    main(option,select_date,start_time,end_time,select_start_time,select_end_time,time_interva_option,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price,query_button_clicked,length)
\ No newline at end of file
+    main(option,select_date,start_time,end_time,select_start_time,select_end_time,time_interva_option,tip_electricity_price,peak_electricity_price,valley_electricity_price,average_electricity_price,query_button_clicked,length)
+    # 查询结束后再绘制，显示包含本次查询的统计
+    with st.sidebar.expander("性能诊断"):
+        st_diagnostics()
\ No newline at end of file
@@ -1,26 +1,24 @@
-import os
-import pandas as pd
 import streamlit as st
-from pandasai import Agent, SmartDataframe
 from deepseek_llm import DeepseekLLM
-from dotenv import load_dotenv
 from pdf_utils import generate_pdf_report
-# 加载环境变量
-load_dotenv()
+from report_digest import build_digest, digest_prompt
+from utils import stream_markdown
 
-def smart_report(filtered_data, deepseek_key):
-    """智能PandasAI分析功能"""
-    filtered_data = SmartDataframe(filtered_data)
-    print('SmartDataframe的数据：',filtered_data)
+# 完整报告的输出长度上限
+REPORT_MAX_TOKENS = 3000
+
+
+def smart_report(cube_view, deepseek_key, anomalies=None):
+    """智能报告：本地汇总统计表后一次性请求 Deepseek 生成报告"""
     llm = DeepseekLLM(
             api_key=deepseek_key,
             temperature=0.3,
-            max_tokens=1500
+            max_tokens=REPORT_MAX_TOKENS
         )
     
     # 在question输入后添加提示增强
-    enhanced_question = prompt = f"""
-                    请基于充电场站数据生成专业分析报告
+    enhanced_question = f"""
+                    请基于充电场站运营数据的统计结果生成专业分析报告
                     
                     报告结构要求:
                     ======================
@@ -58,43 +56,28 @@ def smart_report(filtered_data, deepseek_key):
                     - 关键数据用**加粗**突出显示
                     """
     if st.button("执行Deepseck分析"):
-        with st.spinner("正在分析..."):
-            try:
-                #加入预处理功能
-                #preprocessed_data = filtered_data.copy()
-                #转换日期列为字符串格式(如果存在)
-                #date_cols = preprocessed_data.select_dtypes(include=['datetime']).columns
-                #preprocessed_data[date_cols] = preprocessed_data[date_cols].astype(str)
-                agent = Agent(filtered_data
-                              , config = {
-                                "llm": llm,                     # 指定语言模型
-                                "enable_cache": True,           # 启用缓存
-                                "max_retries": 3,               # 最大重试次数
-                                "conversational": False,        # 非对话模式更快
-                                "api_key": os.getenv("PANDASAI_API_KEY")
-                            }
-                              ,description="智能充电场站运营数据分析助手，支持充电量、订单数、利用率等核心指标分析"
-                              ,memory_size=20  # 扩大记忆容量
-                              )
-
-                response = agent.chat(enhanced_question)
-                st.success("分析完成")
-                print('分析报告：',response)
-                # 删除前8个字符
-                if isinstance(response, str):
-                    processed_response = response[12:]
-                    st.write(processed_response)
-                    
-                    # 生成Markdown下载按钮
-                    st.download_button(
-                        label="下载Markdown报告",
-                        data=processed_response,
-                        file_name="智能分析报告.md",
-                        mime="text/markdown"
-                    )
-                    
-                    # 生成PDF下载按钮
-                    generate_pdf_report(processed_response)
-            except Exception as e:
-                st.error(f"分析失败: {str(e)}")
-                st.info("请检查: 1. API密钥是否有效 2. 网络连接 3. 服务可用性")
+        if cube_view.empty:
+            st.warning("当前筛选条件下没有数据")
+            return
+        try:
+            # 排名、环比、异常、站点指标在本地算好，模型只需据此撰写报告
+            prompt, tokens = digest_prompt(build_digest(cube_view, anomalies), enhanced_question)
+            st.caption(f"提示词约 {tokens:,} tokens")
+            with st.expander("查看发送给模型的统计数据"):
+                st.text(prompt)
+            processed_response = stream_markdown(llm, prompt)
+            st.success("分析完成")
+            
+            # 生成Markdown下载按钮
+            st.download_button(
+                label="下载Markdown报告",
+                data=processed_response,
+                file_name="智能分析报告.md",
+                mime="text/markdown"
+            )
+            
+            # 生成PDF下载按钮
+            generate_pdf_report(processed_response)
+        except Exception as e:
+            st.error(f"分析失败: {str(e)}")
+            st.info("请检查: 1. API密钥是否有效 2. 网络连接 3. 服务可用性")
@@ -0,0 +1,41 @@
+"""
+多站点管理建议并发生成
+
+各站点的提示词在线程池中并发请求 Deepseek（经共享的 LLM_CLIENT，复用连接池），并发数不超过
+MAX_WORKERS，实际发往接口的请求速率由 LLM_CLIENT 统一限制（命中缓存的站点立即返回）；结果按完成顺序
+逐个返回，界面可以边完成边展示。总耗时约等于最慢的一次调用（站点数超过并发数时为若干批次），而不是各站点耗时之和。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from deepseek_llm import DeepseekLLM
+from llm_client import MAX_CONCURRENCY
+
+MAX_WORKERS = MAX_CONCURRENCY
+
+
+def generate_advice(prompts, api_key, max_workers=MAX_WORKERS,
+                    temperature=0.3, max_tokens=1500, llm_factory=DeepseekLLM):
+    """
+    并发生成建议
+    输入参数：prompts {站点: 提示词}；api_key Deepseek 密钥；max_workers 并发数
+    输出参数：生成器，按完成顺序产出 (站点, 建议文本, 错误信息, 耗时秒)，成功时错误信息为 None
+    """
+    def _one(station, prompt):
+        start = time.perf_counter()
+        llm = llm_factory(api_key=api_key, temperature=temperature, max_tokens=max_tokens)
+        return llm.call(prompt), time.perf_counter() - start
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prompts))))
+    try:
+        futures = {executor.submit(_one, station, prompt): station for station, prompt in prompts.items()}
+        for future in as_completed(futures):
+            station = futures[future]
+            try:
+                text, seconds = future.result()
+                yield station, text, None, seconds
+            except Exception as e:
+                yield station, None, str(e), None
+    finally:
+        # 调用方中途停止读取（Streamlit 停止或重跑时生成器被关闭）：取消排队中的请求，不等待进行中的请求
+        executor.shutdown(wait=False, cancel_futures=True)
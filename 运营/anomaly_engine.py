@@ -0,0 +1,201 @@
+"""
+站点 × 日 × 指标 稳健异常检测
+
+对指标立方体中每个站点、每个指标的日值计算稳健分数：基准取同一星期几前 WEEKS 周的中位数（周一只与
+周一比），同星期几历史不足 MIN_PERIODS 个时退回前 DAYS 天的中位数；尺度取前 DAYS 天“日值 - 当日基准”
+残差的 MAD（去掉星期效应后汇总各星期几，样本比单一星期几多，误报少）；分数 = (当日值 - 基准) / (1.4826 × MAD)，
+|分数| 超过 THRESHOLD 记为异常。全部站点、指标放进一个 站点 × 日 × 指标 的数组，滞后值按位移堆叠后
+沿最后一维排序取中位数，整体向量化；站点按块处理，内存占用与站点数无关。
+
+新的日数据到达时 update_anomalies 只重算发生变化的日期及之后的分数，其余沿用上次结果。
+"""
+import numpy as np
+import pandas as pd
+
+# 同星期几基准的周数、退回基准及残差尺度的天数、最少有效点数
+WEEKS = 8
+DAYS = 28
+MIN_PERIODS = 4
+# |稳健分数| 超过该值记为异常（MAD 修正 z 分数的常用阈值）
+THRESHOLD = 3.5
+MAD_SCALE = 1.4826
+# MAD 为 0（残差全为 0）时，尺度至少取基准中位数的 REL_FLOOR 倍
+REL_FLOOR = 0.05
+# 分数截断到 ±SCORE_CAP（基准全为 0 而当日非 0 时取该值）
+SCORE_CAP = 99.0
+# 每块（站点 × 日 × 指标 × 滞后）元素数上限
+BLOCK_ELEMENTS = 4_000_000
+WEEKDAY_LAGS = tuple(7 * k for k in range(1, WEEKS + 1))
+DAILY_LAGS = tuple(range(1, DAYS + 1))
+
+
+def _to_array(view, metrics, stations=None, dates=None):
+    """日汇总切片 -> (站点, 日期, 指标) 三维数组，缺失日为 NaN"""
+    if stations is None:
+        stations = view.index.get_level_values('站点').unique()
+    if dates is None:
+        days = view.index.get_level_values('日期')
+        dates = pd.date_range(days.min(), days.max(), freq='D') if len(days) else pd.DatetimeIndex([])
+    full = pd.MultiIndex.from_product([stations, dates], names=['站点', '日期'])
+    values = view[metrics].reindex(full).to_numpy(dtype=float)
+    return values.reshape(len(stations), len(dates), len(metrics)), pd.Index(stations), dates
+
+
+def _lagged(values, lags, first):
+    """values[:, t - lag] 按滞后堆叠，t 从 first 起；输出 (站点, 日, 指标, 滞后)"""
+    n_days = values.shape[1]
+    out = np.full(values[:, first:].shape + (len(lags),), np.nan)
+    for j, lag in enumerate(lags):
+        start = max(first, lag)
+        if start < n_days:
+            out[:, start - first:, :, j] = values[:, start - lag:n_days - lag]
+    return out
+
+
+def _nanmedian(window):
+    """沿最后一维的忽略 NaN 中位数（排序后 NaN 在末尾），返回 (中位数, 有效点数)"""
+    ordered = np.sort(window, axis=-1)
+    count = np.sum(~np.isnan(window), axis=-1)
+    lo = np.take_along_axis(ordered, np.maximum((count - 1) // 2, 0)[..., None], axis=-1)[..., 0]
+    hi = np.take_along_axis(ordered, np.maximum(count // 2, 0)[..., None], axis=-1)[..., 0]
+    median = np.where(count > 0, (lo + hi) / 2, np.nan)
+    return median, count
+
+
+def _location(values, first):
+    """first 及之后各日的基准中位数：同星期几优先，历史不足时退回前 DAYS 天"""
+    median, count = _nanmedian(_lagged(values, WEEKDAY_LAGS, first))
+    fallback = count < MIN_PERIODS
+    if fallback.any():
+        d_median, d_count = _nanmedian(_lagged(values, DAILY_LAGS, first))
+        median = np.where(fallback, d_median, median)
+        count = np.where(fallback, d_count, count)
+    median[count < MIN_PERIODS] = np.nan
+    return median
+
+
+def _score_block(values, first):
+    """对 values 中 first 及之后的日期计算 (基准, 尺度, 分数)"""
+    # 尺度需要前 DAYS 天的残差，基准从 first - DAYS 起算
+    lo = max(first - DAYS, 0)
+    residual = np.full(values.shape, np.nan)
+    baseline = _location(values, lo)
+    residual[:, lo:] = values[:, lo:] - baseline
+    mad, count = _nanmedian(np.abs(_lagged(residual, DAILY_LAGS, first)))
+    median = baseline[:, first - lo:]
+    scale = np.maximum(MAD_SCALE * mad, REL_FLOOR * np.abs(median))
+    scale[count < MIN_PERIODS] = np.nan
+    current = values[:, first:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = (current - median) / scale
+        # 尺度为 0（基准全为 0）时：与基准相同记 0，否则视为极端偏离
+        flat = scale == 0
+        score[flat] = np.sign(current[flat] - median[flat]) * SCORE_CAP
+    return median, scale, np.clip(score, -SCORE_CAP, SCORE_CAP)
+
+
+def _score(values, first=0):
+    """按站点分块计算，返回与 values[:, first:] 同形的 (基准, 尺度, 分数)"""
+    n_stations, n_days, n_metrics = values.shape
+    per_station = max((n_days - max(first - DAYS, 0)) * n_metrics * max(len(WEEKDAY_LAGS), len(DAILY_LAGS)), 1)
+    block = max(1, BLOCK_ELEMENTS // per_station)
+    parts = [_score_block(values[i:i + block], first) for i in range(0, n_stations, block)]
+    if not parts:
+        empty = np.empty((0, n_days - first, n_metrics))
+        return empty, empty, empty
+    return tuple(np.concatenate([p[k] for p in parts], axis=0) for k in range(3))
+
+
+def detect_anomalies(view, metrics=None):
+    """
+    计算全部站点、指标的稳健异常分数
+    输入参数：view 指标立方体日汇总切片（(站点, 日期) 索引）；metrics 指标列，缺省为除记录数外的全部列
+    输出参数：dict（state）
+    stations / dates / metrics 三个维度；values 日值数组 (站点, 日期, 指标)
+    baseline / scale / score 与 values 同形的基准中位数、尺度及稳健分数
+    """
+    if metrics is None:
+        metrics = [c for c in view.columns if c != '记录数']
+    values, stations, dates = _to_array(view, metrics)
+    baseline, scale, score = _score(values)
+    return {'stations': stations, 'dates': dates, 'metrics': list(metrics), 'values': values,
+            'baseline': baseline, 'scale': scale, 'score': score}
+
+
+def update_anomalies(state, view):
+    """
+    增量更新：新数据与 state 的日值逐日比较，只重算第一个有变化的日期（或新增日期）及之后的分数
+    站点或指标集合变化时全部重算
+    """
+    metrics = state['metrics']
+    stations = view.index.get_level_values('站点').unique()
+    if not set(metrics) <= set(view.columns) or not stations.equals(state['stations']):
+        return detect_anomalies(view, metrics)
+    values, stations, dates = _to_array(view, metrics, stations)
+    if len(dates) == 0 or len(state['dates']) == 0 or dates[0] != state['dates'][0]:
+        return detect_anomalies(view, metrics)
+    overlap = min(len(dates), len(state['dates']))
+    old, new = state['values'][:, :overlap], values[:, :overlap]
+    changed = ~((old == new) | (np.isnan(old) & np.isnan(new)))
+    changed_days = np.flatnonzero(changed.any(axis=(0, 2)))
+    first = int(changed_days[0]) if len(changed_days) else overlap
+    result = {'stations': stations, 'dates': dates, 'metrics': metrics, 'values': values}
+    tail = _score(values, first)
+    for k, key in enumerate(('baseline', 'scale', 'score')):
+        result[key] = np.concatenate([state[key][:, :first], tail[k]], axis=1)
+    return result
+
+
+def anomaly_frame(state, start=None, end=None, stations=None, threshold=THRESHOLD):
+    """
+    state -> 以 (站点, 日期) 为索引的明细表，每个指标含 指标、指标_基准、指标_尺度、指标_score、指标_异常 五列
+    按日期范围（含两端）和站点筛选，只保留有日值的行
+    """
+    index = pd.MultiIndex.from_product([state['stations'], state['dates']], names=['站点', '日期'])
+    columns = {}
+    for m, metric in enumerate(state['metrics']):
+        score = state['score'][:, :, m].ravel()
+        columns[metric] = state['values'][:, :, m].ravel()
+        columns[f'{metric}_基准'] = state['baseline'][:, :, m].ravel()
+        columns[f'{metric}_尺度'] = state['scale'][:, :, m].ravel()
+        columns[f'{metric}_score'] = score
+        columns[f'{metric}_异常'] = np.abs(np.nan_to_num(score)) > threshold
+    frame = pd.DataFrame(columns, index=index)
+    frame = frame[~np.isnan(state['values']).all(axis=2).ravel()]
+    return slice_anomalies(frame, start, end, stations)
+
+
+def slice_anomalies(frame, start=None, end=None, stations=None):
+    """anomaly_frame 明细表按日期范围（含两端）和站点筛选，返回新的 DataFrame"""
+    mask = np.ones(len(frame), dtype=bool)
+    dates = frame.index.get_level_values('日期')
+    if start is not None:
+        mask &= dates >= pd.Timestamp(start)
+    if end is not None:
+        mask &= dates <= pd.Timestamp(end)
+    if stations is not None:
+        mask &= frame.index.get_level_values('站点').isin(list(stations))
+    return frame[mask]
+
+
+def anomaly_list(frame, metrics=None, top=None):
+    """明细表 -> 异常记录长表（站点/日期/指标/实际值/基准值/偏离分数/方向），按 |偏离分数| 降序"""
+    metrics = metrics or [c[:-3] for c in frame.columns if c.endswith('_异常')]
+    parts = []
+    for metric in metrics:
+        flagged = frame[frame[f'{metric}_异常']]
+        parts.append(pd.DataFrame({
+            '指标': metric,
+            '实际值': flagged[metric],
+            '基准值': flagged[f'{metric}_基准'],
+            '偏离分数': flagged[f'{metric}_score'],
+        }, index=flagged.index))
+    columns = ['站点', '日期', '指标', '实际值', '基准值', '偏离分数', '方向']
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    result = pd.concat(parts).reset_index()
+    result['方向'] = np.where(result['偏离分数'] > 0, '偏高', '偏低')
+    result = result.iloc[np.argsort(-result['偏离分数'].abs().to_numpy(), kind='stable')]
+    if top is not None:
+        result = result.head(top)
+    return result[columns].reset_index(drop=True)
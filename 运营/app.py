@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
-from utils import DeepseekLLM, file_uploader, load_data
+from utils import file_uploader, load_data, load_cube, load_anomaly_frame
+from metrics_cube import (slice_cube, period_view, totals_by_date, totals_by_station, per_record_mean,
+                          ROLLUP_FREQ)
+from llm_cache import LLM_CACHE
+from llm_client import LLM_CLIENT
 from pandasai_analysis import pandasai_analysis
 from smart_pandasai_analysis import smart_pandasai_analysis
 from Deepseek_report import smart_report
@@ -29,28 +33,36 @@ data = load_data(uploaded_file)
 if data.empty:
     st.warning("请上传Excel数据文件或检查文件格式是否正确")
     st.stop()
+# 站点 × 日 指标立方体，各标签页按筛选条件切片
+cube = load_cube(uploaded_file, data)
 
 # 侧边栏 - 筛选条件
 st.sidebar.header("数据筛选")
 date_range = st.sidebar.date_input(
     "日期范围",
-    value=[data['日期'].min(), data['日期'].max()],
-    min_value=data['日期'].min(),
-    max_value=data['日期'].max()
+    value=[cube['start'], cube['end']],
+    min_value=cube['start'],
+    max_value=cube['end']
 )
 
 selected_stations = st.sidebar.multiselect(
     "选择站点",
-    options=data['站点'].unique(),
-    default=data['站点'].unique()
+    options=cube['stations'],
+    default=cube['stations']
 )
 
 # 应用筛选条件
+filter_start = pd.to_datetime(date_range[0])
+filter_end = pd.to_datetime(date_range[-1])
 filtered_data = data[
-    (data['日期'] >= pd.to_datetime(date_range[0])) & 
-    (data['日期'] <= pd.to_datetime(date_range[1])) &
+    (data['日期'] >= filter_start) & 
+    (data['日期'] <= filter_end + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')) &
     (data['站点'].isin(selected_stations))
 ]
+# 立方体切片（站点 × 日），核心指标、站点对比、趋势分析均由此汇总
+cube_view = slice_cube(cube, filter_start, filter_end, selected_stations)
+# 稳健异常分数按全部历史计算，再按筛选条件取明细
+anomalies = load_anomaly_frame(uploaded_file, cube, filter_start, filter_end, selected_stations)
 
 # 主界面
 tab1, tab2, tab3, tab4, tab5, tab6,tab7 = st.tabs(["核心指标", "站点对比", "趋势分析", "Deepseek报告分析", "PandasAI分析", "智能问答分析",'手动分析'])
@@ -58,18 +70,27 @@ tab1, tab2, tab3, tab4, tab5, tab6,tab7 = st.tabs(["核心指标", "站点对比
 # 侧边栏 - Deepseek API设置
 st.sidebar.header("AI分析设置")
 deepseek_key = st.sidebar.text_input("Deepseek API密钥", type="password")
+# 相同提示词的AI结果直接取本地缓存
+cache_stats = LLM_CACHE.stats()
+st.sidebar.caption(f"AI结果缓存：命中 {cache_stats['命中']} 次，未命中 {cache_stats['未命中']} 次，"
+                   f"{cache_stats['条目数']} 条 / {cache_stats['占用(MB)']}MB")
+if st.sidebar.button("清空AI缓存"):
+    LLM_CACHE.clear()
+# 最近的接口调用耗时、重试及 token 用量
+call_stats = LLM_CLIENT.stats()
+if call_stats['调用次数']:
+    st.sidebar.caption(f"AI接口调用：{call_stats['调用次数']} 次（失败 {call_stats['失败次数']} 次，重试 {call_stats['重试次数']} 次），"
+                       f"平均耗时 {call_stats['平均耗时(s)']}s，首字 {call_stats['平均首字(s)']}s，"
+                       f"tokens {call_stats['提示tokens']} / {call_stats['生成tokens']}")
 
 with tab1:
     st.header("核心指标概览")
     
     # 计算每日核心指标
-    daily_summary = filtered_data.groupby('日期').agg(
-        总充电量=('充电量', 'sum'),
-        总订单数=('订单数', 'sum'),
-        总结算收益=('结算收益', 'sum'),
-        总服务费收入=('服务费收入', 'sum'),
-        总停车费收入=('停车费收入', 'sum')
-    ).reset_index()
+    daily_summary = totals_by_date(cube_view).rename(columns={
+        '充电量': '总充电量', '订单数': '总订单数', '结算收益': '总结算收益',
+        '服务费收入': '总服务费收入', '停车费收入': '总停车费收入'
+    }).reset_index()
     
     # 指标卡片
     col1, col2, col3, col4, col5 = st.columns(5)
@@ -132,13 +153,13 @@ with tab1:
             tooltip=['日期', '总结算收益']
         ).properties(height=300), use_container_width=True)
     
-    # 月度统计
-    st.subheader("月度核心指标")
-    monthly_summary = filtered_data.groupby(filtered_data['日期'].dt.to_period('M')).agg(
-        总充电量=('充电量', 'sum'),
-        总订单数=('订单数', 'sum'),
-        总结算收益=('结算收益', 'sum')
-    ).reset_index()
+    # 月度/周度统计
+    period_freq = st.radio("统计周期", list(ROLLUP_FREQ), format_func=ROLLUP_FREQ.get,
+                           index=list(ROLLUP_FREQ).index('M'), horizontal=True, key='radio_period_freq')
+    st.subheader(f"{ROLLUP_FREQ[period_freq]}度核心指标")
+    monthly_summary = period_view(cube, period_freq, filter_start, filter_end, selected_stations) \
+        .groupby(level='日期')[['充电量', '订单数', '结算收益']].sum() \
+        .rename(columns={'充电量': '总充电量', '订单数': '总订单数', '结算收益': '总结算收益'}).reset_index()
     monthly_summary['日期'] = monthly_summary['日期'].astype(str)
     
     col1, col2 = st.columns(2)
@@ -155,16 +176,17 @@ with tab1:
 with tab2:
     st.header("各站点对比分析")
     
-    if filtered_data.empty:
+    if cube_view.empty:
         st.warning("没有可用的站点数据，请检查筛选条件")
     else:
         # 站点汇总数据
-        station_summary = filtered_data.groupby('站点').agg(
-            总充电量=('充电量', 'sum'),
-            总订单数=('订单数', 'sum'),
-            平均每单充电量=('充电量', 'mean'),
-            平均每单收益=('结算收益', 'mean')
-        ).reset_index()
+        station_totals = totals_by_station(cube_view)
+        station_summary = pd.DataFrame({
+            '总充电量': station_totals['充电量'],
+            '总订单数': station_totals['订单数'],
+            '平均每单充电量': per_record_mean(station_totals, '充电量'),
+            '平均每单收益': per_record_mean(station_totals, '结算收益')
+        }).reset_index()
         
         # 站点排名 - 展示前三名和最后三名
         st.subheader("站点核心指标排名")
@@ -243,15 +265,13 @@ with tab2:
 with tab3:
     st.header("趋势与环比分析")
     
-    if filtered_data.empty:
+    if cube_view.empty:
         st.warning("没有可用的数据，请检查筛选条件")
     else:
         # 月度环比增长率
-        monthly_summary = filtered_data.groupby(filtered_data['日期'].dt.to_period('M')).agg(
-            总充电量=('充电量', 'sum'),
-            总订单数=('订单数', 'sum'),
-            总结算收益=('结算收益', 'sum')
-        ).reset_index()
+        station_monthly = period_view(cube, 'M', filter_start, filter_end, selected_stations)
+        monthly_summary = station_monthly.groupby(level='日期')[['充电量', '订单数', '结算收益']].sum() \
+            .rename(columns={'充电量': '总充电量', '订单数': '总订单数', '结算收益': '总结算收益'}).reset_index()
         monthly_summary['日期'] = monthly_summary['日期'].astype(str)
         
         # 计算环比增长率
@@ -275,7 +295,7 @@ with tab3:
         
         # 站点月度趋势
         st.subheader("各站点月度趋势")
-        station_monthly = filtered_data.groupby([filtered_data['日期'].dt.to_period('M'), '站点'])['充电量'].sum().reset_index()
+        station_monthly = station_monthly['充电量'].reset_index()
         station_monthly['日期'] = station_monthly['日期'].astype(str)
         
         heatmap = alt.Chart(station_monthly).mark_rect().encode(
@@ -288,16 +308,16 @@ with tab3:
 
 with tab4:
     st.header("智能分析报告")
-    smart_report(filtered_data, deepseek_key)
+    smart_report(cube_view, deepseek_key, anomalies)
 
 with tab5:
-    pandasai_analysis(filtered_data, deepseek_key)
+    pandasai_analysis(filtered_data, deepseek_key, anomalies)
 
 with tab6:
-    smart_pandasai_analysis(filtered_data, deepseek_key)
+    smart_pandasai_analysis(cube_view, deepseek_key, anomalies)
 
 with tab7:
-    hand_analysis(filtered_data, deepseek_key)
+    hand_analysis(filtered_data, deepseek_key, cube_view, anomalies)
 # 数据下载
 st.sidebar.header("数据导出")
 if st.sidebar.button("导出筛选数据"):
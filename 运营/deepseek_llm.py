@@ -1,7 +1,8 @@
 # deepseek_llm.py
 from pandasai.llm import LLM
-import requests
-import json
+
+from llm_cache import LLM_CACHE, cache_key
+from llm_client import LLM_CLIENT
 
 class DeepseekLLM(LLM):
     def __init__(
@@ -9,7 +10,9 @@ class DeepseekLLM(LLM):
         api_key: str,
         model: str = "deepseek-chat",
         temperature: float = 0.1,
-        max_tokens: int = 4096
+        max_tokens: int = 4096,
+        cache=LLM_CACHE,
+        client=LLM_CLIENT
     ):
         # 移除父类初始化参数
         super().__init__()  # 不再传递 api_key 和 model
@@ -17,15 +20,19 @@ class DeepseekLLM(LLM):
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
-        self.base_url = "https://api.deepseek.com/v1/chat/completions"
         self.last_prompt = None
+        # 响应缓存，为 None 时不缓存
+        self.cache = cache
+        # 共享的 HTTP 客户端（连接池、超时、重试、并发及速率限制）
+        self.client = client
 
-    def call(self, instruction: str, context: str = None, **kwargs) -> str:
+    def call(self, instruction: str, context: str = None, use_cache: bool = True, **kwargs) -> str:
         """
         调用 Deepseek 模型的 API 以获取响应。
 
         :param instruction: 发送给模型的指令，通常是用户的问题或请求。
         :param context: 可选的上下文信息，当前未使用。
+        :param use_cache: 是否使用响应缓存，False 时总是请求 API（结果仍会写入缓存）。
         :param kwargs: 其他可选参数，当前未使用。
         :return: 模型返回的响应内容。
         """
@@ -33,28 +40,50 @@ class DeepseekLLM(LLM):
         instruction_str = str(instruction)
         # 记录最后一次使用的提示信息
         self.last_prompt = instruction_str
-        # 设置请求头，指定内容类型为 JSON，并添加 API 密钥进行身份验证
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        # 构建请求数据，包含模型名称、用户消息、温度和最大生成令牌数
-        data = {
+        # 相同模型参数和提示词命中缓存时直接返回
+        key = cache_key(self.model, self.temperature, self.max_tokens, instruction_str)
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        # 发送请求并返回模型生成的内容
+        content = self.client.complete(self.api_key, self._payload(instruction_str))
+        if self.cache is not None:
+            self.cache.put(key, content, model=self.model)
+        return content
+
+    def stream(self, instruction: str, use_cache: bool = True):
+        """
+        流式调用（stream=True，服务端以 SSE 逐段返回），逐段产出生成的文本。
+
+        :param instruction: 发送给模型的指令。
+        :param use_cache: 是否使用响应缓存；命中时一次性产出缓存的全文。
+        :return: 生成器，产出文本片段；完整读完后全文写入缓存，中途停止则不写入。
+        """
+        instruction_str = str(instruction)
+        self.last_prompt = instruction_str
+        key = cache_key(self.model, self.temperature, self.max_tokens, instruction_str)
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        parts = []
+        for delta in self.client.stream(self.api_key, self._payload(instruction_str)):
+            parts.append(delta)
+            yield delta
+        if self.cache is not None:
+            self.cache.put(key, "".join(parts), model=self.model)
+
+    def _payload(self, instruction_str: str) -> dict:
+        """构建请求数据，包含模型名称、用户消息、温度和最大生成令牌数"""
+        return {
             "model": self.model,
             "messages": [{"role": "user", "content": instruction_str}],
             "temperature": self.temperature,
             "max_tokens": self.max_tokens
         }
 
-        # 发送 POST 请求到 Deepseek API
-        response = requests.post(self.base_url, headers=headers, json=data)
-        # 检查响应状态码，如果不是 200 则抛出异常
-        if response.status_code != 200:
-            raise Exception(f"API请求失败: {response.status_code}, {response.text}")
-
-        # 解析响应的 JSON 数据并返回模型生成的内容
-        return response.json()["choices"][0]["message"]["content"]
-
     @property
     def type(self) -> str:
         return "deepseek-chat"
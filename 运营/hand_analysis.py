@@ -1,85 +1,14 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import altair as alt
 from datetime import datetime
 
 from deepseek_llm import DeepseekLLM
-
-def calculate_7day_trend(data, metric_name):
-    """计算7天指标变化趋势
-    
-    参数:
-        data: 站点数据(DataFrame)
-        metric_name: 指标名称(str)
-        
-    返回:
-        百分比变化值(float)
-    """
-    if len(data) < 14:  # 不足14天数据无法计算
-        return 0.0
-    
-    latest_date = data['日期'].max()
-    recent_7days = data[data['日期'] > latest_date - pd.Timedelta(days=7)]
-    prev_7days = data[
-        (data['日期'] > latest_date - pd.Timedelta(days=14)) & 
-        (data['日期'] <= latest_date - pd.Timedelta(days=7))
-    ]
-    
-    if len(recent_7days) == 0 or len(prev_7days) == 0:
-        return 0.0
-    
-    recent_avg = recent_7days[metric_name].mean()
-    prev_avg = prev_7days[metric_name].mean()
-    
-    if prev_avg == 0:  # 避免除以0
-        return 0.0
-    
-    return (recent_avg - prev_avg) / prev_avg * 100
-
-def calculate_30day_trend(data, metric_name):
-    """计算30天指标变化趋势
-    
-    参数:
-        data: 站点数据(DataFrame)
-        metric_name: 指标名称(str)
-        
-    返回:
-        百分比变化值(float)
-    """
-    if len(data) < 60:  # 不足60天数据无法计算
-        return 0.0
-    
-    latest_date = data['日期'].max()
-    recent_30days = data[data['日期'] > latest_date - pd.Timedelta(days=30)]
-    prev_30days = data[
-        (data['日期'] > latest_date - pd.Timedelta(days=60)) & 
-        (data['日期'] <= latest_date - pd.Timedelta(days=30))
-    ]
-    
-    if len(recent_30days) == 0 or len(prev_30days) == 0:
-        return 0.0
-    
-    recent_avg = recent_30days[metric_name].mean()
-    prev_avg = prev_30days[metric_name].mean()
-    
-    if prev_avg == 0:
-        return 0.0
-    
-    return (recent_avg - prev_avg) / prev_avg * 100
-
-def find_best_month(data, metric_name):
-    """查找指标表现最佳的月份
-    
-    参数:
-        data: 站点数据(DataFrame)
-        metric_name: 指标名称(str)
-        
-    返回:
-        最佳月份(int)
-    """
-    monthly_data = data.groupby(data['日期'].dt.month)[metric_name].sum()
-    return monthly_data.idxmax()
+from utils import stream_markdown
+from metrics_cube import build_cube, slice_cube, totals_by_station, per_record_mean
+from station_snapshot import build_snapshot, station_daily
+from anomaly_engine import THRESHOLD, WEEKS, anomaly_list
+from advice_batch import generate_advice, MAX_WORKERS
 
 def create_comparison_chart(data1, data2, metric_name, label1, label2):
     """创建带差异分析的对比柱状图
@@ -155,81 +84,44 @@ def create_comparison_chart(data1, data2, metric_name, label1, label2):
     
     return chart
 
-def get_max_indicator(df):
-    """获取表现最优指标"""
-    return df[['充电量', '订单数', '结算收益']].mean().idxmax()
-
-def get_min_indicator(df):
-    """获取表现最差指标""" 
-    return df[['充电量', '订单数', '结算收益']].mean().idxmin()
-
-def generate_summary_text(data, station=None, deepseek_key=None):
+def generate_summary_text(snapshot, station=None, deepseek_key=None):
     """生成文字性总结报告
     
     参数:
-        data: 充电站数据
+        snapshot: 站点运营快照(build_snapshot 的结果)
         station: 站点名称
         deepseek_key: Deepseek API密钥(可选)
     """
     if station:
-        station_data = data[data['站点'] == station]
-        total_charge = station_data['充电量'].sum()
-        total_orders = station_data['订单数'].sum()
-        total_revenue = station_data['结算收益'].sum()
-        
-        # 计算同比(与上月同期对比)
-        current_month = station_data['日期'].max().month
-        last_month_data = station_data[station_data['日期'].dt.month == current_month - 1]
+        s = snapshot['stations'].loc[station]
         
-        if not last_month_data.empty:
-            last_month_charge = last_month_data['充电量'].sum()
-            charge_yoy = (total_charge - last_month_charge) / last_month_charge * 100
-            last_month_orders = last_month_data['订单数'].sum()
-            orders_yoy = (total_orders - last_month_orders) / last_month_orders * 100
-            last_month_revenue = last_month_data['结算收益'].sum()
-            revenue_yoy = (total_revenue - last_month_revenue) / last_month_revenue * 100
-            
-            yoy_text = f"同比上月: 充电量{charge_yoy:.1f}%, 订单数{orders_yoy:.1f}%, 收益{revenue_yoy:.1f}%"
+        # 与上月对比
+        if s['有上月数据']:
+            yoy_text = (f"同比上月: 充电量{s['当月充电量环比(%)']:.1f}%, 订单数{s['当月订单数环比(%)']:.1f}%, "
+                        f"收益{s['当月结算收益环比(%)']:.1f}%")
         else:
             yoy_text = "无上月同期数据"
         
-        # 计算与平均值的对比
-        avg_charge = data['充电量'].mean()
-        charge_vs_avg = (station_data['充电量'].mean() - avg_charge) / avg_charge * 100
-        avg_orders = data['订单数'].mean()
-        orders_vs_avg = (station_data['订单数'].mean() - avg_orders) / avg_orders * 100
-        avg_revenue = data['结算收益'].mean()
-        revenue_vs_avg = (station_data['结算收益'].mean() - avg_revenue) / avg_revenue * 100
-        
-        # 计算运营效率指标
-        charge_per_order = total_charge / total_orders if total_orders > 0 else 0
-        revenue_per_order = total_revenue / total_orders if total_orders > 0 else 0
-        revenue_per_kwh = total_revenue / total_charge if total_charge > 0 else 0
-        
-        # 获取峰值日数据
-        peak_day = station_data.loc[station_data['充电量'].idxmax()]
-        avg_day_charge = total_charge / len(station_data['日期'].unique())
-        
         summary = f"""
         ## {station}运营分析报告
         
         ### 核心业绩
-        - 总充电量: {total_charge:,.0f}kWh (日均 {avg_day_charge:,.0f}kWh)
-        - 总订单数: {total_orders:,.0f}单
-        - 总收益: {total_revenue:,.0f}元
-        - 峰值日: {peak_day['日期'].strftime('%m-%d')} {peak_day['充电量']:,.0f}kWh
+        - 总充电量: {s['总充电量']:,.0f}kWh (日均 {s['日均充电量']:,.0f}kWh)
+        - 总订单数: {s['总订单数']:,.0f}单
+        - 总收益: {s['总结算收益']:,.0f}元
+        - 峰值日: {s['峰值日'].strftime('%m-%d')} {s['峰值日充电量']:,.0f}kWh
         
         ### 运营效率
-        - 单订单充电量: {charge_per_order:,.1f}kWh/单
-        - 单订单收益: {revenue_per_order:,.1f}元/单 
-        - 单位电量收益: {revenue_per_kwh:,.2f}元/kWh
+        - 单订单充电量: {s['单订单充电量']:,.1f}kWh/单
+        - 单订单收益: {s['单订单收益']:,.1f}元/单 
+        - 单位电量收益: {s['单位电量收益']:,.2f}元/kWh
         
         ### 趋势分析
         - {yoy_text}
         - 与全站均值对比:
-          充电量{charge_vs_avg:+.1f}% (规模优势显著)
-          订单数{orders_vs_avg:+.1f}% (客流量领先)
-          收益{revenue_vs_avg:+.1f}% (需关注定价策略)
+          充电量{s['充电量较均值(%)']:+.1f}% (规模优势显著)
+          订单数{s['订单数较均值(%)']:+.1f}% (客流量领先)
+          收益{s['结算收益较均值(%)']:+.1f}% (需关注定价策略)
         
         ### 管理建议
         - 充电量增长强劲，但收益转化率低于均值
@@ -237,36 +129,67 @@ def generate_summary_text(data, station=None, deepseek_key=None):
         - 峰值日表现突出，可总结推广经验
         """
         
+        advice_text = """
+            - 充电量增长强劲，但收益转化率低于均值
+            - 建议分析定价策略和成本结构
+            - 峰值日表现突出，可总结推广经验
+            """
         if deepseek_key:
-            advice_prompt = f"""
+            advice_prompt = summary_prompt(snapshot, station)
+
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                if st.button("管理建议分析", key=f"advice_{station}"):
+                    with st.spinner("正在分析..."):
+                        try:
+                            llm = DeepseekLLM(
+                                api_key=deepseek_key,
+                                temperature=0.3,
+                                max_tokens=1500
+                            )
+                            advice_text = llm.call(advice_prompt)
+                        except Exception as e:
+                            st.error(f"AI建议生成失败: {str(e)}")
+            
+        # 将建议直接显示在总结报告中
+        summary += advice_text
+        return summary
+    return ""
+
+def summary_prompt(snapshot, station):
+    """总结报告的 AI 提示词(数据均取自快照)"""
+    s = snapshot['stations'].loc[station]
+    overall = snapshot['overall']
+    month_change = "、".join(
+        f"{label}: {s[f'当月{metric}环比(%)']:+.1f}% (上月)" if s['有上月数据'] else f"{label}: 无上月数据"
+        for label, metric in (('充电量', '充电量'), ('订单数', '订单数'), ('收益', '结算收益')))
+    return f"""
             作为充电站运营专家，请先基于以下数据生成专业分析总结并输出总结报告，严格遵循以下结构:
 
             ## 1. 执行摘要
             - **核心发现**:
-              1. {station}站充电量{total_charge:,.0f}kWh，同比上月{charge_yoy:+.1f}%
-              2. 单位电量收益{revenue_per_kwh:.2f}元/kWh，低于全站均值{(revenue_per_kwh - data['结算收益'].sum()/data['充电量'].sum()):+.2f}元
-              3. 峰值日{peak_day['日期'].strftime('%m-%d')}充电量{peak_day['充电量']:,.0f}kWh，是均值的{(peak_day['充电量']/avg_day_charge):.1f}倍
+              1. {station}站充电量{s['总充电量']:,.0f}kWh，当月{s['当月充电量']:,.0f}kWh
+              2. 单位电量收益{s['单位电量收益']:.2f}元/kWh，较全站均值{s['单位电量收益'] - overall['单位电量收益']:+.2f}元
+              3. 峰值日{s['峰值日'].strftime('%m-%d')}充电量{s['峰值日充电量']:,.0f}kWh，是均值的{s['峰值倍数']:.1f}倍
 
             - **关键指标变化**:
-              - 充电量: {charge_yoy:+.1f}% (上月)
-              - 订单数: {orders_yoy:+.1f}% (上月) 
-              - 收益: {revenue_yoy:+.1f}% (上月)
+              - {month_change}
 
             ## 2. 详细分析
             ### 站点运营对比
             - **排名**: 
-              - 充电量排名: {data.groupby('站点')['充电量'].sum().rank(ascending=False)[station]:.0f}/{len(data['站点'].unique())}
-              - 收益排名: {data.groupby('站点')['结算收益'].sum().rank(ascending=False)[station]:.0f}/{len(data['站点'].unique())}
+              - 充电量排名: {s['充电量排名']:.0f}/{overall['站点数']}
+              - 收益排名: {s['结算收益排名']:.0f}/{overall['站点数']}
             - **效率指标**:
-              - 单订单充电量: {charge_per_order:.1f}kWh/单 (全站均值: {data['充电量'].sum()/data['订单数'].sum():.1f})
-              - 单位电量收益: {revenue_per_kwh:.2f}元/kWh (全站均值: {data['结算收益'].sum()/data['充电量'].sum():.2f})
+              - 单订单充电量: {s['单订单充电量']:.1f}kWh/单 (全站均值: {overall['单订单充电量']:.1f})
+              - 单位电量收益: {s['单位电量收益']:.2f}元/kWh (全站均值: {overall['单位电量收益']:.2f})
 
             ### 时间趋势
-            - 最近7天日均充电量: {station_data[station_data['日期'] > station_data['日期'].max() - pd.Timedelta(days=7)]['充电量'].mean():.0f}kWh
-            - 环比增长率: {((station_data[station_data['日期'] > station_data['日期'].max() - pd.Timedelta(days=7)]['充电量'].mean() - station_data[station_data['日期'] > station_data['日期'].max() - pd.Timedelta(days=14)]['充电量'].mean())/station_data[station_data['日期'] > station_data['日期'].max() - pd.Timedelta(days=14)]['充电量'].mean())*100:.1f}%
+            - 最近7天日均充电量: {s['近7天日均充电量']:.0f}kWh
+            - 环比增长率: {s['7天充电趋势(%)']:.1f}%
 
             ### 异常检测
-            - 检测到{len(anomalies)}个异常日，最大偏差: {anomalies['充电量_zscore'].max():.1f}σ
+            - 检测到{s['异常天数']:.0f}个异常日(充电量{s['充电量异常天数']:.0f}、订单数{s['订单数异常天数']:.0f}、收益{s['结算收益异常天数']:.0f})，最大偏差: {s['最大偏差']:.1f}σ
 
             ## 3. 结论与建议
             要求:
@@ -279,44 +202,64 @@ def generate_summary_text(data, station=None, deepseek_key=None):
             5. 列出具体风险预警(站点/指标)
             """
 
-            col1, col2 = st.columns([1, 3])
-            with col1:
-                if st.button("管理建议分析", key=f"advice_{station}"):
-                    with st.spinner("正在分析..."):
-                        try:
-                            llm = DeepseekLLM(
-                                api_key=deepseek_key,
-                                temperature=0.3,
-                                max_tokens=1500
-                            )
-                            ai_advice = llm.call(advice_prompt)
-                            advice_text = ai_advice
-                        except Exception as e:
-                            st.error(f"AI建议生成失败: {str(e)}")
-                            advice_text = """
-                            - 充电量增长强劲，但收益转化率低于均值
-                            - 建议分析定价策略和成本结构
-                            - 峰值日表现突出，可总结推广经验
-                            """
-            
-            # 将建议直接显示在总结报告中
-            summary += advice_text
-        else:
-            summary += """
-            - 充电量增长强劲，但收益转化率低于均值
-            - 建议分析定价策略和成本结构
-            - 峰值日表现突出，可总结推广经验
-            """
-        return summary
-    return ""
+def station_advice_prompt(snapshot, station):
+    """单站点管理建议的 AI 提示词(数据均取自快照)"""
+    s = snapshot['stations'].loc[station]
+    return f"""
+    作为充电站运营专家，请按以下结构输出分析报告：
+    
+    ### 数据总结（必填）
+    用结构化方式概括以下要点：
+    1️⃣ 核心指标表现：
+    - 日均充电量：{s['日均充电量']:.1f}kWh
+    - 订单收益转化率：{s['单订单收益']:.2f}元/单
+    - 设备利用率峰值：{s['利用率峰值']:.1%}
+    
+    2️⃣ 运营特征分析：
+    - 优势项：{s['优势项']} 较均值{s['优势项较均值(%)']:+.1f}%
+    - 短板项：{s['短板项']} 较均值{s['短板项较均值(%)']:+.1f}%
+    
+    3️⃣ 关键趋势：
+    - 最近7天充电量趋势：{s['7天充电趋势(%)']:+.1f}%
+    - 最近7天客单价变化：{s['近7天收益变化(%)']:+.1f}%
+    
+    ### 管理建议（必填）
+    根据上述总结，按以下模板给出建议：
+    
+    [优先级] 建议标题
+    📌 问题定位：结合[指标A]和[指标B]数据，说明具体问题...
+    🔧 落地步骤：
+    1. 立即行动（1周内）：具体可操作步骤（如「调整3台快充桩为慢充桩」）
+    2. 短期优化（1月内）：需要协调资源的改进（如「上线分时定价系统」）
+    3. 长期策略（3月+）：战略级调整（如「与周边商圈签订充电套餐」）
+    🎯 效果预测：量化预期（如「预计提升单日收益1500元」）
+    
+    示例：
+    [优先级1] 提升高价值订单占比
+    📌 问题定位：结合日均72.3单与32.1kWh/单数据，存在小订单占比过高问题...
+    🔧 落地步骤：
+    1. 立即行动：设置满30kWh赠洗车券活动（1周上线）
+    2. 短期优化：开发大客户专用充电套餐（4周完成）
+    3. 长期策略：建设VIP会员专属充电区（Q3落地）
+    🎯 效果预测：大订单占比提升至35%（+15%） 
+    
+    要求：
+    1. 必须引用数据总结中的3个及以上指标
+    2. 每个建议包含3个时间分阶的落地步骤
+    3. 效果预测需关联到具体指标
+    """
 
-def hand_analysis(data, deepseek_key=None):
+def hand_analysis(data, deepseek_key=None, cube_view=None, anomalies=None):
     """专业运营分析仪表板
     
     参数:
         data (DataFrame): 过滤后的充电站数据
         deepseek_key (str): Deepseek API密钥(可选)
+        cube_view (DataFrame): 与 data 相同筛选条件的 站点×日 指标立方体切片(可选，缺省时由 data 构建)
+        anomalies (DataFrame): 相同筛选条件的 anomaly_frame 异常明细(可选，缺省时由 cube_view 计算)
     """
+    if cube_view is None:
+        cube_view = build_cube(data)['daily']
     st.header("专业运营分析")
     
     # 检查API密钥
@@ -326,39 +269,49 @@ def hand_analysis(data, deepseek_key=None):
     # 分析模式选择
     analysis_mode = st.radio(
         "选择分析模式",
-        ["单站点分析", "多站点对比"],
+        ["单站点分析", "多站点对比", "批量管理建议"],
         horizontal=True
     )
     
     if analysis_mode == "单站点分析":
-        single_station_analysis(data, deepseek_key)
+        single_station_analysis(data, build_snapshot(cube_view, anomalies), deepseek_key)
+    elif analysis_mode == "批量管理建议":
+        batch_advice_analysis(build_snapshot(cube_view, anomalies), deepseek_key)
     else:
-        multi_station_analysis(data)
+        multi_station_analysis(cube_view)
 
-def single_station_analysis(data, deepseek_key=None):
-    """单站点深度分析 - 优化后的业务汇报视角"""
+def single_station_analysis(data, snapshot, deepseek_key=None):
+    """单站点深度分析 - 优化后的业务汇报视角
+    
+    参数:
+        data: 过滤后的充电站数据(用于对比图表)
+        snapshot: 站点运营快照(指标卡片、总结及提示词的数据来源)
+        deepseek_key: Deepseek API密钥(可选)
+    """
     st.subheader("站点选择")
     station = st.selectbox("选择分析站点", options=data['站点'].unique())
     station_data = data[data['站点'] == station]
     
-    if station_data.empty:
+    if station_data.empty or station not in snapshot['stations'].index:
         st.warning("该站点无数据")
         return
+    s = snapshot['stations'].loc[station]
+    overall = snapshot['overall']
     
     # ========== 核心KPI展示 ==========
     st.subheader("📊 核心业务指标")
     kpi1, kpi2, kpi3 = st.columns(3)
     with kpi1:
         st.metric("总充电量", 
-                f"{station_data['充电量'].sum():,.0f}kWh",
+                f"{s['总充电量']:,.0f}kWh",
                 help="历史累计充电总量")
     with kpi2:
         st.metric("总订单数",
-                f"{station_data['订单数'].sum():,.0f}单",
+                f"{s['总订单数']:,.0f}单",
                 help="历史累计订单总量")
     with kpi3:
         st.metric("总收益",
-                f"{station_data['结算收益'].sum():,.0f}元",
+                f"{s['总结算收益']:,.0f}元",
                 help="历史累计收益总额")
     
     # ========== 趋势分析 ==========
@@ -367,17 +320,17 @@ def single_station_analysis(data, deepseek_key=None):
     # 近期趋势卡片
     trend1, trend2, trend3 = st.columns(3)
     with trend1:
-        trend_7d = calculate_7day_trend(station_data, '充电量')
+        trend_7d = s['7天充电趋势(%)']
         st.metric("7天充电趋势", 
                 f"{trend_7d:+.1f}%",
                 delta_color="inverse" if trend_7d < 0 else "normal")
     with trend2:
-        trend_30d = calculate_30day_trend(station_data, '充电量')
+        trend_30d = s['30天充电趋势(%)']
         st.metric("30天充电趋势",
                 f"{trend_30d:+.1f}%",
                 delta_color="inverse" if trend_30d < 0 else "normal")
     with trend3:
-        best_month = find_best_month(station_data, '充电量')
+        best_month = s['最佳月份']
         st.metric("历史最佳月份",
                 f"{best_month}月",
                 help="充电量最高的历史月份")
@@ -409,12 +362,12 @@ def single_station_analysis(data, deepseek_key=None):
                 st.altair_chart(order_chart, use_container_width=True)
     else:
         # 与历史最佳对比逻辑
-        best_month = find_best_month(station_data, '充电量')
+        best_month = s['最佳月份']
         best_data = station_data[station_data['日期'].dt.month == best_month]
         current_data = station_data[station_data['日期'].dt.month == station_data['日期'].max().month]
         
         # 获取全站最佳站点数据
-        best_station = data.groupby('站点')['充电量'].sum().idxmax()
+        best_station = snapshot['stations']['总充电量'].idxmax()
         best_station_data = data[data['站点'] == best_station]
         best_station_current = best_station_data[best_station_data['日期'].dt.month == station_data['日期'].max().month]
         
@@ -439,21 +392,17 @@ def single_station_analysis(data, deepseek_key=None):
 
     # 运营效率分析
     st.subheader("运营效率分析")
-    efficiency_metrics = {
-        '单订单充电量': lambda d: d['充电量'].sum() / d['订单数'].sum() if d['订单数'].sum() > 0 else 0,
-        '单订单收益': lambda d: d['结算收益'].sum() / d['订单数'].sum() if d['订单数'].sum() > 0 else 0,
-        '单位电量收益': lambda d: d['结算收益'].sum() / d['充电量'].sum() if d['充电量'].sum() > 0 else 0
-    }
+    efficiency_metrics = ['单订单充电量', '单订单收益', '单位电量收益']
     
     eff_cols = st.columns(len(efficiency_metrics))
-    for i, (name, func) in enumerate(efficiency_metrics.items()):
+    for i, name in enumerate(efficiency_metrics):
         with eff_cols[i]:
-            current_value = func(station_data)
+            current_value = s[name]
             st.metric(
                 label=name,
                 value=f"{current_value:.2f}",
-                delta=f"全站均值: {func(data):.2f}",
-                delta_color="inverse" if current_value < func(data) else "normal"
+                delta=f"全站均值: {overall[name]:.2f}",
+                delta_color="inverse" if current_value < overall[name] else "normal"
             )
 
     # 添加管理建议按钮
@@ -461,60 +410,18 @@ def single_station_analysis(data, deepseek_key=None):
         st.warning("请提供Deepseek API密钥以使用AI分析功能")
     if deepseek_key:
         st.markdown("### 管理建议")
-        advice_prompt = f"""
-        作为充电站运营专家，请按以下结构输出分析报告：
-        
-        ### 数据总结（必填）
-        用结构化方式概括以下要点：
-        1️⃣ 核心指标表现：
-        - 日均充电量：{station_data['充电量'].sum()/len(station_data['日期'].unique()):.1f}kWh
-        - 订单收益转化率：{(station_data['结算收益'].sum()/station_data['订单数'].sum()):.2f}元/单
-        - 设备利用率峰值：{station_data['充电量'].max()/station_data['充电量'].mean():.1%}
-        
-        2️⃣ 运营特征分析：
-        - 优势项：{get_max_indicator(station_data)} 高于均值{(station_data[get_max_indicator(station_data)].mean()/data[get_max_indicator(station_data)].mean()-1):.1%}
-        - 短板项：{get_min_indicator(station_data)} 低于均值{(1 - station_data[get_min_indicator(station_data)].mean()/data[get_min_indicator(station_data)].mean()):.1%}
-        
-        3️⃣ 关键趋势：
-        - 最近7天充电量趋势：{calculate_7day_trend(station_data, '充电量'):+.1f}%
-        - 最近7天客单价变化：{(station_data['结算收益'].iloc[-7:].mean()/station_data['结算收益'].iloc[:-7].mean()-1):+.1%}
-        
-        ### 管理建议（必填）
-        根据上述总结，按以下模板给出建议：
-        
-        [优先级] 建议标题
-        📌 问题定位：结合[指标A]和[指标B]数据，说明具体问题...
-        🔧 落地步骤：
-        1. 立即行动（1周内）：具体可操作步骤（如「调整3台快充桩为慢充桩」）
-        2. 短期优化（1月内）：需要协调资源的改进（如「上线分时定价系统」）
-        3. 长期策略（3月+）：战略级调整（如「与周边商圈签订充电套餐」）
-        🎯 效果预测：量化预期（如「预计提升单日收益1500元」）
-        
-        示例：
-        [优先级1] 提升高价值订单占比
-        📌 问题定位：结合日均72.3单与32.1kWh/单数据，存在小订单占比过高问题...
-        🔧 落地步骤：
-        1. 立即行动：设置满30kWh赠洗车券活动（1周上线）
-        2. 短期优化：开发大客户专用充电套餐（4周完成）
-        3. 长期策略：建设VIP会员专属充电区（Q3落地）
-        🎯 效果预测：大订单占比提升至35%（+15%） 
-        
-        要求：
-        1. 必须引用数据总结中的3个及以上指标
-        2. 每个建议包含3个时间分阶的落地步骤
-        3. 效果预测需关联到具体指标
-        """
+        advice_prompt = station_advice_prompt(snapshot, station)
         
         if st.button("管理建议分析", key=f"advice_{station}"):
-            with st.spinner("正在分析..."):
+            with st.spinner("正在连接..."):
                 try:
                     llm = DeepseekLLM(
                         api_key=deepseek_key,
                         temperature=0.3,
                         max_tokens=1500
                     )
-                    ai_advice = llm.call(advice_prompt)
-                    st.markdown(ai_advice)
+                    # 流式输出，收到首段文本即开始展示
+                    stream_markdown(llm, advice_prompt)
                 except Exception as e:
                     st.error(f"AI建议生成失败: {str(e)}")
                     st.markdown("""
@@ -523,112 +430,73 @@ def single_station_analysis(data, deepseek_key=None):
                     - 峰值日表现突出，可总结推广经验
                     """)
     
-    if station_data.empty:
-        st.warning("该站点无数据")
-        return
-    
     # 文字性总结报告
-    st.markdown(generate_summary_text(data, station))
+    st.markdown(generate_summary_text(snapshot, station))
     
     # 详细指标
     st.subheader(f"{station} - 详细指标")
     
-    # 当月数据
-    current_month = station_data['日期'].max().month
-    month_data = station_data[station_data['日期'].dt.month == current_month]
-    prev_month_data = station_data[station_data['日期'].dt.month == current_month - 1]
-    
-    # 当日数据
-    latest_date = station_data['日期'].max()
-    day_data = station_data[station_data['日期'] == latest_date]
-    prev_day_data = station_data[station_data['日期'] == latest_date - pd.Timedelta(days=1)]
-    
-    # 计算全站当月均值
-    all_stations_month_data = data[data['日期'].dt.month == current_month]
-    avg_month_charge = all_stations_month_data.groupby('站点')['充电量'].sum().mean()
-    avg_month_orders = all_stations_month_data.groupby('站点')['订单数'].sum().mean()
-    avg_month_revenue = all_stations_month_data.groupby('站点')['结算收益'].sum().mean()
-    
-    # 计算变化量
-    month_charge_change = month_data['充电量'].sum() - prev_month_data['充电量'].sum() if not prev_month_data.empty else 0
-    month_orders_change = month_data['订单数'].sum() - prev_month_data['订单数'].sum() if not prev_month_data.empty else 0
-    month_revenue_change = month_data['结算收益'].sum() - prev_month_data['结算收益'].sum() if not prev_month_data.empty else 0
-    
-    # 计算与全站均值的差异
-    month_charge_vs_avg = month_data['充电量'].sum() - avg_month_charge
-    month_orders_vs_avg = month_data['订单数'].sum() - avg_month_orders
-    month_revenue_vs_avg = month_data['结算收益'].sum() - avg_month_revenue
-    
-    day_charge_change = day_data['充电量'].sum() - prev_day_data['充电量'].sum() if not prev_day_data.empty else 0
-    day_orders_change = day_data['订单数'].sum() - prev_day_data['订单数'].sum() if not prev_day_data.empty else 0
-    day_revenue_change = day_data['结算收益'].sum() - prev_day_data['结算收益'].sum() if not prev_day_data.empty else 0
+    latest_date = s['最新日期']
     
     # 指标展示 - 合并当月数据和均值对比
     st.markdown("**当月数据 (含全站均值对比)**")
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("充电量(kWh)", 
-                f"{month_data['充电量'].sum():,.0f}", 
-                f"{month_charge_vs_avg:+,.0f} vs 均值",
+                f"{s['当月充电量']:,.0f}", 
+                f"{s['当月充电量较均值']:+,.0f} vs 均值",
                 delta_color="normal",
-                help=f"上月变化: {month_charge_change:+,.0f}")
+                help=f"上月变化: {s['当月充电量较上月']:+,.0f}")
     with col2:
         st.metric("订单数", 
-                f"{month_data['订单数'].sum():,.0f}", 
-                f"{month_orders_vs_avg:+,.0f} vs 均值",
+                f"{s['当月订单数']:,.0f}", 
+                f"{s['当月订单数较均值']:+,.0f} vs 均值",
                 delta_color="normal",
-                help=f"上月变化: {month_orders_change:+,.0f}")
+                help=f"上月变化: {s['当月订单数较上月']:+,.0f}")
     with col3:
         st.metric("收益(元)", 
-                f"{month_data['结算收益'].sum():,.0f}", 
-                f"{month_revenue_vs_avg:+,.0f} vs 均值",
+                f"{s['当月结算收益']:,.0f}", 
+                f"{s['当月结算收益较均值']:+,.0f} vs 均值",
                 delta_color="normal",
-                help=f"上月变化: {month_revenue_change:+,.0f}")
+                help=f"上月变化: {s['当月结算收益较上月']:+,.0f}")
     
     st.markdown("**当日数据**")
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric(f"{latest_date.strftime('%m-%d')}充电量(kWh)", 
-                f"{day_data['充电量'].sum():,.0f}", 
-                f"{day_charge_change:+,.0f}")
+                f"{s['当日充电量']:,.0f}", 
+                f"{s['当日充电量较前日']:+,.0f}")
     with col2:
         st.metric(f"{latest_date.strftime('%m-%d')}订单数", 
-                f"{day_data['订单数'].sum():,.0f}", 
-                f"{day_orders_change:+,.0f}")
+                f"{s['当日订单数']:,.0f}", 
+                f"{s['当日订单数较前日']:+,.0f}")
     with col3:
         st.metric(f"{latest_date.strftime('%m-%d')}收益(元)", 
-                f"{day_data['结算收益'].sum():,.0f}", 
-                f"{day_revenue_change:+,.0f}")
+                f"{s['当日结算收益']:,.0f}", 
+                f"{s['当日结算收益较前日']:+,.0f}")
     
     # 异常检测
     st.subheader(f"{station} - 异常检测")
-    daily_data = station_data.groupby('日期').agg({
-        '充电量': 'sum',
-        '订单数': 'sum',
-        '结算收益': 'sum'
-    }).reset_index()
-    daily_data['充电量_zscore'] = (daily_data['充电量'] - daily_data['充电量'].mean()) / daily_data['充电量'].std()
-    anomalies = daily_data[np.abs(daily_data['充电量_zscore']) > 2]
+    daily_data = station_daily(snapshot, station)
+    anomalies = daily_data[daily_data['充电量_异常']]
     
     tab1, tab2, tab3 = st.tabs(["充电量", "订单数", "收益"])
-    with tab1:
-        st.altair_chart(alt.Chart(daily_data).mark_line().encode(
-            x='日期:T',
-            y='充电量:Q',
-            tooltip=['日期', '充电量']
-        ).properties(height=300), use_container_width=True)
-    with tab2:
-        st.altair_chart(alt.Chart(daily_data).mark_line().encode(
-            x='日期:T',
-            y='订单数:Q',
-            tooltip=['日期', '订单数']
-        ).properties(height=300), use_container_width=True)
-    with tab3:
-        st.altair_chart(alt.Chart(daily_data).mark_line().encode(
-            x='日期:T',
-            y='结算收益:Q',
-            tooltip=['日期', '结算收益']
-        ).properties(height=300), use_container_width=True)
+    for tab, metric in zip((tab1, tab2, tab3), ('充电量', '订单数', '结算收益')):
+        with tab:
+            line = alt.Chart(daily_data).mark_line().encode(
+                x='日期:T',
+                y=f'{metric}:Q',
+                tooltip=['日期', metric]
+            )
+            points = alt.Chart(daily_data[daily_data[f'{metric}_异常']]).mark_point(
+                color='red', filled=True, size=80
+            ).encode(
+                x='日期:T',
+                y=f'{metric}:Q',
+                tooltip=['日期', metric, alt.Tooltip(f'{metric}_基准:Q', format=',.0f', title='基准'),
+                         alt.Tooltip(f'{metric}_score:Q', format='.1f', title='偏离分数')]
+            )
+            st.altair_chart((line + points).properties(height=300), use_container_width=True)
     
     # 时间趋势分析
     st.subheader(f"{station} - 时间趋势")
@@ -637,25 +505,26 @@ def single_station_analysis(data, deepseek_key=None):
         # 异常统计卡片
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("异常天数", f"{len(anomalies)}天", help="偏离均值2个标准差以上的天数")
+            st.metric("异常天数", f"{len(anomalies)}天",
+                      help=f"充电量偏离同星期几基准{THRESHOLD}个稳健标准差以上的天数")
         with col2:
-            max_dev = anomalies['充电量_zscore'].abs().max()
-            st.metric("最大偏差", f"{max_dev:.1f}σ", delta_color="off")
+            st.metric("最大偏差", f"{anomalies['充电量_score'].abs().max():.1f}σ", delta_color="off")
         with col3:
-            avg_charge = daily_data['充电量'].mean()
             st.metric("异常日平均充电量", 
-                     f"{anomalies['充电量'].mean():,.0f}kWh", 
-                     f"均值: {avg_charge:,.0f}kWh")
+                     f"{s['异常日平均充电量']:,.0f}kWh", 
+                     f"均值: {s['日均充电量']:,.0f}kWh")
 
         # 增强型异常分析图表
         st.subheader("异常检测分析")
         
-        # 计算参考数据
-        mean_charge = daily_data['充电量'].mean()
-        std_charge = daily_data['充电量'].std()
+        # 正常范围：基准 ± THRESHOLD × 尺度
+        band_data = daily_data.assign(
+            上限=daily_data['充电量_基准'] + THRESHOLD * daily_data['充电量_尺度'],
+            下限=daily_data['充电量_基准'] - THRESHOLD * daily_data['充电量_尺度']
+        )
         
         # 创建基础图表
-        base = alt.Chart(daily_data).encode(
+        base = alt.Chart(band_data).encode(
             x=alt.X('日期:T', 
                    title='日期',
                    axis=alt.Axis(format='%m-%d', labelAngle=-45,
@@ -664,13 +533,10 @@ def single_station_analysis(data, deepseek_key=None):
                    scale=alt.Scale(zero=False))
         )
         
-        # 置信区间背景
+        # 正常范围背景
         confidence_band = base.mark_area(opacity=0.2, color='#FFD700').encode(
-            y=alt.Y('datum.mean_charge + 2*datum.stdev_charge:Q', title=''),
-            y2=alt.Y2('datum.mean_charge - 2*datum.stdev_charge:Q')
-        ).transform_calculate(
-            mean_charge=str(mean_charge),
-            stdev_charge=str(std_charge)
+            y=alt.Y('上限:Q', title=''),
+            y2=alt.Y2('下限:Q')
         )
         
         # 原始数据趋势线
@@ -682,7 +548,8 @@ def single_station_analysis(data, deepseek_key=None):
             tooltip=[
                 alt.Tooltip('日期:T', format='%Y-%m-%d', title='日期'),
                 alt.Tooltip('充电量:Q', format=',.0f', title='实际值'),
-                alt.Tooltip('充电量_zscore:Q', format='.1f', title='标准差')
+                alt.Tooltip('充电量_基准:Q', format=',.0f', title='基准'),
+                alt.Tooltip('充电量_score:Q', format='.1f', title='偏离分数')
             ]
         )
         
@@ -699,7 +566,8 @@ def single_station_analysis(data, deepseek_key=None):
             tooltip=[
                 alt.Tooltip('日期:T', format='%Y-%m-%d', title='异常日期'),
                 alt.Tooltip('充电量:Q', format=',.0f', title='异常值'),
-                alt.Tooltip('充电量_zscore:Q', format='.1f', title='偏离标准差'),
+                alt.Tooltip('充电量_基准:Q', format=',.0f', title='基准'),
+                alt.Tooltip('充电量_score:Q', format='.1f', title='偏离分数'),
                 alt.Tooltip('订单数:Q', format=',.0f', title='当日订单'),
                 alt.Tooltip('结算收益:Q', format=',.0f', title='当日收益')
             ]
@@ -725,12 +593,12 @@ def single_station_analysis(data, deepseek_key=None):
 
         # 异常日详细数据
         with st.expander("查看异常日详细数据"):
-            # 格式化数据框
-            df_display = anomalies[['日期', '充电量', '充电量_zscore']].copy()
+            # 各指标的异常记录
+            df_display = anomaly_list(daily_data.assign(站点=station).set_index(['站点', '日期']),
+                                      ['充电量', '订单数', '结算收益']).drop(columns='站点')
             df_display['日期'] = df_display['日期'].dt.strftime('%Y-%m-%d')
-            df_display['充电量'] = df_display['充电量'].apply(lambda x: f"{x:,.0f}kWh")
-            df_display['充电量_zscore'] = df_display['充电量_zscore'].apply(lambda x: f"{x:.1f}σ")
-            df_display.columns = ['异常日期', '充电量', '偏离程度']
+            df_display['偏离分数'] = df_display['偏离分数'].apply(lambda x: f"{x:+.1f}σ")
+            df_display.columns = ['异常日期', '指标', '实际值', '基准值', '偏离程度', '方向']
             
             st.dataframe(
                 df_display,
@@ -745,11 +613,11 @@ def single_station_analysis(data, deepseek_key=None):
             )
         
         # 分析说明
-        st.markdown("""
+        st.markdown(f"""
         <div style="background-color:#F8F9FA;padding:15px;border-radius:8px">
             <h4>📊 分析说明</h4>
             <ul>
-                <li>异常检测标准：充电量偏离历史均值2个标准差(σ)以上</li>
+                <li>异常检测标准：与前{WEEKS}周同星期几的中位数比较，偏离超过{THRESHOLD}个稳健标准差(σ，由残差MAD估计)</li>
                 <li>红色标记表示异常日期，建议重点关注这些日期的运营情况</li>
                 <li>点击图表中的异常点可查看详细数据</li>
                 <li>展开下方面板可查看完整异常日列表</li>
@@ -760,30 +628,78 @@ def single_station_analysis(data, deepseek_key=None):
     else:
         st.success("✅ 运营数据正常，未检测到显著异常")
 
-def multi_station_analysis(data):
-    """多站点对比分析"""
+def batch_advice_analysis(snapshot, deepseek_key=None):
+    """多站点管理建议批量生成 - 各站点并发请求，完成一个展示一个
+    
+    参数:
+        snapshot: 站点运营快照
+        deepseek_key: Deepseek API密钥
+    """
+    stations = list(snapshot['stations'].index)
+    selected_stations = st.multiselect("选择生成建议的站点", options=stations, default=stations,
+                                       key="batch_advice_stations")
+    if not deepseek_key:
+        return
+    if not selected_stations:
+        st.warning("请至少选择1个站点")
+        return
+    
+    # 结果保存在会话中，页面重跑后仍可查看
+    results = st.session_state.setdefault("batch_advice", {})
+    if st.button(f"批量生成管理建议({len(selected_stations)}个站点)", key="batch_advice_run"):
+        results.clear()
+        prompts = {station: station_advice_prompt(snapshot, station) for station in selected_stations}
+        progress = st.progress(0.0, text="正在生成...")
+        placeholders = {station: st.empty() for station in selected_stations}
+        for station in selected_stations:
+            placeholders[station].info(f"{station}：生成中...")
+        for done, (station, text, error, seconds) in enumerate(
+                generate_advice(prompts, deepseek_key, max_workers=MAX_WORKERS), start=1):
+            results[station] = (text, error, seconds)
+            with placeholders[station].container():
+                show_station_advice(station, text, error, seconds)
+            progress.progress(done / len(prompts), text=f"已完成 {done}/{len(prompts)}")
+        progress.empty()
+    else:
+        for station in selected_stations:
+            if station in results:
+                show_station_advice(station, *results[station])
+
+def show_station_advice(station, text, error, seconds):
+    """展示单个站点的建议或错误信息"""
+    if error:
+        st.error(f"{station}：AI建议生成失败: {error}")
+        return
+    with st.expander(f"{station} 管理建议（{seconds:.1f}秒）", expanded=False):
+        st.markdown(text)
+
+def multi_station_analysis(cube_view):
+    """多站点对比分析
+    
+    参数:
+        cube_view: 站点×日 指标立方体切片(DataFrame)
+    """
+    stations = cube_view.index.get_level_values('站点').unique()
     selected_stations = st.multiselect(
         "选择对比站点(至少2个)", 
-        options=data['站点'].unique(),
-        default=data['站点'].unique()[:2]
+        options=stations,
+        default=stations[:2]
     )
     
     if len(selected_stations) < 2:
         st.warning("请选择至少2个站点进行对比")
         return
     
-    filtered_data = data[data['站点'].isin(selected_stations)]
+    filtered_view = slice_cube({'daily': cube_view}, stations=selected_stations)
     
     # 站点对比指标
     st.subheader("站点核心指标对比")
-    summary = filtered_data.groupby('站点').agg({
-        '充电量': ['sum', 'mean'],
-        '订单数': ['sum', 'mean'],
-        '结算收益': ['sum', 'mean']
+    totals = totals_by_station(filtered_view)
+    summary = pd.DataFrame({
+        '总充电量': totals['充电量'], '平均充电量': per_record_mean(totals, '充电量'),
+        '总订单数': totals['订单数'], '平均订单数': per_record_mean(totals, '订单数'),
+        '总收益': totals['结算收益'], '平均收益': per_record_mean(totals, '结算收益')
     }).reset_index()
-    
-    # 扁平化多级列名
-    summary.columns = ['站点', '总充电量', '平均充电量', '总订单数', '平均订单数', '总收益', '平均收益']
     st.dataframe(summary.style.format({
         '总充电量': '{:,.0f}',
         '平均充电量': '{:,.1f}',
@@ -807,11 +723,7 @@ def multi_station_analysis(data):
     
     # 时间趋势对比
     st.subheader("时间趋势对比")
-    daily_comparison = filtered_data.groupby(['日期', '站点']).agg({
-        '充电量': 'sum',
-        '订单数': 'sum',
-        '结算收益': 'sum'
-    }).reset_index()
+    daily_comparison = filtered_view[['充电量', '订单数', '结算收益']].reset_index()
     
     trend_metric = st.selectbox("选择趋势指标", ['充电量', '订单数', '结算收益'])
     trend_chart = alt.Chart(daily_comparison).mark_line().encode(
@@ -0,0 +1,119 @@
+"""
+Deepseek 调用结果的本地缓存
+
+以 (模型, temperature, max_tokens, 提示词) 的哈希为键，每条结果存为 CACHE_DIR 下的一个 JSON 文件。
+Streamlit 每次重跑或重复点击按钮时相同提示词直接取缓存，不再重复请求、重复计费。超过 TTL 的条目视为
+失效；总大小超过 MAX_BYTES 时按最近使用时间（文件 mtime，命中时更新）淘汰最久未用的条目。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'llm')
+# 缓存有效期（秒）
+TTL = 7 * 24 * 3600
+# 缓存目录总大小上限（字节）
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def cache_key(model, temperature, max_tokens, prompt):
+    payload = json.dumps([model, temperature, max_tokens, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """线程安全的磁盘缓存，记录命中 / 未命中次数"""
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=TTL, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def get(self, key):
+        """返回缓存的响应文本，不存在或已过期时返回 None"""
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            if time.time() - entry['created'] > self.ttl:
+                os.remove(path)
+                entry = None
+            else:
+                # 更新 mtime，淘汰时按最近使用排序
+                os.utime(path)
+        except (OSError, ValueError, KeyError):
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry['response'] if entry else None
+
+    def put(self, key, response, **meta):
+        """写入一条结果（原子替换），meta 为附带记录的信息，如模型名称"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f'{self._path(key)}.{threading.get_ident()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'created': time.time(), 'response': response, **meta}, f, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+            self.evict()
+        except OSError:
+            # 目录不可写时只是不缓存
+            pass
+
+    def _entries(self):
+        try:
+            names = [n for n in os.listdir(self.cache_dir) if n.endswith('.json')]
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def evict(self):
+        """总大小超过上限时删除最久未使用的条目"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, name in self._entries():
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {'命中': hits, '未命中': misses, '条目数': len(entries),
+                '占用(MB)': round(sum(size for _, size, _ in entries) / 1024 / 1024, 2)}
+
+
+# 进程内共享的缓存（各会话共用）
+LLM_CACHE = LLMCache()
@@ -0,0 +1,196 @@
+"""
+Deepseek HTTP 客户端（各 LLM 封装共用）
+
+进程内共用一个 requests.Session（连接池长连接，免去每次调用的 TCP/TLS 握手），请求设置连接、读取超时，
+遇到 429 / 5xx 或连接失败时按带抖动的指数退避重试（有 Retry-After 时按其等待），并发请求数由信号量限制，
+发往接口的请求速率（含重试）由限速器限制在 RATE_PER_SECOND 以内。
+每次调用记录耗时、首字耗时、重试次数及 token 用量（接口返回的 usage），可在界面上查看。
+读取超时不重试：请求可能已被服务端处理，重发会重复计费。
+"""
+import collections
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = "https://api.deepseek.com/v1/chat/completions"
+# 连接超时、读取超时（秒）；流式调用的读取超时为相邻两段数据的最长间隔
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 120
+# 最大并发请求数（同时也是连接池大小）
+MAX_CONCURRENCY = 32
+# 重试次数及退避参数（秒）
+RETRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 20.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 每秒最多发起的请求数，None 为不限
+RATE_PER_SECOND = 10.0
+# 保留最近 HISTORY 次调用记录
+HISTORY = 200
+
+
+class RateLimiter:
+    """线程安全的最小间隔限速器：相邻两次 acquire 的间隔不小于 1 / rate 秒"""
+
+    def __init__(self, rate=RATE_PER_SECOND):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class LLMClient:
+    """线程安全的 Deepseek 请求客户端"""
+
+    def __init__(self, base_url=BASE_URL, max_concurrency=MAX_CONCURRENCY, retries=RETRIES,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), rate=RATE_PER_SECOND):
+        self.base_url = base_url
+        self.limiter = RateLimiter(rate)
+        self.retries = retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.history = collections.deque(maxlen=HISTORY)
+
+    def _backoff(self, attempt, response=None):
+        """第 attempt 次重试前的等待时间：Retry-After 优先，否则 [0, min(上限, 基数 × 2^attempt)] 均匀抖动"""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def _post(self, api_key, payload, stream, record):
+        """发送请求（含重试），返回状态码为 200 的响应；失败时抛出异常"""
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        for attempt in range(self.retries + 1):
+            response = None
+            if attempt:
+                # 首次请求在计时前已限速（见 complete / stream），重试同样计入速率
+                self.limiter.acquire()
+            try:
+                response = self.session.post(self.base_url, headers=headers, json=payload,
+                                             stream=stream, timeout=self.timeout)
+            except requests.ConnectionError:
+                # 连接失败 / 连接超时（含长连接被服务端关闭）可以重试；ReadTimeout 不是 ConnectionError，直接抛出
+                if attempt == self.retries:
+                    raise
+            else:
+                if response.status_code == 200:
+                    return response
+                if response.status_code not in RETRY_STATUS or attempt == self.retries:
+                    raise Exception(f"API请求失败: {response.status_code}, {response.text}")
+                response.close()
+            record['重试次数'] += 1
+            time.sleep(self._backoff(attempt, response))
+
+    def _record(self, record, start, usage=None):
+        record['耗时(s)'] = round(time.perf_counter() - start, 3)
+        usage = usage or {}
+        record['提示tokens'] = usage.get('prompt_tokens', 0)
+        record['生成tokens'] = usage.get('completion_tokens', 0)
+        with self._lock:
+            self.history.append(record)
+
+    def _new_record(self, payload):
+        return {'时间': time.strftime('%Y-%m-%d %H:%M:%S'), '模型': payload.get('model'), '流式': False,
+                '耗时(s)': None, '首字(s)': None, '重试次数': 0, '提示tokens': 0, '生成tokens': 0, '状态': '成功'}
+
+    def complete(self, api_key, payload):
+        """非流式调用，返回生成的文本"""
+        record = self._new_record(payload)
+        self.limiter.acquire()
+        start = time.perf_counter()
+        try:
+            with self._slots:
+                response = self._post(api_key, payload, False, record)
+                body = response.json()
+        except Exception:
+            record['状态'] = '失败'
+            self._record(record, start)
+            raise
+        record['首字(s)'] = round(time.perf_counter() - start, 3)
+        self._record(record, start, body.get('usage'))
+        return body["choices"][0]["message"]["content"]
+
+    def stream(self, api_key, payload):
+        """流式调用（SSE），逐段产出生成的文本；最后一个事件携带 usage"""
+        payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        record = self._new_record(payload)
+        record['流式'] = True
+        self.limiter.acquire()
+        start = time.perf_counter()
+        usage = None
+        with self._slots:
+            try:
+                response = self._post(api_key, payload, True, record)
+                try:
+                    # 每个事件一行 "data: {json}"，以 "data: [DONE]" 结束，其余行（空行、注释）忽略
+                    for line in response.iter_lines():
+                        if not line.startswith(b"data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == b"[DONE]":
+                            break
+                        event = json.loads(data)
+                        usage = event.get("usage") or usage
+                        choices = event.get("choices") or [{}]
+                        delta = choices[0].get("delta", {}).get("content")
+                        if delta:
+                            if record['首字(s)'] is None:
+                                record['首字(s)'] = round(time.perf_counter() - start, 3)
+                            yield delta
+                finally:
+                    response.close()
+            except BaseException:
+                # 包括调用方中途停止读取（GeneratorExit）
+                record['状态'] = '失败'
+                raise
+            finally:
+                self._record(record, start, usage)
+
+    def stats(self):
+        """最近调用的汇总：次数、失败次数、平均耗时、平均首字耗时、重试次数、token 用量"""
+        with self._lock:
+            records = list(self.history)
+        done = [r for r in records if r['状态'] == '成功']
+        first = [r['首字(s)'] for r in done if r['首字(s)'] is not None]
+        return {
+            '调用次数': len(records),
+            '失败次数': len(records) - len(done),
+            '平均耗时(s)': round(sum(r['耗时(s)'] for r in done) / len(done), 2) if done else 0.0,
+            '平均首字(s)': round(sum(first) / len(first), 2) if first else 0.0,
+            '重试次数': sum(r['重试次数'] for r in records),
+            '提示tokens': sum(r['提示tokens'] for r in records),
+            '生成tokens': sum(r['生成tokens'] for r in records),
+        }
+
+    @property
+    def last(self):
+        """最近一次调用的记录"""
+        with self._lock:
+            return self.history[-1] if self.history else None
+
+
+# 进程内共享的客户端（各会话共用连接池）
+LLM_CLIENT = LLMClient()
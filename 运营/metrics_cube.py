@@ -0,0 +1,94 @@
+"""
+站点 × 日 指标立方体
+
+每个数据集只聚合一次：按 站点、日期 汇总 充电量、订单数、结算收益、服务费收入、停车费收入 及原始记录数，
+并由日数据派生 周、月 汇总。各标签页按当前筛选条件对立方体切片后再汇总，交互开销只与 站点数 × 天数
+有关，与原始记录行数无关。均值类指标用 合计 / 记录数 计算，与对原始行求 mean 的结果一致。
+"""
+import numpy as np
+import pandas as pd
+
+METRIC_COLUMNS = ['充电量', '订单数', '结算收益', '服务费收入', '停车费收入']
+COUNT_COLUMN = '记录数'
+# 周期代码 -> 周期名称
+ROLLUP_FREQ = {'W': '周', 'M': '月'}
+
+
+def _rollup(daily, freq):
+    """日数据 -> (站点, 周期) 汇总，周期为 pandas Period"""
+    period = daily.index.get_level_values('日期').to_period(freq)
+    return daily.groupby([daily.index.get_level_values('站点'), period]).sum().rename_axis(['站点', '日期'])
+
+
+def build_cube(data):
+    """
+    构建指标立方体
+    输入参数：data 原始数据（含 站点、日期 及各指标列）
+    输出参数：dict
+    daily 以 (站点, 日期) 为索引的日汇总，列为各指标及记录数
+    W / M 以 (站点, 周期) 为索引的周、月汇总
+    metrics 实际存在的指标列；stations 站点列表；start / end 日期范围
+    """
+    metrics = [c for c in METRIC_COLUMNS if c in data.columns]
+    keys = [data['站点'], data['日期'].dt.normalize()]
+    values = data[metrics].apply(pd.to_numeric, errors='coerce')
+    daily = values.groupby(keys).sum()
+    daily[COUNT_COLUMN] = values.groupby(keys).size()
+    daily = daily.rename_axis(['站点', '日期']).sort_index()
+    cube = {'daily': daily, 'metrics': metrics,
+            'stations': list(pd.unique(data['站点'])),
+            'start': daily.index.get_level_values('日期').min(),
+            'end': daily.index.get_level_values('日期').max()}
+    for freq in ROLLUP_FREQ:
+        cube[freq] = _rollup(daily, freq)
+    return cube
+
+
+def _mask(index, start, end, stations, period_level=False):
+    dates = index.get_level_values('日期')
+    mask = np.ones(len(index), dtype=bool)
+    if stations is not None:
+        mask &= index.get_level_values('站点').isin(list(stations))
+    if start is not None:
+        mask &= (dates.start_time if period_level else dates) >= pd.Timestamp(start)
+    if end is not None:
+        mask &= (dates.end_time.normalize() if period_level else dates) <= pd.Timestamp(end)
+    return mask
+
+
+def slice_cube(cube, start=None, end=None, stations=None):
+    """按日期范围（含两端）和站点筛选日汇总"""
+    daily = cube['daily']
+    return daily[_mask(daily.index, start, end, stations)]
+
+
+def period_view(cube, freq, start=None, end=None, stations=None):
+    """
+    筛选范围内的 (站点, 周期) 汇总
+    起止日期恰好覆盖整周期时直接取预先汇总的结果，否则由日汇总切片后重新汇总（首尾周期为部分数据）
+    """
+    rollup = cube[freq]
+    first = pd.Timestamp(start) if start is not None else cube['start']
+    last = pd.Timestamp(end) if end is not None else cube['end']
+    if first <= cube['start'] and last >= cube['end']:
+        return rollup[_mask(rollup.index, None, None, stations)]
+    whole = (first == first.to_period(freq).start_time
+             and last == last.to_period(freq).end_time.normalize())
+    if whole:
+        return rollup[_mask(rollup.index, first, last, stations, period_level=True)]
+    return _rollup(slice_cube(cube, start, end, stations), freq)
+
+
+def totals_by_date(view):
+    """日汇总切片 -> 按日期合计（各站点相加）"""
+    return view.groupby(level='日期').sum()
+
+
+def totals_by_station(view):
+    """日汇总切片 -> 按站点合计"""
+    return view.groupby(level='站点').sum()
+
+
+def per_record_mean(totals, column):
+    """合计 / 记录数，等价于对原始记录求均值"""
+    return totals[column] / totals[COUNT_COLUMN].where(totals[COUNT_COLUMN] > 0)
@@ -1,8 +1,8 @@
 import pandas as pd
 from pandasai import SmartDataframe
 from deepseek_llm import DeepseekLLM
+from anomaly_engine import THRESHOLD, anomaly_list
 import streamlit as st
-import time
 import logging
 import io
 import os
@@ -15,6 +15,9 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 CHART_DIR = "exports/charts"
+# 异常检测模板：附带最近 ANOMALY_DAYS 天内 |偏离分数| 最大的 ANOMALY_TOP 条异常
+ANOMALY_DAYS = 7
+ANOMALY_TOP = 30
 
 def get_df_info(df: pd.DataFrame) -> str:
     """Captures DataFrame.info() output as a string."""
@@ -101,8 +104,32 @@ def analyze_with_pandasai(data: pd.DataFrame, question: str, api_key: str) -> di
             "code": getattr(df, 'last_code_generated', None) if 'df' in locals() else None
         }
 
-def pandasai_analysis(filtered_data, deepseek_key):
-    """执行PandasAI智能分析"""
+def recent_anomalies(anomalies, days=ANOMALY_DAYS, top=ANOMALY_TOP):
+    """异常明细(anomaly_frame) -> 最近 days 天的异常记录表"""
+    dates = anomalies.index.get_level_values('日期')
+    if len(dates) == 0:
+        return anomaly_list(anomalies)
+    recent = anomalies[dates > dates.max() - pd.Timedelta(days=days)]
+    return anomaly_list(recent, top=top)
+
+
+def anomaly_question(question, table):
+    """在问题后附上异常检测引擎的结果，模型只需解释原因，不必自行计算异常值"""
+    if table.empty:
+        findings = "检测结果: 该时间段内未发现异常"
+    else:
+        shown = table.assign(日期=table['日期'].dt.strftime('%Y-%m-%d')).round(
+            {'实际值': 1, '基准值': 1, '偏离分数': 1})
+        findings = f"检测结果(偏离分数 = (实际值 - 同星期几基准) / 稳健标准差，|分数|>{THRESHOLD} 为异常):\n" \
+            + shown.to_markdown(index=False)
+    return f"{question}\n\n{findings}"
+
+
+def pandasai_analysis(filtered_data, deepseek_key, anomalies=None):
+    """执行PandasAI智能分析
+    
+    anomalies: 与 filtered_data 相同筛选条件的 anomaly_frame 异常明细(可选)，用于“异常检测”模板
+    """
     if not deepseek_key:
         st.warning("请输入Deepseek API密钥以使用智能分析功能")
         return
@@ -138,42 +165,41 @@ def pandasai_analysis(filtered_data, deepseek_key):
         help="建议包含具体指标如充电量、订单数等，明确分析要求"
     )
     
+    if question_type == "异常检测" and anomalies is not None:
+        # 异常值由检测引擎给出，随问题一并发送
+        anomaly_table = recent_anomalies(anomalies)
+        with st.expander(f"近{ANOMALY_DAYS}天检测到的异常({len(anomaly_table)}条)"):
+            st.dataframe(anomaly_table, use_container_width=True, hide_index=True)
+        question = anomaly_question(question, anomaly_table)
+    
     if st.button("执行智能分析"):
         with st.spinner("正在分析..."):
-            max_retries = 3
-            retry_delay = 1
-            
-            for attempt in range(max_retries):
-                try:
-                    # 使用封装好的分析函数
-                    analysis_result = analyze_with_pandasai(
-                        data=filtered_data,
-                        question=question,
-                        api_key=deepseek_key
-                    )
-                    
-                    if analysis_result["type"] == "error":
-                        st.error(analysis_result["message"])
-                        if analysis_result.get("code"):
-                            with st.expander("查看生成代码(调试)"):
-                                st.code(analysis_result["code"], language="python")
-                    elif analysis_result["type"] == "dataframe":
-                        st.success("分析结果(表格)")
-                        st.markdown(analysis_result["value"])
-                        if analysis_result.get("code"):
-                            with st.expander("查看生成代码(调试)"):
-                                st.code(analysis_result["code"], language="python")
-                    else:  # text or other
-                        st.success("分析结果")
-                        st.markdown(analysis_result["value"])
-                        if analysis_result.get("code"):
-                            with st.expander("查看生成代码(调试)"):
-                                st.code(analysis_result["code"], language="python")
-                    break
-                    
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        st.error(f"分析失败: {str(e)}")
-                    else:
-                        st.warning(f"尝试 {attempt + 1} 失败，正在重试...")
-                        time.sleep(retry_delay)
+            # 网络错误、429/5xx 的重试由共享的 LLM_CLIENT 按退避策略处理，这里不再整体重跑分析
+            try:
+                # 使用封装好的分析函数
+                analysis_result = analyze_with_pandasai(
+                    data=filtered_data,
+                    question=question,
+                    api_key=deepseek_key
+                )
+                
+                if analysis_result["type"] == "error":
+                    st.error(analysis_result["message"])
+                    if analysis_result.get("code"):
+                        with st.expander("查看生成代码(调试)"):
+                            st.code(analysis_result["code"], language="python")
+                elif analysis_result["type"] == "dataframe":
+                    st.success("分析结果(表格)")
+                    st.markdown(analysis_result["value"])
+                    if analysis_result.get("code"):
+                        with st.expander("查看生成代码(调试)"):
+                            st.code(analysis_result["code"], language="python")
+                else:  # text or other
+                    st.success("分析结果")
+                    st.markdown(analysis_result["value"])
+                    if analysis_result.get("code"):
+                        with st.expander("查看生成代码(调试)"):
+                            st.code(analysis_result["code"], language="python")
+                
+            except Exception as e:
+                st.error(f"分析失败: {str(e)}")
@@ -0,0 +1,132 @@
+"""
+AI 报告的数据预汇总
+
+由指标立方体切片和站点快照在本地算好 全站概览、站点排名、站点效率指标、全站月度趋势（含环比）、站点当月环比、
+异常记录 等小表，以 CSV 文本一次性放进提示词，模型直接据此写报告，不再经 PandasAI 多轮生成、执行代码读取原始记录。
+提示词按 token 预算裁剪：站点多时只保留 充电量排名靠前和靠后 的站点，异常记录按偏离程度取前若干条，逐级减少直到
+估算的 token 数不超过预算。
+"""
+import re
+import textwrap
+
+import numpy as np
+import pandas as pd
+
+from anomaly_engine import anomaly_list
+from station_snapshot import CORE_METRICS, build_snapshot
+
+# 提示词的 token 预算（含任务说明和数据表）
+TOKEN_BUDGET = 6000
+# Deepseek 官方估算：1 个中文字符约 0.6 token，1 个英文字符（数字、符号）约 0.3 token
+CJK_TOKENS = 0.6
+OTHER_TOKENS = 0.3
+# 裁剪级别：(站点表保留行数, 异常记录条数)，None 为不限
+DETAIL_LEVELS = [(None, 30), (40, 20), (20, 15), (10, 10), (6, 5), (2, 3)]
+# 保留两位小数的列，其余数值保留一位
+PRECISE_COLUMNS = {'单订单收益', '单位电量收益'}
+_CJK = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+# 按站点排列的表（裁剪时保留同一批站点）
+STATION_TABLES = ['站点排名', '站点效率', '站点当月环比']
+
+
+def estimate_tokens(text):
+    """按字符类别估算 token 数"""
+    cjk = len(_CJK.findall(text))
+    return int(np.ceil(cjk * CJK_TOKENS + (len(text) - cjk) * OTHER_TOKENS))
+
+
+def _monthly(view):
+    """全站月度合计及环比（首尾月份可能只有部分天数，列出天数以便判断）"""
+    dates = view.index.get_level_values('日期')
+    month = dates.to_period('M')
+    totals = view[CORE_METRICS].groupby(month).sum()
+    totals.insert(0, '天数', pd.Series(dates, index=view.index).groupby(month).nunique())
+    for metric in CORE_METRICS:
+        totals[f'{metric}环比(%)'] = totals[metric].pct_change().replace([np.inf, -np.inf], np.nan) * 100
+    return totals.rename_axis('月份').reset_index().assign(月份=lambda t: t['月份'].astype(str))
+
+
+def build_digest(view, anomalies=None, snapshot=None):
+    """
+    计算报告用的汇总表
+    输入参数：view 指标立方体日汇总切片；anomalies 同筛选条件的 anomaly_frame 明细（可选）；snapshot 已有的站点快照（可选）
+    输出参数：dict，表名 -> DataFrame（站点表按充电量排名排序）
+    """
+    if snapshot is None:
+        snapshot = build_snapshot(view, anomalies)
+    table = snapshot['stations'].sort_values('充电量排名').rename_axis('站点').reset_index()
+    table = table.astype({f'{m}排名': int for m in CORE_METRICS})
+    overall = snapshot['overall']
+    dates = view.index.get_level_values('日期')
+    overview = pd.DataFrame({
+        '指标': ['日期范围', '站点数', '记录数'] + [f'总{m}' for m in CORE_METRICS]
+              + ['单订单充电量', '单订单收益', '单位电量收益', '异常站点数'],
+        '数值': [f"{dates.min():%Y-%m-%d} ~ {dates.max():%Y-%m-%d}", overall['站点数'], overall['记录数']]
+              + [round(overall[f'总{m}'], 1) for m in CORE_METRICS]
+              + [round(overall['单订单充电量'], 1), round(overall['单订单收益'], 2),
+                 round(overall['单位电量收益'], 2), int((table['异常天数'] > 0).sum())],
+    })
+    ranking = table[['站点'] + [c for m in CORE_METRICS for c in (f'总{m}', f'{m}排名')] + ['充电量较均值(%)']]
+    efficiency = table[['站点', '单订单充电量', '单订单收益', '单位电量收益', '日均充电量', '峰值日充电量',
+                        '7天充电趋势(%)', '30天充电趋势(%)', '优势项', '短板项', '异常天数']]
+    month = table[['站点'] + [c for m in CORE_METRICS for c in (f'当月{m}', f'当月{m}环比(%)')]]
+    return {
+        '全站概览': overview,
+        '站点排名': ranking,
+        '站点效率': efficiency,
+        '全站月度趋势': _monthly(view),
+        '站点当月环比': month.assign(当月=table['最新日期'].dt.strftime('%Y-%m')),
+        '异常记录': anomaly_list(snapshot['daily'], CORE_METRICS),
+    }
+
+
+def _rows(frame, limit):
+    """保留前 limit 行；站点表取排名靠前的 ceil(limit/2) 个和靠后的 floor(limit/2) 个"""
+    if limit is None or len(frame) <= limit:
+        return frame
+    return pd.concat([frame.head(limit - limit // 2), frame.tail(limit // 2)])
+
+
+def _csv(frame):
+    frame = frame.copy()
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            frame[column] = frame[column].dt.strftime('%Y-%m-%d')
+        elif pd.api.types.is_float_dtype(frame[column]):
+            frame[column] = frame[column].round(2 if column in PRECISE_COLUMNS else 1)
+    return frame.to_csv(index=False).strip()
+
+
+def digest_text(digest, station_rows=None, anomaly_rows=None):
+    """汇总表 -> 提示词中的数据部分（各表为 CSV），裁剪掉的行在表名后注明"""
+    parts = []
+    for name, frame in digest.items():
+        shown = frame
+        if name in STATION_TABLES:
+            shown = _rows(frame, station_rows)
+            note = f"（共 {len(frame)} 个站点，列出充电量排名前 {station_rows - station_rows // 2} 和后 " \
+                   f"{station_rows // 2} 的站点）" if len(shown) < len(frame) else ""
+        elif name == '异常记录':
+            shown = frame.head(anomaly_rows) if anomaly_rows is not None else frame
+            note = f"（共 {len(frame)} 条，按偏离程度列出前 {len(shown)} 条）" if len(shown) < len(frame) else ""
+        else:
+            note = ""
+        body = _csv(shown) if len(shown) else "无"
+        parts.append(f"### {name}{note}\n{body}")
+    return "\n\n".join(parts)
+
+
+def digest_prompt(digest, task, budget=TOKEN_BUDGET):
+    """
+    组合提示词：任务说明 + 数据汇总表，按 DETAIL_LEVELS 逐级裁剪直到估算 token 数不超过 budget
+    （裁剪到最后一级仍超出时按最后一级返回）
+    输出参数：(提示词, 估算 token 数)
+    """
+    task = textwrap.dedent(task).strip()
+    for station_rows, anomaly_rows in DETAIL_LEVELS:
+        prompt = f"{task}\n\n以下是已在本地算好的统计结果（CSV 格式），请直接引用其中的数值，不要自行估算：\n\n" \
+                 + digest_text(digest, station_rows, anomaly_rows)
+        tokens = estimate_tokens(prompt)
+        if tokens <= budget:
+            break
+    return prompt, tokens
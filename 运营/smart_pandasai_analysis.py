@@ -1,17 +1,13 @@
-import os
-import pandas as pd
 import streamlit as st
-from pandasai import Agent, SmartDataframe
 from deepseek_llm import DeepseekLLM
-from dotenv import load_dotenv
 from pdf_utils import generate_pdf_report
-# 加载环境变量
-load_dotenv()
+from report_digest import build_digest, digest_prompt
+from utils import stream_markdown
 
-def smart_pandasai_analysis(filtered_data, deepseek_key):
-    """智能PandasAI分析功能"""
-    filtered_data = SmartDataframe(filtered_data)
-    st.header("智能PandasAI分析")
+
+def smart_pandasai_analysis(cube_view, deepseek_key, anomalies=None):
+    """智能问答：基于本地汇总的统计表一次性请求 Deepseek 回答问题"""
+    st.header("智能问答分析")
     llm = DeepseekLLM(
             api_key=deepseek_key,
             temperature=0.3,
@@ -23,7 +19,7 @@ def smart_pandasai_analysis(filtered_data, deepseek_key):
     )
     # 在question输入后添加提示增强
     enhanced_question = f"""
-            请基于充电场站数据回答以下问题:
+            请基于充电场站运营数据的统计结果回答以下问题:
             {question}
 
             要求:
@@ -40,32 +36,18 @@ def smart_pandasai_analysis(filtered_data, deepseek_key):
                     * 潜在改进方向
                     * 风险预警(如适用)可以指出具体是哪些场站需要注意。
             """
-    if st.button("执行PandasAI分析"):
-        with st.spinner("正在分析..."):
-            try:
-                #加入预处理功能
-                #preprocessed_data = filtered_data.copy()
-                #转换日期列为字符串格式(如果存在)
-                #date_cols = preprocessed_data.select_dtypes(include=['datetime']).columns
-                #preprocessed_data[date_cols] = preprocessed_data[date_cols].astype(str)
-                agent = Agent(filtered_data
-                              , config = {
-                                "llm": llm,                     # 指定语言模型
-                                "enable_cache": True,           # 启用缓存
-                                "max_retries": 3,               # 最大重试次数
-                                "conversational": False,        # 非对话模式更快
-                                "api_key": os.getenv("PANDASAI_API_KEY")
-                            }
-                              ,description="智能充电场站运营数据分析助手，支持充电量、订单数、利用率等核心指标分析"
-                              ,memory_size=20  # 扩大记忆容量
-                              )
-                response = agent.chat(enhanced_question)
-                st.success("分析完成")
-                st.write(response)
-                
-                # 生成PDF下载按钮
-                if isinstance(response, str):
-                    generate_pdf_report(response)
-            except Exception as e:
-                st.error(f"分析失败: {str(e)}")
-                st.info("请检查: 1. API密钥是否有效 2. 网络连接 3. 服务可用性")
+    if st.button("执行智能问答"):
+        if cube_view.empty:
+            st.warning("当前筛选条件下没有数据")
+            return
+        try:
+            prompt, tokens = digest_prompt(build_digest(cube_view, anomalies), enhanced_question)
+            st.caption(f"提示词约 {tokens:,} tokens")
+            response = stream_markdown(llm, prompt)
+            st.success("分析完成")
+            
+            # 生成PDF下载按钮
+            generate_pdf_report(response)
+        except Exception as e:
+            st.error(f"分析失败: {str(e)}")
+            st.info("请检查: 1. API密钥是否有效 2. 网络连接 3. 服务可用性")
@@ -0,0 +1,160 @@
+"""
+站点运营快照
+
+由 站点 × 日 指标立方体切片一次性计算全部站点的 合计、排名、效率比率、与全站均值对比、近 7/30 天趋势、
+当月/上月/当日/前一日指标、峰值日及异常日统计（异常分数来自 anomaly_engine），汇总文字、AI 提示词和指标卡片都从快照取值，
+不再在各处重复 groupby / 筛选原始记录。全部计算按站点分组向量化完成，与站点数无关地只遍历一次立方体。
+"""
+import numpy as np
+import pandas as pd
+
+from anomaly_engine import anomaly_frame, detect_anomalies
+from metrics_cube import COUNT_COLUMN
+
+CORE_METRICS = ['充电量', '订单数', '结算收益']
+# 趋势计算所需的最少记录数（与原 7 天 / 30 天趋势一致）
+TREND_MIN_RECORDS = {7: 14, 30: 60}
+
+
+def _ratio(numerator, denominator):
+    """安全除法，分母为 0 时结果为 0"""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator != 0, numerator / denominator, 0.0)
+
+
+def _window_sums(view, mask, station_index):
+    """mask 内的各站点 指标合计 及 记录数，缺失站点补 0"""
+    return view[mask].groupby(level='站点').sum().reindex(station_index, fill_value=0)
+
+
+def _change(current, previous):
+    """环比变化百分比，基期为 0 时记 0"""
+    return _ratio(current - previous, previous) * 100
+
+
+def build_snapshot(view, anomalies=None):
+    """
+    计算全部站点的运营快照
+    输入参数：
+    view 指标立方体日汇总切片（(站点, 日期) 索引，列含 充电量/订单数/结算收益/记录数）
+    anomalies 与 view 相同筛选条件的 anomaly_frame 明细（可选，缺省时仅以 view 的数据计算）
+    输出参数：dict
+    stations 以站点为索引的指标表（各列含义见下方赋值处）
+    overall 全站合计、单记录均值及效率比率
+    daily 日明细（anomaly_frame 格式：各指标的 日值/基准/score/异常）
+    """
+    view = view[CORE_METRICS + [COUNT_COLUMN]]
+    dates = view.index.get_level_values('日期')
+    station_level = view.index.get_level_values('站点')
+    totals = view.groupby(level='站点').sum()
+    index = totals.index
+    table = pd.DataFrame(index=index)
+    counts = totals[COUNT_COLUMN].to_numpy()
+
+    # 合计、排名、单记录均值
+    overall = {'记录数': int(counts.sum()), '站点数': len(index)}
+    for metric in CORE_METRICS:
+        table[f'总{metric}'] = totals[metric]
+        table[f'{metric}排名'] = totals[metric].rank(ascending=False, method='min')
+        table[f'平均{metric}'] = _ratio(totals[metric], counts)
+        overall[f'总{metric}'] = float(totals[metric].sum())
+        overall[f'平均{metric}'] = float(_ratio(overall[f'总{metric}'], overall['记录数']))
+        # 单记录均值相对全站的偏离（%）
+        table[f'{metric}较均值(%)'] = _change(table[f'平均{metric}'], overall[f'平均{metric}'])
+
+    # 效率比率
+    for target, (numerator, denominator) in {'单订单充电量': ('充电量', '订单数'),
+                                             '单订单收益': ('结算收益', '订单数'),
+                                             '单位电量收益': ('结算收益', '充电量')}.items():
+        table[target] = _ratio(totals[numerator], totals[denominator])
+        overall[target] = float(_ratio(overall[f'总{numerator}'], overall[f'总{denominator}']))
+
+    # 优势项 / 短板项：相对全站均值偏离最大 / 最小的指标
+    deviation = table[[f'{m}较均值(%)' for m in CORE_METRICS]].to_numpy()
+    table['优势项'] = np.array(CORE_METRICS)[deviation.argmax(axis=1)]
+    table['优势项较均值(%)'] = deviation.max(axis=1)
+    table['短板项'] = np.array(CORE_METRICS)[deviation.argmin(axis=1)]
+    table['短板项较均值(%)'] = deviation.min(axis=1)
+
+    # 各行距本站最新日期的天数，用于近 N 天 / 当日窗口
+    latest = pd.Series(dates, index=view.index).groupby(level='站点').transform('max')
+    age = ((latest.to_numpy() - dates.to_numpy()) // np.timedelta64(1, 'D')).astype(int)
+    table['最新日期'] = latest.groupby(level='站点').max()
+
+    for days in TREND_MIN_RECORDS:
+        recent = _window_sums(view, age < days, index)
+        previous = _window_sums(view, (age >= days) & (age < 2 * days), index)
+        recent_mean = _ratio(recent['充电量'], recent[COUNT_COLUMN])
+        previous_mean = _ratio(previous['充电量'], previous[COUNT_COLUMN])
+        enough = (counts >= TREND_MIN_RECORDS[days]) & (recent[COUNT_COLUMN].to_numpy() > 0) \
+            & (previous[COUNT_COLUMN].to_numpy() > 0)
+        table[f'近{days}天日均充电量'] = recent_mean
+        table[f'{days}天充电趋势(%)'] = np.where(enough, _change(recent_mean, previous_mean), 0.0)
+        if days == 7:
+            # 近 7 天单记录收益相对此前的变化
+            before = _window_sums(view, age >= days, index)
+            table['近7天收益变化(%)'] = _change(_ratio(recent['结算收益'], recent[COUNT_COLUMN]),
+                                           _ratio(before['结算收益'], before[COUNT_COLUMN]))
+
+    # 当月 / 上月（按本站最新日期所在月份），当日 / 前一日
+    month = dates.year * 12 + dates.month
+    latest_month = pd.Series(month, index=view.index).groupby(level='站点').transform('max').to_numpy()
+    current_month = _window_sums(view, month == latest_month, index)
+    previous_month = _window_sums(view, month == latest_month - 1, index)
+    has_previous = previous_month[COUNT_COLUMN].to_numpy() > 0
+    # 全站当月均值：同一月份各站点合计的均值
+    month_totals = view.groupby([station_level, month]).sum()
+    month_mean = month_totals.groupby(level=1).mean()
+    station_month = pd.Series(latest_month, index=view.index).groupby(level='站点').max().reindex(index)
+    day = _window_sums(view, age == 0, index)
+    previous_day = _window_sums(view, age == 1, index)
+    has_previous_day = previous_day[COUNT_COLUMN].to_numpy() > 0
+    for metric in CORE_METRICS:
+        table[f'当月{metric}'] = current_month[metric]
+        table[f'上月{metric}'] = previous_month[metric]
+        table[f'当月{metric}较上月'] = np.where(has_previous, current_month[metric] - previous_month[metric], 0.0)
+        table[f'当月{metric}环比(%)'] = np.where(has_previous, _change(current_month[metric],
+                                                                   previous_month[metric]), np.nan)
+        table[f'当月{metric}较均值'] = current_month[metric].to_numpy() \
+            - month_mean[metric].reindex(station_month.to_numpy()).to_numpy()
+        table[f'当日{metric}'] = day[metric]
+        table[f'当日{metric}较前日'] = np.where(has_previous_day, day[metric] - previous_day[metric], 0.0)
+    table['有上月数据'] = has_previous
+
+    # 峰值日、日均、最佳月份
+    charge = view['充电量']
+    peak = charge.groupby(level='站点').idxmax()
+    table['峰值日'] = [key[1] for key in peak.reindex(index)]
+    table['峰值日充电量'] = charge.groupby(level='站点').max()
+    table['运营天数'] = charge.groupby(level='站点').size()
+    table['日均充电量'] = _ratio(table['总充电量'], table['运营天数'])
+    table['峰值倍数'] = _ratio(table['峰值日充电量'], table['日均充电量'])
+    table['利用率峰值'] = _ratio(table['峰值日充电量'], charge.groupby(level='站点').mean())
+    by_month = charge.groupby([station_level, dates.month]).sum()
+    table['最佳月份'] = by_month.groupby(level=0).idxmax().map(lambda key: key[1])
+
+    # 异常日：按星期几基准的稳健分数
+    if anomalies is None:
+        anomalies = anomaly_frame(detect_anomalies(view, CORE_METRICS))
+    daily = anomalies[anomalies.index.isin(view.index)]
+    flags = daily[[f'{m}_异常' for m in CORE_METRICS]].to_numpy()
+    deviation = np.where(flags, daily[[f'{m}_score' for m in CORE_METRICS]].abs().to_numpy(), 0.0)
+    by_station = pd.DataFrame({'异常天数': flags.any(axis=1), '最大偏差': deviation.max(axis=1)},
+                              index=daily.index).groupby(level='站点')
+    table['异常天数'] = by_station['异常天数'].sum().reindex(index, fill_value=0)
+    table['最大偏差'] = by_station['最大偏差'].max().reindex(index, fill_value=0.0)
+    for metric in CORE_METRICS:
+        flagged = daily.loc[daily[f'{metric}_异常'], metric]
+        table[f'{metric}异常天数'] = flagged.groupby(level='站点').size().reindex(index, fill_value=0)
+    charge_flagged = daily.loc[daily['充电量_异常'], '充电量']
+    table['异常日平均充电量'] = charge_flagged.groupby(level='站点').mean().reindex(index)
+
+    return {'stations': table, 'overall': overall, 'daily': daily}
+
+
+def station_daily(snapshot, station):
+    """单个站点的日明细（日期为列），含各指标的基准、稳健分数及异常标记"""
+    daily = snapshot['daily']
+    return daily.xs(station, level='站点').reset_index()
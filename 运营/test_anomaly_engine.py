@@ -0,0 +1,53 @@
+"""update_anomalies 的增量结果应与对全部数据重新计算完全一致；slice_anomalies 的筛选结果应与 anomaly_frame 直接筛选一致"""
+import numpy as np
+import pandas as pd
+
+from anomaly_engine import anomaly_frame, detect_anomalies, slice_anomalies, update_anomalies
+
+METRICS = ['充电量', '订单数', '结算收益']
+
+
+def _view(stations=5, days=120, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2024-01-01', periods=days, freq='D')
+    index = pd.MultiIndex.from_product([[f'站点{i}' for i in range(stations)], dates], names=['站点', '日期'])
+    weekly = np.tile(1 + 0.3 * (dates.dayofweek >= 5), stations)
+    view = pd.DataFrame({m: rng.gamma(5, 100, len(index)) * weekly for m in METRICS}, index=index)
+    view['记录数'] = 1
+    # 随机去掉部分记录作为缺失日
+    return view.drop(index[rng.choice(len(index), 20, replace=False)])
+
+
+def _assert_same(state, expected):
+    assert state['stations'].equals(expected['stations'])
+    assert state['dates'].equals(expected['dates'])
+    for key in ('values', 'baseline', 'scale', 'score'):
+        np.testing.assert_array_equal(state[key], expected[key], err_msg=key)
+
+
+def test_update_with_appended_days():
+    full = _view()
+    prefix = full[full.index.get_level_values('日期') < '2024-04-01']
+    _assert_same(update_anomalies(detect_anomalies(prefix, METRICS), full), detect_anomalies(full, METRICS))
+
+
+def test_update_with_edited_days():
+    full = _view()
+    edited = full.copy()
+    edited.iloc[300, 0] *= 5
+    edited.iloc[-10, 1] = 0
+    _assert_same(update_anomalies(detect_anomalies(full, METRICS), edited), detect_anomalies(edited, METRICS))
+
+
+def test_update_without_changes():
+    full = _view()
+    state = detect_anomalies(full, METRICS)
+    _assert_same(update_anomalies(state, full), state)
+
+
+def test_slice_matches_filtered_frame():
+    state = detect_anomalies(_view(), METRICS)
+    start, end, stations = '2024-02-01', '2024-03-15', ['站点1', '站点3']
+    expected = anomaly_frame(state, start, end, stations)
+    assert len(expected) > 0
+    assert slice_anomalies(anomaly_frame(state), start, end, stations).equals(expected)
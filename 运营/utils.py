@@ -1,51 +1,11 @@
-import requests
-import json
-
-class DeepseekLLM:
-    def __init__(
-        self,
-        api_key: str,
-        model: str = "deepseek-chat",
-        temperature: float = 0.1,
-        max_tokens: int = 4096
-    ):
-        self.api_key = api_key
-        self.model = model
-        self.temperature = temperature
-        self.max_tokens = max_tokens
-        self.base_url = "https://api.deepseek.com/v1/chat/completions"
-        self.last_prompt = None
-
-    def call(self, instruction: str, context: str = None, **kwargs) -> str:
-        """
-        调用 Deepseek 模型的 API 以获取响应
-        """
-        instruction_str = str(instruction)
-        self.last_prompt = instruction_str
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        data = {
-            "model": self.model,
-            "messages": [{"role": "user", "content": instruction_str}],
-            "temperature": self.temperature,
-            "max_tokens": self.max_tokens
-        }
-
-        response = requests.post(self.base_url, headers=headers, json=data)
-        if response.status_code != 200:
-            raise Exception(f"API请求失败: {response.status_code}, {response.text}")
-
-        return response.json()["choices"][0]["message"]["content"]
-
-    @property
-    def type(self) -> str:
-        return "deepseek-chat"
+import pandas as pd
+import streamlit as st
 
+from metrics_cube import build_cube
+from anomaly_engine import anomaly_frame, detect_anomalies, slice_anomalies, update_anomalies
+from workbook_loader import workbook_hash, load_workbook
 
 def file_uploader():
-    import streamlit as st
     uploaded_file = st.sidebar.file_uploader(
         "上传Excel文件", 
         type=['xlsx', 'xls'],
@@ -56,23 +16,80 @@ def file_uploader():
     return None
 
 
+@st.cache_data(show_spinner=False, max_entries=4)
+def _load_workbook(file_hash, _content):
+    """同一文件在各次重跑、各会话间只解析一次；跨进程由 Parquet 缓存命中"""
+    return load_workbook(_content)[0]
+
+
 def load_data(uploaded_file):
-    import pandas as pd
+    """
+    读取上传的工作簿
+    结果由 st.cache_data 缓存，每次调用返回独立的副本，调用方原地修改不会影响其他会话或下次重跑
+    """
     if uploaded_file is None:
         return pd.DataFrame()
-    
+
     try:
-        xls = pd.ExcelFile(uploaded_file)
-        sheets = xls.sheet_names[2:]
+        content = uploaded_file.getvalue()
+        return _load_workbook(workbook_hash(content), content)
     except Exception as e:
-        import streamlit as st
         st.error(f"读取Excel文件失败: {str(e)}")
         return pd.DataFrame()
-    dfs = []
-    for sheet in sheets:
-        df = pd.read_excel(xls, sheet_name=sheet)
-        df['站点'] = sheet
-        dfs.append(df)
-    result = pd.concat(dfs, ignore_index=True)
-    result['日期'] = pd.to_datetime(result['日期'], unit='D', origin='1899-12-30')
-    return result
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _build_cube(file_hash, _data):
+    return build_cube(_data)
+
+
+def load_cube(uploaded_file, data):
+    """
+    站点 × 日 指标立方体，同一文件只构建一次（data 为 load_data 的结果）
+    返回的 dict 在各会话、各次重跑间共享（不复制，避免每次重跑拷贝整个立方体），只能读取：
+    需要修改时先经 slice_cube / period_view 取切片（筛选结果为新对象）或自行 copy
+    """
+    return _build_cube(workbook_hash(uploaded_file.getvalue()), data)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _score_anomalies(file_hash, _daily, _previous):
+    if _previous is None:
+        return detect_anomalies(_daily)
+    return update_anomalies(_previous, _daily)
+
+
+def load_anomalies(uploaded_file, cube):
+    """
+    全部站点、指标的稳健异常分数，同一文件只计算一次
+    上传追加了新日期的文件时，由本会话上次的结果增量更新，只重算新增或变化的日期
+    返回的 state 在各会话间共享，只能读取（update_anomalies 生成新的 state，不修改传入的数组）
+    """
+    state = _score_anomalies(workbook_hash(uploaded_file.getvalue()), cube['daily'],
+                             st.session_state.get('anomaly_state'))
+    st.session_state['anomaly_state'] = state
+    return state
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _anomaly_frame(file_hash, _state):
+    return anomaly_frame(_state)
+
+
+def load_anomaly_frame(uploaded_file, cube, start=None, end=None, stations=None):
+    """
+    按日期范围和站点筛选的异常明细表（anomaly_frame），全部站点的明细表同一文件只构建一次
+    缓存的全量明细表在各会话间共享，这里返回的是筛选后的新 DataFrame，可以修改
+    """
+    state = load_anomalies(uploaded_file, cube)
+    return slice_anomalies(_anomaly_frame(workbook_hash(uploaded_file.getvalue()), state), start, end, stations)
+
+
+def stream_markdown(llm, prompt, use_cache=True):
+    """
+    流式展示 AI 输出：收到第一段文本即开始显示，逐段追加
+    输入参数：llm 有 stream 方法的 DeepseekLLM；prompt 提示词；use_cache 是否使用响应缓存
+    输出参数：完整文本（可继续用于下载、生成PDF）
+    """
+    text = st.write_stream(llm.stream(prompt, use_cache=use_cache))
+    return text if isinstance(text, str) else "".join(map(str, text))
@@ -0,0 +1,100 @@
+"""
+充电站电量统计表读取
+
+工作簿第三个工作表起每个工作表为一个站点。各工作表在进程池中并行解析（安装了 python-calamine 时
+使用 calamine 引擎），日期列的 Excel 序列号整列换算，合并结果以工作簿内容哈希为键保存为 Parquet，
+同一文件再次上传或页面重跑时直接读取 Parquet。
+"""
+import hashlib
+import importlib.util
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'workbooks')
+# 前 SKIP_SHEETS 个工作表为汇总表，不是站点数据
+SKIP_SHEETS = 2
+# 站点工作表少于该数量时顺序解析，进程池启动开销不划算
+MIN_PARALLEL_SHEETS = 4
+MAX_WORKERS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+EXCEL_EPOCH = '1899-12-30'
+
+
+def excel_engine():
+    """可用时使用更快的 calamine 引擎，否则由 pandas 按文件类型选择"""
+    return 'calamine' if importlib.util.find_spec('python_calamine') else None
+
+
+def workbook_hash(content):
+    return hashlib.md5(content).hexdigest()
+
+
+def excel_dates(values):
+    """
+    日期列整列转换：Excel 序列号按 1899-12-30 起算换算，已是日期或日期字符串的直接解析
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype('datetime64[ns]')
+    serial = pd.to_numeric(values, errors='coerce')
+    dates = pd.to_datetime(serial, unit='D', origin=EXCEL_EPOCH).astype('datetime64[ns]')
+    rest = serial.isna() & values.notna()
+    if rest.any():
+        dates = dates.where(~rest, pd.to_datetime(values.where(rest), errors='coerce'))
+    return dates
+
+
+def read_sheet(content, sheet, engine=None):
+    """解析一个站点工作表（进程池任务，参数均可序列化）"""
+    df = pd.read_excel(io.BytesIO(content), sheet_name=sheet, engine=engine)
+    df['站点'] = sheet
+    return df
+
+
+def parse_workbook(content, engine=None, max_workers=MAX_WORKERS):
+    """
+    解析全部站点工作表并合并
+    输入参数：content 工作簿字节；engine read_excel 引擎；max_workers 进程数
+    输出参数：合并后的 DataFrame，日期列已转换
+    """
+    engine = engine or excel_engine()
+    sheets = pd.ExcelFile(io.BytesIO(content), engine=engine).sheet_names[SKIP_SHEETS:]
+    if not sheets:
+        return pd.DataFrame()
+    dfs = None
+    if len(sheets) >= MIN_PARALLEL_SHEETS and max_workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(sheets))) as executor:
+                dfs = list(executor.map(read_sheet, [content] * len(sheets), sheets, [engine] * len(sheets)))
+        except (OSError, RuntimeError):
+            # 进程池不可用（如受限环境）时退回顺序解析
+            dfs = None
+    if dfs is None:
+        dfs = [read_sheet(content, sheet, engine) for sheet in sheets]
+    result = pd.concat(dfs, ignore_index=True)
+    result['日期'] = excel_dates(result['日期'])
+    return result
+
+
+def load_workbook(content, cache_dir=CACHE_DIR):
+    """
+    读取工作簿：命中 Parquet 缓存直接返回，否则解析后写入缓存
+    输出参数：(DataFrame, 是否命中缓存)
+    """
+    path = os.path.join(cache_dir, f'{workbook_hash(content)}.parquet')
+    if os.path.exists(path):
+        try:
+            return pd.read_parquet(path), True
+        except (OSError, ValueError, ImportError):
+            pass
+    result = parse_workbook(content)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f'{path}.tmp'
+        result.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    except (OSError, ValueError, ImportError, TypeError):
+        # 未安装 pyarrow 或列类型混杂无法写 Parquet 时只是不缓存
+        pass
+    return result, False